@@ -1,13 +1,15 @@
-from email.mime.text import MIMEText
+import json
 import os
 import re
-import smtplib
+import tempfile
+import click
 import jwt
 import pandas as pd
 from datetime import datetime, timedelta
 from functools import wraps
+from itertools import chain
 
-from flask import Flask, request, jsonify, send_from_directory, g
+from flask import Flask, Response, request, jsonify, send_from_directory, g, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 from twilio.rest import Client
@@ -20,6 +22,33 @@ from firebase_admin import credentials, auth, firestore
 load_dotenv()
 from db_init import db 
 from tasks_api import tasks_bp
+import user_directory
+import import_parsing
+import inventory_import
+import inventory_bulk
+import item_counters
+import item_ids
+import stock_movements
+import import_jobs
+import token_cache
+import pagination
+import company_versions
+import inventory_changes
+import inventory_aggregates
+import inventory_cache
+import inventory_analytics
+import request_fanout
+import stock_trends
+import inventory_events
+import reorder_levels
+import exports
+import search_index
+import mailer
+import metrics
+import notifications
+
+# Firebase Auth calls are timed into /metrics and Server-Timing
+auth = metrics.Instrumented(auth, "firebase_auth")
 
 # JWT secret key from environment
 JWT_SECRET = os.getenv("JWT_SECRET")
@@ -43,6 +72,13 @@ FIREBASE_CONFIG = {
 app = Flask(__name__)
 CORS(app, origins=os.environ.get('ALLOWED_ORIGINS', 'http://localhost:3000'))
 app.register_blueprint(tasks_bp, url_prefix="/api")
+request_fanout.init_app(app)
+metrics.init_app(app)
+
+# Keep Google's token signing certs warm so token verification never fetches them inline
+token_cache.start_cert_refresher()
+# Fold recorded stock movements into item quantities in the background
+stock_movements.start_compactor()
 
 
 # --------------------------------------------------------------------------------
@@ -75,15 +111,6 @@ def validate_password(password):
 # Email Utilities
 # --------------------------------------------------------------------------------
 def send_verification_email(to_email, verification_link):
-    sender_email = os.getenv("SMTP_EMAIL")  
-    sender_password = os.getenv("SMTP_PASSWORD")  
-    smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")  # Default to Gmail
-    smtp_port = int(os.getenv("SMTP_PORT", 465))  
-
-    if not sender_email or not sender_password:
-        print("❌ Error: Missing SMTP credentials. Check your .env file.")
-        return
-
     subject = "Verify Your Email"
     body = f"""
     Hello,
@@ -98,26 +125,12 @@ def send_verification_email(to_email, verification_link):
     Inventory Management Team
     """
 
-    msg = MIMEText(body)
-    msg["From"] = sender_email
-    msg["To"] = to_email
-    msg["Subject"] = subject
-
-    try:
-        server = smtplib.SMTP_SSL(smtp_server, smtp_port)
-        server.login(sender_email, sender_password)
-        server.sendmail(sender_email, to_email, msg.as_string())
-        server.quit()
+    if mailer.send(subject, body, to_email):
         print("✅ Verification email sent successfully!")
-    except Exception as e:
-        print(f"❌ Error sending email: {e}")
         
         
 def send_forgot_password_email(to_email, reset_link):
-    """New function to send Forgot Password email using the same SMTP settings."""
-    sender_email = os.getenv("SMTP_EMAIL")
-    sender_password = os.getenv("SMTP_PASSWORD")
-
+    """Sends the Forgot Password email through the shared SMTP transport."""
     subject = "Reset Your Password"
     body = f"""
     <p>You requested a password reset. Click below to reset your password:</p>
@@ -125,19 +138,8 @@ def send_forgot_password_email(to_email, reset_link):
     <p>If you did not request this, you can safely ignore this email.</p>
     """
 
-    msg = MIMEText(body, "html")
-    msg["Subject"] = subject
-    msg["From"] = sender_email
-    msg["To"] = to_email
-
-    try:
-        server = smtplib.SMTP_SSL("smtp.gmail.com", 465)
-        server.login(sender_email, sender_password)
-        server.send_message(msg)
-        server.quit()
+    if mailer.send(subject, body, to_email, subtype="html"):
         print("✅ Forgot Password email sent successfully!")
-    except Exception as e:
-        print(f"❌ Error sending Forgot Password email: {e}")
         
 # --------------------------------------------------------------------------------
 # JWT Helpers
@@ -160,7 +162,7 @@ def issue_token():
         if not id_token:
             return jsonify({"error": "Missing idToken"}), 400
 
-        decoded = auth.verify_id_token(id_token)
+        decoded = token_cache.verify_id_token(id_token)
         uid = decoded['uid']
 
         # find subcollection doc
@@ -182,13 +184,15 @@ def issue_token():
 # --------------------------------------------------------------------------------
 # Firestore Helpers
 # --------------------------------------------------------------------------------
-def find_user_in_any_company(uid):
-    companies_snap = db.collection('companies').stream()
-    for company_doc in companies_snap:
-        user_snap = company_doc.reference.collection('users').document(uid).get()
-        if user_snap.exists:
-            return user_snap.to_dict(), company_doc.id
-    return None, None
+def find_user_in_any_company(uid, legacy_scan=None):
+    """
+    Resolves `uid` through the user directory. Returns (entry, company_id) where
+    entry holds the user's role and fullName, or (None, None) if not found.
+    """
+    entry = user_directory.lookup(uid, legacy_scan=legacy_scan)
+    if not entry:
+        return None, None
+    return entry, entry['company']
 
 
 def create_user_in_company(uid, email, company_name, role, first_name, last_name, status="active"):
@@ -209,9 +213,13 @@ def create_user_in_company(uid, email, company_name, role, first_name, last_name
         'status': status
     }
 
-    # Create user doc by UID
+    # Create user doc by UID, together with its directory entry
     user_ref = company_ref.collection('users').document(uid)
-    user_ref.set(user_data)
+    batch = db.batch()
+    batch.set(user_ref, user_data)
+    user_directory.record_user(uid, company_name, role, user_directory.full_name_of(user_data), batch=batch)
+    batch.commit()
+    user_directory.invalidate(uid)
 
     # Update company members
     company_ref.update({"members": firestore.ArrayUnion([uid])})
@@ -264,7 +272,8 @@ def signup():
 
         send_verification_email(to_email=email, verification_link=verification_link)
 
-        found_data, found_company = find_user_in_any_company(uid)
+        # uid was just issued by Firebase Auth, so only the directory needs checking
+        found_data, found_company = find_user_in_any_company(uid, legacy_scan=False)
         if found_data:
             return jsonify({"error": "This UID is already registered under another company"}), 400
 
@@ -301,7 +310,11 @@ def signup():
             'status': "active",  
             'company': company_name
         }
-        user_ref.set(user_data)
+        batch = db.batch()
+        batch.set(user_ref, user_data)
+        user_directory.record_user(uid, company_name, role, user_directory.full_name_of(user_data), batch=batch)
+        batch.commit()
+        user_directory.invalidate(uid)
 
         company_ref.update({
             'members': firestore.ArrayUnion([uid])
@@ -374,7 +387,7 @@ def google_signin():
             return jsonify({"error": "Missing idToken"}), 400
 
         # Verify Google token
-        decoded_token = auth.verify_id_token(id_token)
+        decoded_token = token_cache.verify_id_token(id_token)
         uid = decoded_token['uid']
         email = decoded_token['email'].lower()
 
@@ -471,45 +484,112 @@ def forgot_password():
 
 # Get Inventory
 @app.route('/api/inventory', methods=['GET'])
+@company_versions.conditional_get([company_versions.INVENTORY], company_versions.company_from_args)
 def get_inventory():
     company_name = request.args.get('companyName')
     if not company_name:
         return jsonify({"error": "Company name is required"}), 400
 
+    # Any paging parameter switches to {items, nextCursor}; old clients get the full list
+    paginated = any(param in request.args for param in ('limit', 'startAfter', 'orderBy', 'fields'))
+
     try:
+        if not paginated:
+            inventory = [data for _, data in inventory_cache.rows(company_name, attach=caller_is_member(company_name))]
+            return jsonify(inventory)
+
         inventory_ref = db.collection('companies').document(company_name).collection('inventory')
-        inventory = [doc.to_dict() for doc in inventory_ref.stream()]
-        return jsonify(inventory)
+
+        items, next_cursor = pagination.fetch_page(
+            inventory_ref,
+            limit=pagination.parse_limit(request.args.get('limit')),
+            order_by=request.args.get('orderBy'),
+            descending=request.args.get('direction', 'asc').lower() == 'desc',
+            fields=pagination.parse_fields(request.args.get('fields')),
+            start_after=request.args.get('startAfter'),
+        )
+        return jsonify({"items": items, "nextCursor": next_cursor})
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+# Search Inventory
+@app.route('/api/inventory/search', methods=['GET'])
+def search_inventory():
+    company_name = request.args.get('companyName')
+    query = request.args.get('q', '').strip()
+    if not company_name:
+        return jsonify({"error": "Company name is required"}), 400
+    if not query:
+        return jsonify({"error": "Search query (q) is required"}), 400
+    try:
+        limit = min(int(request.args.get('limit', search_index.DEFAULT_LIMIT)), search_index.MAX_LIMIT)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be at least 1"}), 400
+
+    try:
+        total, results = search_index.search(company_name, query, limit, attach=caller_is_member(company_name))
+    except Exception as e:
+        print(f"❌ Search index for {company_name} unavailable, scanning instead: {e}")
+        try:
+            total, results = search_index.scan(company_name, query, limit)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    return jsonify({"query": query, "total": total, "results": results}), 200
+
+# Reorder Levels per Category
+@app.route('/api/reorder-levels', methods=['GET'])
+def get_reorder_levels():
+    company_name = request.args.get('companyName')
+    if not company_name:
+        return jsonify({"error": "Company name is required"}), 400
+    return jsonify({
+        "default": reorder_levels.DEFAULT_REORDER_LEVEL,
+        "categories": reorder_levels.category_levels(company_name),
+    }), 200
+
+@app.route('/api/reorder-levels', methods=['PUT'])
+def update_reorder_levels():
+    admin_uid = request.headers.get("uid")
+    if not admin_uid:
+        return jsonify({"error": "Unauthorized: UID missing"}), 401
+
+    _, company_name = get_admin_info(admin_uid)
+    if not company_name:
+        return jsonify({"error": "Admin or company not found"}), 404
+
+    categories = (request.json or {}).get("categories")
+    if not isinstance(categories, dict) or not categories:
+        return jsonify({"error": "categories must map category names to reorder levels"}), 400
+    try:
+        updates = {category: reorder_levels.parse_level(level) for category, level in categories.items()}
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        levels, reflagged = reorder_levels.set_category_levels(company_name, updates)
+        return jsonify({"categories": levels, "itemsUpdated": reflagged}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def caller_is_member(company_name):
+    """
+    True if the request's uid belongs to `company_name`. Unauthenticated reads
+    must not open inventory cache listeners, so only members get `attach`.
+    """
+    return user_directory.is_member(request.headers.get("uid"), company_name)
+
+
 def get_admin_info(admin_uid):
     """
-    Loop through all companies to find one that contains a user document in its "users" subcollection 
-    with the given UID. Returns a tuple: (full_name, company_id)
+    Looks up the user directory entry for the given UID.
+    Returns a tuple: (full_name, company_id)
     """
-    companies = db.collection('companies').stream()
-    for company_doc in companies:
-        user_doc = company_doc.reference.collection('users').document(admin_uid).get()
-        if user_doc.exists:
-            user_data = user_doc.to_dict()
-            full_name = f"{user_data.get('firstName', '').strip()} {user_data.get('lastName', '').strip()}"
-            return full_name, company_doc.id  # using document ID as company name
-    return None, None
-
-def notify_company(subject, body, company_name):
-    """Send email notifications to all admins and managers in the company."""
-    company_ref = db.collection('companies').document(company_name)
-    company_doc = company_ref.get().to_dict()
-    if not company_doc:
-        return
-    member_uids = company_doc.get("members", [])
-    for uid in member_uids:
-        user_doc = db.collection('users').document(uid).get().to_dict()
-        if user_doc and user_doc.get("role") in ["admin", "manager"]:
-            to_email = user_doc.get("email")
-            if to_email:
-                send_email(to_email, subject, body)
+    entry = user_directory.lookup(admin_uid)
+    if not entry:
+        return None, None
+    return entry['fullName'], entry['company']  # using document ID as company name
 
 
 # CSV Upload Endpoint 
@@ -529,73 +609,70 @@ def upload_csv():
     if not (file.filename.endswith('.csv') or file.filename.endswith('.xlsx')):
         return jsonify({"error": "Invalid file type. Please upload a CSV or Excel file"}), 400
 
+    # ?async=1 => accept straight away and import in the background
+    if request.args.get('async') in ('1', 'true'):
+        job_id = import_jobs.submit(file, company_name, uploader, admin_uid)
+        return jsonify({
+            "message": "Import queued",
+            "jobId": job_id,
+            "statusUrl": f"/api/import-jobs/{job_id}"
+        }), 202
+
+    # ?stream=1 => one NDJSON progress line per chunk, then a final summary line
+    stream = request.args.get('stream') in ('1', 'true')
+    if stream:
+        # Flask closes request.files before a streamed body runs, so keep our own copy
+        source = tempfile.TemporaryFile()
+        file.save(source)
+        source.seek(0)
+    else:
+        source = file
+
     try:
-        import pandas as pd
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(file)
-        else:
-            df = pd.read_excel(file)
+        # CSVs are read chunk by chunk; only the first chunk is parsed up front
+        chunks = import_parsing.read_chunks(source, file.filename)
+        first_chunk = next(chunks, None)
 
-        required_columns = ["Item Name", "Description", "Category", "Quantity", "Price", "Supplier"]
-        if not all(column in df.columns for column in required_columns):
-            return jsonify({"error": f"Invalid file format. Missing required columns: {required_columns}"}), 400
+        if first_chunk is None or import_parsing.missing_columns(first_chunk):
+            return jsonify({"error": import_parsing.INVALID_FORMAT_ERROR}), 400
 
         inventory_ref = db.collection('companies').document(company_name).collection('inventory')
-        for _, row in df.iterrows():
-            name = row["Item Name"]
-            supplier = row["Supplier"]
-            category = row["Category"]
-            quantity = int(row["Quantity"])
-            price = float(row["Price"])
-            description = row["Description"]
-
-            query = inventory_ref.where("name", "==", name)\
-                                  .where("supplier", "==", supplier)\
-                                  .where("category", "==", category).limit(1)
-            docs = list(query.stream())
-            if docs:
-                doc = docs[0]
-                item = doc.to_dict()
-                old_price = item.get("price", 0)
-                updated_quantity = item.get("quantity", 0) + quantity
-                price_diff = price - old_price
-                if price_diff > 0:
-                    price_change = "increase"
-                elif price_diff < 0:
-                    price_change = "decrease"
-                else:
-                    price_change = "no_change"
-                doc.reference.update({
-                    "quantity": updated_quantity,
-                    "price": price,
-                    "price_diff": price_diff,
-                    "price_change": price_change,
-                    "updated_at": firestore.SERVER_TIMESTAMP,
-                    "updated_by": uploader,
-                    "added_at": firestore.SERVER_TIMESTAMP,
-                    "updated_at": firestore.SERVER_TIMESTAMP
-                })
-            else:
-                new_item = {
-                    "name": name,
-                    "supplier": supplier,
-                    "category": category,
-                    "description": description,
-                    "quantity": quantity,
-                    "price": price,
-                    "added_at": firestore.SERVER_TIMESTAMP,
-                    "updated_at": firestore.SERVER_TIMESTAMP,
-                    "price_diff": 0,
-                    "price_change": "no_change",
-                    "sold": 0,
-                    "added_by": uploader,
-                    "updated_by": uploader,
-                }
-                inventory_ref.add(new_item)
-        return jsonify({"message": "File uploaded successfully"}), 200
+        progress = inventory_import.import_chunks(db, inventory_ref, chain([first_chunk], chunks), uploader)
+
+        if stream:
+            def generate():
+                try:
+                    for step in progress:
+                        yield json.dumps(step) + "\n"
+                except Exception as e:
+                    yield json.dumps({"error": str(e)}) + "\n"
+                    return
+                finally:
+                    source.close()
+                yield json.dumps({"message": "File uploaded successfully", "done": True}) + "\n"
+            return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+        result = inventory_import.summarize(progress)
+        return jsonify({"message": "File uploaded successfully", **result}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+# Import Job Status Endpoint
+@app.route('/api/import-jobs/<job_id>', methods=['GET'])
+def get_import_job(job_id):
+    admin_uid = request.headers.get("uid")
+    if not admin_uid:
+        return jsonify({"error": "Unauthorized: UID missing"}), 401
+    _, company_name = get_admin_info(admin_uid)
+    if not company_name:
+        return jsonify({"error": "Admin or company not found"}), 404
+
+    # jobs live under their company, so other companies' jobs are reported as missing
+    job = import_jobs.get_job(company_name, job_id)
+    if not job:
+        return jsonify({"error": "Import job not found"}), 404
+    return jsonify(job), 200
+
 # Upsert Inventory (Add or Update)
 @app.route('/api/add-inventory', methods=['POST'])
 def add_inventory():
@@ -615,56 +692,91 @@ def add_inventory():
     new_price = data.get("price")
     if name is None or supplier is None or new_price is None:
         return jsonify({"error": "Missing required fields"}), 400
+    try:
+        reorder_level = reorder_levels.parse_level(data.get("reorder_level"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    inventory_ref = db.collection('companies').document(company_name).collection('inventory')
-    query = inventory_ref.where("name", "==", name)\
-                         .where("supplier", "==", supplier)\
-                         .where("category", "==", data.get("category")).limit(1)
-    docs = list(query.stream())
-    if docs:
-        doc = docs[0]
-        item = doc.to_dict()
-        old_price = item.get("price", 0)
-        updated_quantity = item.get("quantity", 0) + quantity
-        price_diff = new_price - old_price
-        if price_diff > 0:
-            price_change = "increase"
-        elif price_diff < 0:
-            price_change = "decrease"
+    company_ref = db.collection('companies').document(company_name)
+    inventory_ref = company_ref.collection('inventory')
+    # the id is derived from the item, so the upsert is a point read and a write in one transaction
+    doc_ref = inventory_ref.document(item_ids.item_id(name, supplier, data.get("category")))
+
+    @firestore.transactional
+    def apply_upsert(transaction):
+        ref, snap = doc_ref, doc_ref.get(transaction=transaction)
+        if not snap.exists and item_ids.LEGACY_LOOKUP:
+            legacy_query = item_ids.legacy_query(inventory_ref, name, supplier, data.get("category"))
+            legacy = next(iter(transaction.get(legacy_query)), None)
+            if legacy is not None:
+                ref, snap = legacy.reference, legacy
+        item = snap.to_dict() if snap.exists else None
+
+        if inventory_aggregates.is_item(item) and item_counters.is_sharded(item) \
+                and new_price == item.get("price") and "reorder_level" not in data:
+            # only the stock changes: add it to a shard and leave the hot item document alone
+            item_counters.stage_increment(transaction, ref, item, quantity=quantity)
+            changes = [inventory_changes.Change(ref.id, item, {**item, "quantity": item.get("quantity", 0) + quantity})]
+            inventory_changes.stage(transaction, company_ref, changes, actor=full_name, shards_only=True)
+            return ref, changes, 200
+
+        if inventory_aggregates.is_item(item):
+            old_price = item.get("price", 0)
+            price_diff = new_price - old_price
+            if price_diff > 0:
+                price_change = "increase"
+            elif price_diff < 0:
+                price_change = "decrease"
+            else:
+                price_change = "no_change"
+            fields = {
+                **item_counters.increment_fields(item, quantity=quantity),
+                "price": new_price,
+                "price_diff": price_diff,
+                "price_change": price_change,
+                "updated_at": firestore.SERVER_TIMESTAMP,
+                "updated_by": full_name
+            }
+            if "reorder_level" in data:
+                fields["reorder_level"] = firestore.DELETE_FIELD if reorder_level is None else reorder_level
+            fields = reorder_levels.with_flag(company_name, item, fields)
+            transaction.update(ref, fields)
+            changes = [inventory_changes.Change(ref.id, item, {**item, **fields})]
+            status = 200
         else:
-            price_change = "no_change"
-        doc.reference.update({
-            "quantity": updated_quantity,
-            "price": new_price,
-            "price_diff": price_diff,
-            "price_change": price_change,
-            "updated_at": firestore.SERVER_TIMESTAMP,
-            "updated_by": full_name
-        })
-        updated_item = doc.reference.get().to_dict()
-        updated_item["id"] = doc.id
-        notify_company("Inventory Updated", f"{name} updated. New quantity: {updated_quantity}, Price change: {price_change} ({price_diff}).", company_name)
-        return jsonify(updated_item), 200
-    else:
-        new_item = {
-            "name": name,
-            "supplier": supplier,
-            "category": data.get("category"),
-            "description": data.get("description", ""),
-            "quantity": quantity,
-            "price": new_price,
-            "added_at": firestore.SERVER_TIMESTAMP,
-            "updated_at": firestore.SERVER_TIMESTAMP,
-            "price_diff": 0,
-            "price_change": "no_change",
-            "sold": 0,
-            "added_by": full_name,
-            "updated_by": full_name,
-        }
-        doc_ref = inventory_ref.add(new_item)
-        new_item["id"] = doc_ref[1].id
-        notify_company("New Inventory Added", f"{name} added with quantity {quantity} at price ${new_price}.", company_name)
-        return jsonify(new_item), 201
+            new_item = {
+                "name": name,
+                "supplier": supplier,
+                "category": data.get("category"),
+                "description": data.get("description", ""),
+                "quantity": quantity,
+                "price": new_price,
+                "added_at": firestore.SERVER_TIMESTAMP,
+                "updated_at": firestore.SERVER_TIMESTAMP,
+                "price_diff": 0,
+                "price_change": "no_change",
+                "sold": 0,
+                "added_by": full_name,
+                "updated_by": full_name,
+            }
+            if reorder_level is not None:
+                new_item["reorder_level"] = reorder_level
+            new_item = reorder_levels.with_flag(company_name, None, new_item)
+            transaction.set(ref, new_item)
+            changes = [inventory_changes.Change(ref.id, None, new_item)]
+            status = 201
+        inventory_changes.stage(transaction, company_ref, changes, actor=full_name)
+        return ref, changes, status
+
+    ref, changes, status = apply_upsert(db.transaction())
+    # re-read so the response carries the resolved server timestamps
+    saved_item = ref.get().to_dict()
+    saved_item["id"] = ref.id
+    if item_counters.is_sharded(saved_item):
+        # the stored totals catch up once the shards are re-summed
+        saved_item["quantity"] = changes[0].after["quantity"]
+    inventory_changes.after_commit(company_name, changes)
+    return jsonify(saved_item), status
 
 # Update Inventory Endpoint
 @app.route('/api/update-inventory/<item_id>', methods=['PUT'])
@@ -679,11 +791,40 @@ def update_inventory(item_id):
         return jsonify({"error": "Admin or company not found"}), 404
 
     try:
-        inventory_ref = db.collection('companies').document(company_name).collection('inventory')
+        company_ref = db.collection('companies').document(company_name)
+        doc_ref = company_ref.collection('inventory').document(item_id)
         data["updated_by"] = full_name
-        inventory_ref.document(item_id).update(data)
-        notify_company("Inventory Updated", f"Item {item_id} has been updated.", company_name)
-        return jsonify({"message": "Item updated successfully"}), 200
+        data.pop(reorder_levels.FLAG_FIELD, None)
+        data.pop(stock_movements.CURSOR_FIELD, None)
+        data = item_counters.strip(data)
+        if "reorder_level" in data:
+            level = reorder_levels.parse_level(data["reorder_level"])
+            data["reorder_level"] = firestore.DELETE_FIELD if level is None else level
+
+        @firestore.transactional
+        def apply_update(transaction):
+            before = doc_ref.get(transaction=transaction).to_dict()
+            if item_ids.changes_key(before, data):
+                # a new name, supplier or category moves the item to its new id
+                rekey = item_ids.read_rekey(transaction, company_name, doc_ref, before, data)
+                changes = item_ids.stage_rekey(transaction, rekey)
+                inventory_changes.stage(transaction, company_ref, changes, actor=full_name)
+                return rekey.new_ref.id, changes
+            fields = data
+            if item_counters.is_sharded(before) and any(field in data for field in item_counters.COUNTER_FIELDS):
+                sums = item_counters.shard_sums(doc_ref, before, transaction)
+                fields = item_counters.rebase(before, fields, sums)
+            fields = reorder_levels.with_flag(company_name, before, fields)
+            transaction.update(doc_ref, fields)
+            changes = [inventory_changes.Change(item_id, before, {**(before or {}), **fields})]
+            inventory_changes.stage(transaction, company_ref, changes, actor=full_name)
+            return item_id, changes
+
+        saved_id, changes = apply_update(db.transaction())
+        inventory_changes.after_commit(company_name, changes)
+        return jsonify({"message": "Item updated successfully", "id": saved_id}), 200
+    except item_ids.KeyConflict as e:
+        return jsonify({"error": str(e)}), 409
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -694,26 +835,111 @@ def delete_inventory(item_id):
     if not admin_uid:
         return jsonify({"error": "Unauthorized: UID missing"}), 401
 
-    _, company_name = get_admin_info(admin_uid)
+    full_name, company_name = get_admin_info(admin_uid)
     if not company_name:
         return jsonify({"error": "Admin or company not found"}), 404
 
     try:
-        inventory_ref = db.collection('companies').document(company_name).collection('inventory')
-        inventory_ref.document(item_id).delete()
-        notify_company("Inventory Deleted", f"Item {item_id} has been deleted.", company_name)
+        company_ref = db.collection('companies').document(company_name)
+        doc_ref = company_ref.collection('inventory').document(item_id)
+
+        @firestore.transactional
+        def apply_delete(transaction):
+            before = doc_ref.get(transaction=transaction).to_dict()
+            transaction.delete(doc_ref)
+            changes = [inventory_changes.Change(item_id, before, None)]
+            inventory_changes.stage(transaction, company_ref, changes, actor=full_name)
+            return changes
+
+        inventory_changes.after_commit(company_name, apply_delete(db.transaction()))
         return jsonify({"message": "Item deleted successfully"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
+
+# Record a Stock Movement (receipt, sale or adjustment)
+@app.route('/api/inventory/<item_id>/movements', methods=['POST'])
+def record_stock_movement(item_id):
+    data = request.get_json(silent=True) or {}
+    admin_uid = request.headers.get("uid")
+    if not admin_uid:
+        return jsonify({"error": "Unauthorized: UID missing"}), 401
+
+    full_name, company_name = get_admin_info(admin_uid)
+    if not company_name:
+        return jsonify({"error": "Admin or company not found"}), 404
+
+    try:
+        movement = stock_movements.record(
+            company_name, item_id, data.get("type"), data.get("quantity"), actor=full_name, note=data.get("note")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(movement), 201
+
+# Stock Movement History and Current Level
+@app.route('/api/inventory/<item_id>/movements', methods=['GET'])
+def get_stock_movements(item_id):
+    company_name = request.args.get('companyName')
+    if not company_name:
+        return jsonify({"error": "Company name is required"}), 400
+    try:
+        levels = stock_movements.current_levels(company_name, item_id)
+        if levels is None:
+            return jsonify({"error": "Item not found"}), 404
+        movements, next_cursor = stock_movements.read_page(
+            company_name, item_id,
+            limit=pagination.parse_limit(request.args.get('limit')),
+            start_after=request.args.get('startAfter'),
+        )
+        return jsonify({"id": item_id, **levels, "items": movements, "nextCursor": next_cursor}), 200
+    except pagination.PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Switch an Item Between Plain and Sharded Quantity Counters
+@app.route('/api/inventory/<item_id>/counter-shards', methods=['PUT'])
+def set_counter_shards(item_id):
+    data = request.get_json(silent=True) or {}
+    admin_uid = request.headers.get("uid")
+    if not admin_uid:
+        return jsonify({"error": "Unauthorized: UID missing"}), 401
+
+    _, company_name = get_admin_info(admin_uid)
+    if not company_name:
+        return jsonify({"error": "Admin or company not found"}), 404
+
+    try:
+        result = item_counters.set_shards(company_name, item_id, data.get("shards", item_counters.DEFAULT_SHARDS))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if result is None:
+        return jsonify({"error": "Item not found"}), 404
+    return jsonify(result), 200
+
+# Bulk Upsert/Delete Endpoint
+@app.route('/api/inventory/bulk', methods=['POST'])
+def bulk_inventory():
+    admin_uid = request.headers.get("uid")
+    if not admin_uid:
+        return jsonify({"error": "Unauthorized: UID missing"}), 401
+
+    full_name, company_name = get_admin_info(admin_uid)
+    if not company_name:
+        return jsonify({"error": "Admin or company not found"}), 404
+
+    try:
+        summary = inventory_bulk.run(company_name, (request.get_json(silent=True) or {}).get("operations"), full_name)
+        return jsonify(summary), 200
+    except inventory_bulk.BulkError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
     
 # --------------------------------------------------------------------------------
 # User Management APIs (Admin Only)
 # --------------------------------------------------------------------------------
 
-# Helper function to send emails 
-def send_email(to_email, subject, body):
-    print(f"Email sent to {to_email}: {subject} - {body}")
-    
 def require_firebase_auth(fn):
     @wraps(fn)
     def wrapper(*args, **kwargs):
@@ -723,7 +949,7 @@ def require_firebase_auth(fn):
             return jsonify({"error":"Missing or invalid Authorization header"}), 401
         id_token = parts[1]
         try:
-            decoded = auth.verify_id_token(id_token)
+            decoded = token_cache.verify_id_token(id_token)
         except Exception as e:
             return jsonify({"error":"Invalid or expired token"}), 401
         # stash the uid
@@ -731,6 +957,16 @@ def require_firebase_auth(fn):
         return fn(*args, **kwargs)
     return wrapper
 
+# Hit/miss counters for the verified ID token cache
+@app.route('/api/token-cache/stats', methods=['GET'])
+def token_cache_stats():
+    return jsonify(token_cache.cache_stats()), 200
+
+# Size of the listener-maintained inventory cache
+@app.route('/api/inventory-cache/stats', methods=['GET'])
+def inventory_cache_stats():
+    return jsonify(inventory_cache.cache_stats()), 200
+
 # Get all users for the admin's company
 @app.route('/api/users', methods=['GET'])
 @require_firebase_auth
@@ -778,15 +1014,16 @@ def promote_user(uid):
     if user_doc.to_dict().get('role') != 'staff':
         return jsonify({"error": "Only staff can be promoted"}), 400
 
-    db.collection('companies')\
-      .document(company_name)\
-      .collection('users')\
-      .document(uid)\
-      .update({"role": "manager"})
+    batch = db.batch()
+    batch.update(db.collection('companies').document(company_name).collection('users').document(uid),
+                 {"role": "manager"})
+    user_directory.record_user(uid, company_name, "manager", user_directory.full_name_of(user_doc.to_dict()), batch=batch)
+    batch.commit()
+    user_directory.invalidate(uid)
 
-    send_email(user_doc.to_dict().get('email'),
-               "Promotion to Manager",
-               "Congratulations on your promotion!")
+    email = user_doc.to_dict().get('email')
+    if email:
+        notifications.send_email([email], "Promotion to Manager", "Congratulations on your promotion!")
     return jsonify({"message": "User promoted successfully"}), 200
 
 
@@ -810,15 +1047,15 @@ def remove_user(uid):
     if user_doc.to_dict().get('role') == 'admin':
         return jsonify({"error": "Cannot remove the admin user"}), 400
 
-    db.collection('companies')\
-      .document(company_name)\
-      .collection('users')\
-      .document(uid)\
-      .delete()
+    batch = db.batch()
+    batch.delete(db.collection('companies').document(company_name).collection('users').document(uid))
+    user_directory.remove_user(uid, batch=batch)
+    batch.commit()
+    user_directory.invalidate(uid)
 
-    send_email(user_doc.to_dict().get('email'),
-               "Removed from Company",
-               "You have been removed from the company.")
+    email = user_doc.to_dict().get('email')
+    if email:
+        notifications.send_email([email], "Removed from Company", "You have been removed from the company.")
     return jsonify({"message": "User removed successfully"}), 200
 
     
@@ -842,78 +1079,91 @@ def demote_user(uid):
     if user_doc.to_dict().get('role') != 'manager':
         return jsonify({"error": "Only managers can be demoted"}), 400
 
-    db.collection('companies')\
-      .document(company_name)\
-      .collection('users')\
-      .document(uid)\
-      .update({"role": "staff"})
+    batch = db.batch()
+    batch.update(db.collection('companies').document(company_name).collection('users').document(uid),
+                 {"role": "staff"})
+    user_directory.record_user(uid, company_name, "staff", user_directory.full_name_of(user_doc.to_dict()), batch=batch)
+    batch.commit()
+    user_directory.invalidate(uid)
 
-    send_email(user_doc.to_dict().get('email'),
-               "Demoted to Staff",
-               "You have been demoted to staff.")
+    email = user_doc.to_dict().get('email')
+    if email:
+        notifications.send_email([email], "Demoted to Staff", "You have been demoted to staff.")
     return jsonify({"message": "User demoted successfully"}), 200
 
 # --------------------------------------------------------------------------------
 # Reports and Analytics Section
 # -------------------------------------------------------------------------------- 
 
-# Get Reports
-@app.route('/api/reports', methods=['GET'])
-def get_reports():
+def report_range_args():
+    """
+    (company, start_dt, end_dt) from ?start&end&companyName, shared by the
+    reports and their exports. Raises ValueError with the client-facing message.
+    """
     start_date = request.args.get('start')       # e.g. "2025-04-16"
     end_date   = request.args.get('end')         # e.g. "2025-04-22"
     company    = request.args.get('companyName')
     if not (start_date and end_date and company):
-        return jsonify({"error":"Missing required parameters"}), 400
+        raise ValueError("Missing required parameters")
 
     # parse + extend end_dt by one full day
     try:
         start_dt = datetime.strptime(start_date, '%Y-%m-%d')
         end_dt   = datetime.strptime(end_date,   '%Y-%m-%d') + timedelta(days=1)
     except ValueError:
-        return jsonify({"error":"Invalid date format"}), 400
-
-    inv_ref   = db.collection('companies').document(company).collection('inventory')
-
-    # fetch adds & updates separately
-    added_q   = inv_ref.where('added_at',   '>=', start_dt).where('added_at',   '<', end_dt)
-    updated_q = inv_ref.where('updated_at', '>=', start_dt).where('updated_at', '<', end_dt)
-
-    seen = set()
-    results = []
-
-    #  newly added items
-    for snap in added_q.stream():
-        d = snap.to_dict()
-        d['id']      = snap.id
-        d['_action'] = 'added'
-        results.append(d)
-        seen.add(snap.id)
-
-    #  updated items (skip ones we already included)
-    for snap in updated_q.stream():
-        if snap.id in seen: 
-            continue
-        d = snap.to_dict()
-        d['id']      = snap.id
-        d['_action'] = 'updated'
-        results.append(d)
-        seen.add(snap.id)
-
-    #  normalize all timestamp fields into ISO strings
-    for d in results:
-        for fld in ('added_at','updated_at'):
-            ts = d.get(fld)
-            if isinstance(ts, datetime):
-                d[fld] = ts.isoformat()
-            elif hasattr(ts, 'to_datetime'):   # google.cloud.Timestamp
-                d[fld] = ts.to_datetime().isoformat()
-            elif hasattr(ts, 'ToDatetime'):     # protobuf Timestamp
-                d[fld] = ts.ToDatetime().isoformat()
-            else:
-                d[fld] = None
+        raise ValueError("Invalid date format")
+    return company, start_dt, end_dt
 
-    return jsonify(results), 200
+
+# Get Reports
+@app.route('/api/reports', methods=['GET'])
+def get_reports():
+    try:
+        company, start_dt, end_dt = report_range_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # every add/update/delete/import in the window, one page at a time from the event log;
+    # the full range is served by /api/export/reports
+    try:
+        limit = pagination.parse_limit(request.args.get('limit'))
+        rows, next_cursor = inventory_events.read_page(
+            company, start_dt, end_dt, limit, request.args.get('startAfter')
+        )
+    except pagination.PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"items": rows, "nextCursor": next_cursor}), 200
+
+# Streaming exports: ?format=csv|xlsx|parquet
+@app.route('/api/export/inventory', methods=['GET'])
+def export_inventory():
+    company_name = request.args.get('companyName')
+    if not company_name:
+        return jsonify({"error": "Company name is required"}), 400
+    fmt = request.args.get('format', 'csv').lower()
+    try:
+        exports.check_format(fmt)
+    except exports.ExportError as e:
+        return jsonify({"error": str(e)}), 400
+    return exports.export_response(
+        exports.inventory_rows(company_name), exports.INVENTORY_COLUMNS, fmt, "inventory"
+    )
+
+
+@app.route('/api/export/reports', methods=['GET'])
+def export_reports():
+    try:
+        company, start_dt, end_dt = report_range_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    fmt = request.args.get('format', 'csv').lower()
+    try:
+        exports.check_format(fmt)
+    except exports.ExportError as e:
+        return jsonify({"error": str(e)}), 400
+    return exports.export_response(
+        exports.report_rows(company, start_dt, end_dt), exports.REPORT_COLUMNS, fmt, "inventory_report"
+    )
 
 # Get Analytics 
 @app.route('/api/analytics', methods=['GET'])
@@ -929,23 +1179,22 @@ def get_analytics():
     except Exception as e:
         return jsonify({"error": "Invalid date format"}), 400
 
+    try:
+        top_k = inventory_analytics.parse_top_k(request.args.get('top'))
+    except ValueError:
+        return jsonify({"error": "top must be a positive integer"}), 400
+
     inventory_ref = db.collection('companies').document(company_name).collection('inventory')
     query = inventory_ref.where('added_at', '>=', start_dt).where('added_at', '<=', end_dt)
-    total_stock = 0
-    total_sold = 0
-    items = []
     try:
-        for doc in query.stream():
-            data = doc.to_dict()
-            total_stock += data.get('quantity', 0)
-            total_sold += data.get('sold', 0)
-            items.append(data)
-        top_selling = sorted(items, key=lambda x: x.get('sold', 0), reverse=True)[:5]
+        totals = inventory_analytics.range_totals(query)
+        top_selling = inventory_analytics.top_selling(query, top_k)
         # Placeholder for a simple trend analysis (e.g., average stock change per day)
         trend = "Trend analysis placeholder"  
         analytics = {
-            "total_stock": total_stock,
-            "total_sold": total_sold,
+            "total_stock": totals["total_stock"],
+            "total_sold": totals["total_sold"],
+            "item_count": totals["item_count"],
             "top_selling": top_selling,
             "trend": trend
         }
@@ -954,7 +1203,35 @@ def get_analytics():
         return jsonify({"error": str(e)}), 500
     
 
+# Days of daily stock trends included in the analytics summary
+STOCK_TREND_DAYS = int(os.getenv("STOCK_TREND_DAYS", 30))
+TOP_SELLING_COUNT = 5
+
+
+@app.route('/api/stock-trends', methods=['GET'])
+@company_versions.conditional_get([company_versions.INVENTORY], company_versions.company_from_args)
+def get_stock_trends():
+    company_name = request.args.get('companyName')
+    if not company_name:
+        return jsonify({"error": "Company name is required"}), 400
+    try:
+        start_day, end_day, granularity = stock_trends.parse_range(
+            request.args.get('start'), request.args.get('end'), request.args.get('granularity', 'day')
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        series = stock_trends.series(company_name, start_day, end_day, granularity)
+        return jsonify({"granularity": granularity, "series": series}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/api/analytics-summary', methods=['GET'])
+# the trend window ends today, so the ETag changes with the date as well as the data
+@company_versions.conditional_get([company_versions.INVENTORY, company_versions.TASKS],
+                                  company_versions.company_from_args, daily=True)
 def analytics_summary():
     company_name = request.args.get('companyName')
     if not company_name:
@@ -976,87 +1253,34 @@ def analytics_summary():
             "avgPrice": 0.0,
         }
 
-        # Reference to inventory subcollection
-        inventory_ref = db.collection('companies').document(company_name).collection('inventory')
-
-        items = []
-        stock_trends = []
-
-        for doc in inventory_ref.stream():
-            data = doc.to_dict()
-            # For 'stockTrends' if "added_at" is present
-            if "added_at" in data:
-                try:
-                    # Firestore Timestamp => Python datetime
-                    timestamp = data["added_at"].timestamp()
-                    date_str = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d")
-                except AttributeError:
-                    # If 'added_at' has .seconds
-                    date_str = datetime.fromtimestamp(data["added_at"].seconds).strftime("%Y-%m-%d")
-
-                stock_trends.append({
-                    "date": date_str,
-                    "stock": data.get("quantity", 0),
-                    "sold": data.get("sold", 0)
-                })
-            items.append(data)
-
-        # Save stockTrends in analytics
-        analytics["stockTrends"] = stock_trends
-
-        # Compute top_selling from items
-        top_selling = sorted(items, key=lambda x: x.get("sold", 0), reverse=True)[:5]
-        analytics["top_selling"] = top_selling
-
-        # Inventory summary fields
-        total_items = 0
-        total_value = 0.0
-        cat_dict = {}
-        out_of_stock_count = 0
-        prices = []  # for avg price
-
-        for it in items:
-            quantity = it.get("quantity", 0)
-            price = it.get("price", 0)
-            total_items += quantity
-            total_value += quantity * price
-
-            cat_name = it.get("category", "Uncategorized")
-            cat_dict[cat_name] = cat_dict.get(cat_name, 0) + 1
-
-            if quantity <= 0:
-                out_of_stock_count += 1
-            if "price" in it:
-                prices.append(price)
-
-        # Convert cat_dict => array of { name, count }
-        category_list = [{"name": k, "count": v} for k, v in cat_dict.items()]
-
-        avg_price = sum(prices) / len(prices) if prices else 0.0
-
-        analytics["totalItems"] = total_items
-        analytics["totalValue"] = total_value
-        analytics["categoryCount"] = len(category_list)
-        analytics["categories"] = category_list
-        analytics["outOfStockCount"] = out_of_stock_count
-        analytics["avgPrice"] = avg_price
-
-        # Low stock => threshold
-        low_stock_list = []
-        low_stock_query = inventory_ref.where("quantity", "<=", 5)
-        for doc in low_stock_query.stream():
-            d = doc.to_dict()
-            d["id"] = doc.id
-            low_stock_list.append(d)
-        analytics["lowStock"] = low_stock_list
+        company_ref = db.collection('companies').document(company_name)
+        tasks_query = company_ref.collection("tasks")\
+                                 .order_by("createdAt", direction=firestore.Query.DESCENDING).limit(20)
+        top_selling_query = company_ref.collection("inventory")\
+                                       .order_by("sold", direction=firestore.Query.DESCENDING).limit(TOP_SELLING_COUNT)
+
+        # independent reads run concurrently; each is timed in the Server-Timing header
+        fan = request_fanout.current()
+        fan.submit("lowStock", reorder_levels.low_stock_items, company_name, caller_is_member(company_name))
+        fan.submit("topSelling", lambda: list(top_selling_query.stream()))
+        fan.submit("totals", inventory_aggregates.read_summary, company_name)
+        fan.submit("tasks", lambda: list(tasks_query.stream()))
+        # daily rollups, so the chart payload depends on the date range rather than the SKU count
+        today = datetime.utcnow().date()
+        fan.submit("trends", stock_trends.series, company_name,
+                   today - timedelta(days=STOCK_TREND_DAYS - 1), today)
+
+        analytics["stockTrends"] = fan.result("trends")
+        analytics["top_selling"] = [snap.to_dict() for snap in fan.result("topSelling")]
+        # Low stock => the maintained reorder flag
+        analytics["lowStock"] = [{**data, "id": item_id} for item_id, data in fan.result("lowStock")]
+
+        # Inventory summary fields, maintained incrementally by the write paths
+        analytics.update(fan.result("totals"))
 
         # Fetch tasks => store them in analytics["notifications"]
-        tasks_ref = db.collection("companies").document(company_name).collection("tasks")
-        tasks_query = tasks_ref.order_by("createdAt", direction=firestore.Query.DESCENDING).limit(20)
-        tasks_snap = tasks_query.stream()
-
         tasks_list = []
-        for tdoc in tasks_snap:
+        for tdoc in fan.result("tasks"):
             tdata = tdoc.to_dict()
             tdata["id"] = tdoc.id
             tasks_list.append(tdata)
@@ -1066,10 +1290,76 @@ def analytics_summary():
         # Return everything
         return jsonify(analytics), 200
 
+    except request_fanout.QueryTimeout as e:
+        print("Error in analytics_summary:", str(e))
+        return jsonify({"error": str(e)}), 504
     except Exception as e:
         print("Error in analytics_summary:", str(e))
         return jsonify({"error": str(e)}), 500
 
+# --------------------------------------------------------------------------------
+# Maintenance Commands
+# --------------------------------------------------------------------------------
+@app.cli.command("rebuild-user-directory")
+def rebuild_user_directory_command():
+    """Rebuilds the uid -> company directory from every company's users."""
+    written = user_directory.rebuild_directory()
+    print(f"✅ Rebuilt {written} user directory entries")
+
+
+@app.cli.command("rebuild-aggregates")
+@click.argument("company_name", required=False)
+def rebuild_aggregates_command(company_name):
+    """Recomputes the analytics-summary totals for one company, or all of them."""
+    companies = [company_name] if company_name else [ref.id for ref in db.collection('companies').list_documents()]
+    for name in companies:
+        totals = inventory_aggregates.rebuild(name)
+        print(f"✅ Rebuilt aggregates for {name}: {totals['itemCount']} items")
+
+
+@app.cli.command("backfill-inventory-events")
+@click.argument("company_name", required=False)
+def backfill_inventory_events_command(company_name):
+    """Seeds the inventory event log from items that predate it."""
+    companies = [company_name] if company_name else [ref.id for ref in db.collection('companies').list_documents()]
+    for name in companies:
+        written = inventory_events.backfill(name)
+        print(f"✅ Backfilled {written} inventory events for {name}")
+
+
+@app.cli.command("refresh-reorder-flags")
+@click.argument("company_name", required=False)
+def refresh_reorder_flags_command(company_name):
+    """Recomputes every item's below_reorder flag for one company, or all of them."""
+    companies = [company_name] if company_name else [ref.id for ref in db.collection('companies').list_documents()]
+    for name in companies:
+        changed = reorder_levels.refresh_flags(name)
+        print(f"✅ Updated the reorder flag on {changed} items for {name}")
+
+
+
+@app.cli.command("compact-stock-movements")
+def compact_stock_movements_command():
+    """Folds every pending stock movement into its item's quantity and sold."""
+    total = 0
+    while True:
+        folded = stock_movements.compact_pending()
+        if not folded:
+            break
+        total += folded
+    print(f"✅ Compacted {total} stock movements")
+
+
+@app.cli.command("migrate-item-ids")
+@click.argument("company_name", required=False)
+def migrate_item_ids_command(company_name):
+    """Re-keys inventory items to their deterministic ids, merging duplicates."""
+    companies = [company_name] if company_name else [ref.id for ref in db.collection('companies').list_documents()]
+    for name in companies:
+        result = item_ids.migrate(name)
+        print(f"✅ Re-keyed inventory for {name}: {result['moved']} moved, {result['merged']} merged, "
+              f"{result['failed']} failed")
+
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    app.run(debug=True, port=5000)
\ No newline at end of file
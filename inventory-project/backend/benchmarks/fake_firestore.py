@@ -0,0 +1,734 @@
+"""
+In-memory stand-in for the subset of the Firestore client used by the backend.
+
+Documents live in a dict keyed by their full path, indexed by parent
+collection and by collection id so a query only visits its own collection.
+Every read and write is counted on ``FakeClient.stats`` so callers can see how
+many Firestore operations a request would have cost.
+"""
+import copy
+import itertools
+from collections import defaultdict
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from google.api_core import exceptions
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.field_path import FieldPath, split_field_path
+
+
+_id_counter = itertools.count()
+
+
+def _auto_id():
+    return uuid.uuid4().hex[:20]
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _split(field_path):
+    if isinstance(field_path, FieldPath):
+        return list(field_path.parts)
+    return split_field_path(field_path)
+
+
+def _get_nested(data, field_path):
+    parts = _split(field_path)
+    value = data
+    for part in parts:
+        if not isinstance(value, dict) or part not in value:
+            raise KeyError(field_path)
+        value = value[part]
+    return value
+
+
+def _set_nested(data, parts, value):
+    for part in parts[:-1]:
+        child = data.get(part)
+        if not isinstance(child, dict):
+            child = {}
+            data[part] = child
+        data = child
+    data[parts[-1]] = value
+
+
+def _delete_nested(data, parts):
+    for part in parts[:-1]:
+        data = data.get(part)
+        if not isinstance(data, dict):
+            return
+    data.pop(parts[-1], None)
+
+
+def _sort_key(value):
+    """Order values the way Firestore orders mixed types."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return (3, value.timestamp())
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, bytes):
+        return (5, value)
+    if isinstance(value, FakeDocumentReference):
+        return (6, value.path)
+    if isinstance(value, list):
+        return (8, [_sort_key(v) for v in value])
+    return (9, str(value))
+
+
+def _apply_transform(current, value):
+    if value is transforms.SERVER_TIMESTAMP:
+        return _now()
+    if isinstance(value, transforms.Increment):
+        base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+        return base + value.value
+    if isinstance(value, transforms.ArrayUnion):
+        result = list(current) if isinstance(current, list) else []
+        for item in value.values:
+            if item not in result:
+                result.append(item)
+        return result
+    if isinstance(value, transforms.ArrayRemove):
+        result = list(current) if isinstance(current, list) else []
+        return [item for item in result if item not in value.values]
+    return copy.deepcopy(value)
+
+
+def _resolve_nested(data, existing):
+    """Resolve sentinels nested inside a ``set`` payload."""
+    resolved = {}
+    for key, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            continue
+        if isinstance(value, dict):
+            sub_existing = existing.get(key) if isinstance(existing, dict) else None
+            resolved[key] = _resolve_nested(value, sub_existing or {})
+        else:
+            current = existing.get(key) if isinstance(existing, dict) else None
+            resolved[key] = _apply_transform(current, value)
+    return resolved
+
+
+def _merge(target, data):
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+
+class AggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference, data, update_time=None):
+        self.reference = reference
+        self._data = data
+        self.update_time = update_time
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        if self._data is None:
+            return None
+        return copy.deepcopy(_get_nested(self._data, field_path))
+
+
+class FakeDocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self._path = path
+
+    def __eq__(self, other):
+        return isinstance(other, FakeDocumentReference) and other._path == self._path
+
+    def __hash__(self):
+        return hash(self._path)
+
+    def __repr__(self):
+        return f"<FakeDocumentReference {self._path}>"
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def id(self):
+        return self._path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        return FakeCollectionReference(self._client, self._path.rsplit("/", 1)[0])
+
+    def collection(self, name):
+        return FakeCollectionReference(self._client, f"{self._path}/{name}")
+
+    def get(self, field_paths=None, transaction=None, **kwargs):
+        return self._client._read(self, field_paths)
+
+    def set(self, data, merge=False):
+        self._client._write([("set", self, data, merge)])
+
+    def create(self, data):
+        self._client._write([("create", self, data, False)])
+
+    def update(self, data):
+        self._client._write([("update", self, data, False)])
+
+    def delete(self):
+        self._client._write([("delete", self, None, False)])
+
+    def on_snapshot(self, callback):
+        return self._client._watch(self._path, callback, document=True)
+
+
+class FakeQuery:
+    def __init__(self, client, path, filters=(), orders=(), limit=None,
+                 projection=None, start_after=None, limit_to_last=False):
+        self._client = client
+        self._path = path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._projection = projection
+        self._start_after = start_after
+        self._limit_to_last = limit_to_last
+
+    def _copy(self, **overrides):
+        params = dict(
+            filters=self._filters, orders=self._orders, limit=self._limit,
+            projection=self._projection, start_after=self._start_after,
+            limit_to_last=self._limit_to_last,
+        )
+        params.update(overrides)
+        return FakeQuery(self._client, self._path, **params)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def select(self, field_paths):
+        return self._copy(projection=list(field_paths))
+
+    def start_after(self, document_fields):
+        return self._copy(start_after=document_fields)
+
+    def count(self, alias=None):
+        return FakeAggregationQuery(self).count(alias)
+
+    def sum(self, field_path, alias=None):
+        return FakeAggregationQuery(self).sum(field_path, alias)
+
+    def avg(self, field_path, alias=None):
+        return FakeAggregationQuery(self).avg(field_path, alias)
+
+    def _matches(self, data):
+        for field_path, op, expected in self._filters:
+            if field_path == "__name__":
+                continue
+            try:
+                actual = _get_nested(data, field_path)
+            except KeyError:
+                return False
+            if op == "==":
+                if actual != expected:
+                    return False
+            elif op == "!=":
+                if actual == expected:
+                    return False
+            elif op == "in":
+                if actual not in expected:
+                    return False
+            elif op == "array-contains":
+                if not isinstance(actual, list) or expected not in actual:
+                    return False
+            elif op == "array-contains-any":
+                if not isinstance(actual, list) or not set(actual) & set(expected):
+                    return False
+            else:
+                a, b = _sort_key(actual), _sort_key(expected)
+                if a[0] != b[0]:
+                    return False
+                if op == "<" and not a < b:
+                    return False
+                if op == "<=" and not a <= b:
+                    return False
+                if op == ">" and not a > b:
+                    return False
+                if op == ">=" and not a >= b:
+                    return False
+        return True
+
+    def _run(self):
+        rows = []
+        if self._path.startswith("**/"):
+            source = self._client._group_children(self._path[3:])
+        else:
+            source = self._client._children(self._path)
+        for ref, data in source:
+            if self._matches(data):
+                rows.append((ref, data))
+        orders = list(self._orders)
+        for field_path, _ in orders:
+            if field_path != "__name__":
+                rows = [(r, d) for r, d in rows if _has(d, field_path)]
+        if orders:
+            if orders[-1][0] != "__name__":
+                orders.append(("__name__", orders[-1][1]))
+            for field_path, direction in reversed(orders):
+                rows.sort(
+                    key=lambda row: _order_value(row, field_path),
+                    reverse=direction in ("DESCENDING", "desc"),
+                )
+        if self._start_after is not None:
+            rows = self._apply_cursor(rows, orders)
+        if self._limit is not None:
+            rows = rows[: self._limit]
+        return rows
+
+    def _apply_cursor(self, rows, orders):
+        cursor = self._start_after
+        if isinstance(cursor, FakeDocumentSnapshot):
+            values = dict(cursor._data or {})
+            values["__name__"] = cursor.id
+        else:
+            values = dict(cursor)
+        keys = []
+        for field_path, direction in orders:
+            if field_path not in values:
+                break
+            value = values[field_path]
+            if field_path == "__name__" and isinstance(value, FakeDocumentReference):
+                value = value.id
+            keys.append((field_path, direction, _sort_key(value)))
+
+        def after(row):
+            for field_path, direction, target in keys:
+                current = _order_value(row, field_path)
+                if current == target:
+                    continue
+                descending = direction in ("DESCENDING", "desc")
+                return current < target if descending else current > target
+            return False
+
+        return [row for row in rows if after(row)]
+
+    def stream(self, transaction=None, **kwargs):
+        rows = self._run()
+        self._client._count_reads(max(len(rows), 1))
+        for ref, data in rows:
+            if self._projection is not None:
+                data = _project(data, self._projection)
+            yield FakeDocumentSnapshot(ref, copy.deepcopy(data), self._client._update_times.get(ref.path))
+
+    def get(self, transaction=None, **kwargs):
+        return list(self.stream())
+
+    def on_snapshot(self, callback):
+        return self._client._watch(self._path, callback, query=self)
+
+
+def _has(data, field_path):
+    try:
+        _get_nested(data, field_path)
+        return True
+    except KeyError:
+        return False
+
+
+def _order_value(row, field_path):
+    ref, data = row
+    if field_path == "__name__":
+        return (4, ref.id)
+    return _sort_key(_get_nested(data, field_path))
+
+
+def _project(data, field_paths):
+    projected = {}
+    for field_path in field_paths:
+        try:
+            _set_nested(projected, _split(field_path), copy.deepcopy(_get_nested(data, field_path)))
+        except KeyError:
+            pass
+    return projected
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client, path):
+        super().__init__(client, path)
+
+    @property
+    def id(self):
+        return self._path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        if "/" not in self._path:
+            return None
+        return FakeDocumentReference(self._client, self._path.rsplit("/", 1)[0])
+
+    def document(self, document_id=None):
+        return FakeDocumentReference(self._client, f"{self._path}/{document_id or _auto_id()}")
+
+    def add(self, data, document_id=None):
+        ref = self.document(document_id)
+        ref.create(data)
+        return _now(), ref
+
+    def list_documents(self):
+        return [ref for ref, _ in self._client._children(self._path)]
+
+
+class FakeAggregationQuery:
+    def __init__(self, query):
+        self._query = query
+        self._aggregations = []
+
+    def count(self, alias=None):
+        self._aggregations.append(("count", None, alias or "count"))
+        return self
+
+    def sum(self, field_path, alias=None):
+        self._aggregations.append(("sum", field_path, alias or "sum"))
+        return self
+
+    def avg(self, field_path, alias=None):
+        self._aggregations.append(("avg", field_path, alias or "avg"))
+        return self
+
+    def get(self, transaction=None, **kwargs):
+        rows = self._query._run()
+        # Aggregations are billed per batch of up to 1000 index entries.
+        self._query._client._count_reads(max(1, (len(rows) + 999) // 1000))
+        results = []
+        for kind, field_path, alias in self._aggregations:
+            if kind == "count":
+                results.append(AggregationResult(alias, len(rows)))
+                continue
+            values = []
+            for _, data in rows:
+                try:
+                    value = _get_nested(data, field_path)
+                except KeyError:
+                    continue
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    values.append(value)
+            if kind == "sum":
+                results.append(AggregationResult(alias, sum(values)))
+            else:
+                results.append(AggregationResult(alias, sum(values) / len(values) if values else None))
+        return [results]
+
+
+class FakeWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(("set", reference, document_data, merge))
+        return self
+
+    def create(self, reference, document_data):
+        self._writes.append(("create", reference, document_data, False))
+        return self
+
+    def update(self, reference, field_updates, option=None):
+        self._writes.append(("update", reference, field_updates, option))
+        return self
+
+    def delete(self, reference, option=None):
+        self._writes.append(("delete", reference, None, option))
+        return self
+
+    def __len__(self):
+        return len(self._writes)
+
+    def commit(self, **kwargs):
+        writes, self._writes = self._writes, []
+        self._client._write(writes)
+        return [None] * len(writes)
+
+
+class FakeTransaction(FakeWriteBatch):
+    """Enough of ``Transaction`` for ``firestore.transactional`` to drive it."""
+
+    def __init__(self, client, max_attempts=5, read_only=False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    @property
+    def id(self):
+        return self._id
+
+    def _clean_up(self):
+        self._writes = []
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._id = uuid.uuid4().bytes
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _commit(self):
+        self.commit()
+        self._clean_up()
+        return []
+
+    def get(self, ref_or_query, **kwargs):
+        if isinstance(ref_or_query, FakeDocumentReference):
+            return iter([ref_or_query.get()])
+        return ref_or_query.stream()
+
+
+class FakeWriteOption:
+    def __init__(self, last_update_time):
+        self.last_update_time = last_update_time
+
+
+class FakeWatch:
+    def __init__(self, client, key):
+        self._client = client
+        self._key = key
+
+    def unsubscribe(self):
+        self._client._watchers.pop(self._key, None)
+
+
+class FakeClient:
+    """Thread-safe in-memory Firestore client."""
+
+    def __init__(self):
+        self._docs = {}
+        self._by_collection = defaultdict(dict)   # collection path -> {doc path: data}
+        self._by_group = defaultdict(dict)        # collection id -> {doc path: data}
+        self._update_times = {}
+        self._lock = threading.RLock()
+        self._watchers = {}
+        self.stats = {"reads": 0, "writes": 0}
+
+    # -- public client API -------------------------------------------------
+    def collection(self, name):
+        return FakeCollectionReference(self, name)
+
+    def document(self, path):
+        return FakeDocumentReference(self, path)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def collection_group(self, collection_id):
+        return FakeQuery(self, "**/" + collection_id)
+
+    def write_option(self, last_update_time=None, exists=None):
+        return FakeWriteOption(last_update_time)
+
+    def bulk_writer(self, **kwargs):
+        return FakeBulkWriter(self)
+
+    def transaction(self, **kwargs):
+        return FakeTransaction(self, **kwargs)
+
+    def get_all(self, references, field_paths=None, transaction=None, **kwargs):
+        for ref in references:
+            yield self._read(ref, field_paths)
+
+    def collections(self):
+        roots = sorted({path.split("/", 1)[0] for path in self._docs})
+        return [FakeCollectionReference(self, name) for name in roots]
+
+    # -- helpers for callers -----------------------------------------------
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"reads": 0, "writes": 0}
+
+    def _count_reads(self, count):
+        with self._lock:
+            self.stats["reads"] += count
+
+    # -- storage -----------------------------------------------------------
+    def _children(self, collection_path):
+        with self._lock:
+            items = list(self._by_collection.get(collection_path, {}).items())
+        return [(FakeDocumentReference(self, path), data) for path, data in items]
+
+    def _group_children(self, collection_id):
+        with self._lock:
+            items = list(self._by_group.get(collection_id, {}).items())
+        return [(FakeDocumentReference(self, path), data) for path, data in items]
+
+    def _read(self, ref, field_paths=None):
+        with self._lock:
+            self.stats["reads"] += 1
+            data = self._docs.get(ref.path)
+            data = copy.deepcopy(data) if data is not None else None
+            update_time = self._update_times.get(ref.path)
+        if data is not None and field_paths is not None:
+            data = _project(data, field_paths)
+        return FakeDocumentSnapshot(ref, data, update_time)
+
+    def _write(self, writes):
+        changed = []
+        with self._lock:
+            staged = {}
+            for kind, ref, data, merge in writes:
+                path = ref.path
+                if isinstance(merge, FakeWriteOption):
+                    if self._update_times.get(path) != merge.last_update_time:
+                        raise exceptions.FailedPrecondition(f"Document changed since it was read: {path}")
+                    merge = False
+                current = staged[path] if path in staged else self._docs.get(path)
+                if kind == "create":
+                    if current is not None:
+                        raise exceptions.AlreadyExists(f"Document already exists: {path}")
+                    new = _resolve_nested(data, {})
+                elif kind == "set":
+                    if merge and current is not None:
+                        new = copy.deepcopy(current)
+                        _merge(new, _resolve_nested(data, current))
+                        _drop_deleted(new, data)
+                    else:
+                        new = _resolve_nested(data, {})
+                elif kind == "update":
+                    if current is None:
+                        raise exceptions.NotFound(f"No document to update: {path}")
+                    new = copy.deepcopy(current)
+                    for field_path, value in data.items():
+                        parts = _split(field_path)
+                        if value is transforms.DELETE_FIELD:
+                            _delete_nested(new, parts)
+                            continue
+                        try:
+                            existing = _get_nested(new, field_path)
+                        except KeyError:
+                            existing = None
+                        if isinstance(value, dict):
+                            value = _resolve_nested(value, existing or {})
+                        else:
+                            value = _apply_transform(existing, value)
+                        _set_nested(new, parts, value)
+                else:
+                    new = None
+                staged[path] = new
+            now = _now()
+            for path, new in staged.items():
+                before = self._docs.get(path)
+                collection_path, _ = path.rsplit("/", 1)
+                collection_id = collection_path.rsplit("/", 1)[-1]
+                if new is None:
+                    self._docs.pop(path, None)
+                    self._by_collection[collection_path].pop(path, None)
+                    self._by_group[collection_id].pop(path, None)
+                    self._update_times.pop(path, None)
+                else:
+                    self._docs[path] = new
+                    self._by_collection[collection_path][path] = new
+                    self._by_group[collection_id][path] = new
+                    self._update_times[path] = now
+                changed.append((path, before, new))
+            self.stats["writes"] += len(writes)
+        self._notify(changed)
+
+    # -- listeners ---------------------------------------------------------
+    def _watch(self, path, callback, query=None, document=False):
+        key = next(_id_counter)
+        with self._lock:
+            self._watchers[key] = (path, callback, query, document)
+        if document:
+            snapshot = self._read(FakeDocumentReference(self, path))
+            callback([snapshot], [], _now())
+        else:
+            snapshots = list((query or FakeCollectionReference(self, path)).stream())
+            changes = [FakeChange("ADDED", snap) for snap in snapshots]
+            callback(snapshots, changes, _now())
+        return FakeWatch(self, key)
+
+    def _notify(self, changed):
+        if not self._watchers or not changed:
+            return
+        for path_, callback, query, document in list(self._watchers.values()):
+            relevant = []
+            for path, before, after in changed:
+                if document:
+                    if path == path_:
+                        relevant.append((path, before, after))
+                elif path.rsplit("/", 1)[0] == path_:
+                    relevant.append((path, before, after))
+            if not relevant:
+                continue
+            changes = []
+            for path, before, after in relevant:
+                ref = FakeDocumentReference(self, path)
+                if after is None:
+                    kind = "REMOVED"
+                elif before is None:
+                    kind = "ADDED"
+                else:
+                    kind = "MODIFIED"
+                changes.append(FakeChange(kind, FakeDocumentSnapshot(
+                    ref, copy.deepcopy(after if after is not None else before),
+                    self._update_times.get(path) if after is not None else None)))
+            callback([c.document for c in changes], changes, _now())
+
+
+def _drop_deleted(target, data):
+    for key, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _drop_deleted(target[key], value)
+
+
+class _ChangeType:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeChange:
+    def __init__(self, kind, document):
+        self.type = _ChangeType(kind)
+        self.document = document
+
+
+class FakeBulkWriter(FakeWriteBatch):
+    def flush(self):
+        self.commit()
+
+    def close(self):
+        self.commit()
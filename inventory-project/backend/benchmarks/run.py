@@ -0,0 +1,524 @@
+"""
+Endpoint benchmarks against an in-memory Firestore.
+
+Drives every route in app.py and tasks_api.py through Flask's test client,
+with db_init's client replaced by benchmarks/fake_firestore.py, Firebase Auth
+answered locally and outgoing mail dropped, so only the backend's own work is
+measured.
+
+A scenario seeds N companies (an admin and a staff member each) and gives the
+first of them M inventory items, then times every endpoint against it. One
+JSON object per (scenario, endpoint) is written per line:
+
+    {"companies": 1000, "items": 10000, "endpoint": "GET /api/inventory",
+     "requests": 20, "status": {"200": 20}, "first_ms": ..., "p50_ms": ...,
+     "p90_ms": ..., "p99_ms": ..., "max_ms": ..., "reads_per_request": ...,
+     "writes_per_request": ..., "peak_kib": ...}
+
+Reads and writes are document operations counted by the fake, the unit
+Firestore bills in, so a request whose cost grows with the tenant count (a
+scan over every company) shows up as a number that grows with `companies`.
+Background threads (listeners, notification queues) share the counters, so
+treat small differences as noise. Peak memory is traced over one extra
+request with tracemalloc.
+
+Run from backend/:
+
+    python benchmarks/run.py
+    python benchmarks/run.py --companies 10,100,1000,10000 --items 100,1000,10000,100000
+    python benchmarks/run.py --only inventory --requests 50 --output results.jsonl
+
+Each scenario runs in its own process, so caches and listeners start cold.
+Endpoints that answer with a 5xx are listed on stderr and the run exits with
+status 1, so a benchmark run doubles as a smoke test.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import types
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+DEFAULT_COMPANIES = "10,1000"
+DEFAULT_ITEMS = "100,10000"
+PASSWORD = "Bench1!pass"
+CATEGORIES = 20
+SUPPLIERS = 50
+
+
+# --------------------------------------------------------------------------------
+# Fakes
+# --------------------------------------------------------------------------------
+class _AuthUser:
+    def __init__(self, uid, email):
+        self.uid = uid
+        self.email = email
+        self.email_verified = True
+
+
+def install_fakes():
+    """
+    Points db_init at the fake client, instrumented as the real one is, and
+    answers Firebase Auth and SMTP locally. Returns the bare client, for
+    seeding and for its read/write counts.
+    """
+    os.environ.setdefault("JWT_SECRET", "benchmark-only-secret-of-at-least-32-bytes")
+    # nothing may reach Google or a mail server, and background work runs inline or not at all
+    os.environ["TOKEN_CERT_REFRESH_SECONDS"] = "0"
+    os.environ["STOCK_COMPACT_SECONDS"] = "0"
+    os.environ["COUNTER_REFRESH_SECONDS"] = "0"
+    # the "pre-directory user" login case measures the opt-in legacy scan
+    os.environ["USER_DIRECTORY_LEGACY_SCAN"] = "1"
+    sys.path.insert(0, BACKEND_DIR)
+
+    from fake_firestore import FakeClient
+    import firestore_metrics
+    client = FakeClient()
+    db_init = types.ModuleType("db_init")
+    db_init.db = firestore_metrics.instrument(client)
+    sys.modules["db_init"] = db_init
+
+    from firebase_admin import auth
+    users = {}
+
+    def get_user_by_email(email):
+        if email not in users:
+            raise auth.UserNotFoundError(f"No user record found for {email}")
+        return users[email]
+
+    def create_user(email, password=None, **kwargs):
+        users[email] = _AuthUser(f"user-{len(users)}", email)
+        return users[email]
+
+    auth.get_user_by_email = get_user_by_email
+    auth.create_user = create_user
+    auth.generate_email_verification_link = lambda email, *args, **kwargs: "https://example.invalid/verify"
+    auth.generate_password_reset_link = lambda email, *args, **kwargs: "https://example.invalid/reset"
+    auth.verify_id_token = lambda token, *args, **kwargs: {
+        "uid": token, "email": f"{token}@bench.invalid", "exp": time.time() + 3600,
+    }
+    auth.bench_users = users
+
+    import mailer
+    mailer.send = lambda *args, **kwargs: True
+    return client
+
+
+# --------------------------------------------------------------------------------
+# Seeding
+# --------------------------------------------------------------------------------
+class Context:
+    """What the endpoint cases need to know about the seeded data."""
+
+    def __init__(self, companies, items, requests):
+        self.companies = companies
+        self.items = items
+        self.requests = requests
+        self.company = "bench-0"
+        self.admin_uid = "admin-bench-0"
+        self.admin_email = "admin@bench-0.invalid"
+        self.legacy_uid = f"legacy-bench-{companies - 1}"
+        self.legacy_email = f"legacy@bench-{companies - 1}.invalid"
+        self.item_ids = []
+        self.item_keys = []
+        self.disposable_ids = []
+        self.job_id = None
+
+
+class _Writer:
+    """Batched seeding writes."""
+
+    def __init__(self, db):
+        self.db = db
+        self.batch = db.batch()
+        self.pending = 0
+
+    def set(self, ref, data):
+        self.batch.set(ref, data)
+        self.pending += 1
+        if self.pending >= 500:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.batch.commit()
+        self.batch, self.pending = self.db.batch(), 0
+
+
+def _user(uid, email, company, role):
+    return {"uid": uid, "email": email, "firstName": "Bench", "lastName": uid, "role": role,
+            "status": "active", "company": company}
+
+
+def _item(index, rng, now, name=None):
+    return {
+        "name": name or f"Item {index:06d}",
+        "supplier": f"Supplier {index % SUPPLIERS}",
+        "category": f"Category {index % CATEGORIES}",
+        "description": f"Synthetic item {index}",
+        "quantity": rng.randint(0, 200),
+        "price": round(rng.uniform(1, 500), 2),
+        "sold": rng.randint(0, 1000),
+        "added_at": now - timedelta(days=rng.randint(0, 29)),
+        "updated_at": now,
+        "price_diff": 0,
+        "price_change": "no_change",
+        "added_by": "Bench admin",
+        "updated_by": "Bench admin",
+    }
+
+
+def seed(db, ctx):
+    import inventory_aggregates
+    import inventory_events
+    import item_ids
+    import reorder_levels
+    import user_directory
+    from firebase_admin import auth
+
+    rng = random.Random(1234)
+    now = datetime.now(timezone.utc)
+    writer = _Writer(db)
+    companies = db.collection('companies')
+    for index in range(ctx.companies):
+        name = f"bench-{index}"
+        company_ref = companies.document(name)
+        admin_uid, staff_uid = f"admin-{name}", f"staff-{name}"
+        writer.set(company_ref, {"name": name, "createdAt": now, "members": [admin_uid, staff_uid],
+                                 "adminUid": admin_uid})
+        writer.set(company_ref.collection('inventory').document("placeholder"),
+                   {"createdAt": now, "note": "Initial inventory doc"})
+        for uid, role in ((admin_uid, "admin"), (staff_uid, "staff")):
+            email = f"{uid.split('-', 1)[0]}@{name}.invalid"
+            user = _user(uid, email, name, role)
+            writer.set(company_ref.collection('users').document(uid), user)
+            writer.set(db.collection(user_directory.DIRECTORY_COLLECTION).document(uid),
+                       {"company": name, "role": role, "fullName": user_directory.full_name_of(user)})
+            auth.bench_users[email] = _AuthUser(uid, email)
+    # a user from before the directory existed, in the last company a scan reaches
+    legacy_company = companies.document(f"bench-{ctx.companies - 1}")
+    writer.set(legacy_company.collection('users').document(ctx.legacy_uid),
+               _user(ctx.legacy_uid, ctx.legacy_email, legacy_company.id, "staff"))
+    auth.bench_users[ctx.legacy_email] = _AuthUser(ctx.legacy_uid, ctx.legacy_email)
+
+    # staff the promote/demote/remove cases act on
+    bench_users = companies.document(ctx.company).collection('users')
+    for index in range(ctx.requests + 1):
+        uid = f"member-{index}"
+        writer.set(bench_users.document(uid), _user(uid, f"{uid}@bench-0.invalid", ctx.company, "staff"))
+
+    inventory = companies.document(ctx.company).collection('inventory')
+    for index in range(ctx.items):
+        item = _item(index, rng, now)
+        item[reorder_levels.FLAG_FIELD] = reorder_levels.is_below(item, {})
+        item_id = item_ids.id_of(item)
+        writer.set(inventory.document(item_id), item)
+        ctx.item_ids.append(item_id)
+        ctx.item_keys.append((item["name"], item["supplier"], item["category"], item["price"]))
+    for index in range(ctx.requests + 1):
+        item = _item(ctx.items + index, rng, now, name=f"Disposable {index:04d}")
+        item_id = item_ids.id_of(item)
+        writer.set(inventory.document(item_id), item)
+        ctx.disposable_ids.append(item_id)
+    for index in range(20):
+        writer.set(companies.document(ctx.company).collection('tasks').document(),
+                   {"title": f"Task {index}", "description": "", "urgency": "low",
+                    "createdAt": now - timedelta(minutes=index)})
+    writer.flush()
+
+    inventory_aggregates.rebuild(ctx.company)
+    inventory_events.backfill(ctx.company)
+
+
+def _csv(ctx, rows):
+    lines = ["Item Name,Description,Category,Quantity,Price,Supplier"]
+    for name, supplier, category, price in ctx.item_keys[:rows]:
+        lines.append(f"{name},restock,{category},1,{price},{supplier}")
+    lines.extend(f"Imported {index:04d},new,Imported,5,9.99,Bench" for index in range(rows - len(lines) + 1))
+    return "\n".join(lines).encode("utf-8")
+
+
+# --------------------------------------------------------------------------------
+# Endpoint cases
+# --------------------------------------------------------------------------------
+class Case:
+    """
+    One endpoint to time. `kwargs(i)` builds the test-client arguments for
+    the i-th request; `before(i)` runs untimed ahead of it.
+    """
+
+    def __init__(self, method, path, kwargs=None, before=None, label=None):
+        self.method = method
+        self.path = path
+        self._kwargs = kwargs
+        self.before = before
+        self.name = f"{method} {label or path.split('?', 1)[0]}"
+
+    def path_for(self, i):
+        return self.path(i) if callable(self.path) else self.path
+
+    def kwargs(self, i):
+        if self._kwargs is None:
+            return {}
+        return self._kwargs(i) if callable(self._kwargs) else dict(self._kwargs)
+
+
+def cases(db, ctx):
+    import user_directory
+
+    c = ctx.company
+    uid_header = {"uid": ctx.admin_uid}
+    bearer = {"Authorization": f"Bearer {ctx.admin_uid}", "companyName": c}
+    today = datetime.now(timezone.utc).date()
+    date_range = f"start={today - timedelta(days=29)}&end={today}"
+    item_id = ctx.item_ids[0] if ctx.item_ids else ctx.disposable_ids[-1]
+    name, supplier, category, price = ctx.item_keys[0] if ctx.item_keys else ("Bench", "Bench", None, 1.0)
+    csv = _csv(ctx, min(100, max(ctx.items, 1)))
+    bulk = {"operations": [{"op": "upsert", "id": i, "quantity": 50} for i in ctx.item_ids[:100]]}
+    members = db.collection('companies').document(c).collection('users')
+
+    def set_member_role(role):
+        def before(i):
+            uid = f"member-{i}"
+            members.document(uid).set(_user(uid, f"{uid}@bench-0.invalid", c, role))
+            user_directory.record_user(uid, c, role, f"Bench {uid}")
+        return before
+
+    def forget_legacy_user(i):
+        user_directory.remove_user(ctx.legacy_uid)
+
+    return [
+        Case("GET", "/"),
+        Case("POST", "/api/issueToken", {"json": {"idToken": ctx.admin_uid}}),
+        Case("POST", "/api/signup", lambda i: {"json": {
+            "email": f"new-{i}-{time.monotonic_ns()}@bench.invalid", "password": PASSWORD,
+            "companyName": c, "firstName": "New", "lastName": f"User {i}"}}),
+        Case("POST", "/api/login", {"json": {"email": ctx.admin_email, "password": PASSWORD}}),
+        Case("POST", "/api/login", {"json": {"email": ctx.legacy_email, "password": PASSWORD}},
+             before=forget_legacy_user, label="/api/login (pre-directory user)"),
+        Case("POST", "/api/google-signin", {"json": {"idToken": ctx.admin_uid}}),
+        Case("POST", "/api/forgot-password", {"json": {"email": ctx.admin_email}}),
+        Case("GET", f"/api/inventory?companyName={c}", {"headers": uid_header}),
+        Case("GET", f"/api/inventory?companyName={c}&limit=50", label="/api/inventory?limit=50"),
+        Case("GET", f"/api/inventory/search?companyName={c}&q=item+category", {"headers": uid_header}),
+        Case("GET", f"/api/reorder-levels?companyName={c}"),
+        Case("PUT", "/api/reorder-levels", lambda i: {
+            "headers": uid_header, "json": {"categories": {"Category 0": i % 10}}}),
+        Case("POST", "/api/upload-csv", lambda i: {
+            "headers": uid_header, "content_type": "multipart/form-data",
+            "data": {"file": (io.BytesIO(csv), "items.csv")}}),
+        Case("GET", f"/api/import-jobs/{ctx.job_id}", {"headers": uid_header}, label="/api/import-jobs/<job_id>"),
+        Case("POST", "/api/add-inventory", {"headers": uid_header, "json": {
+            "name": name, "supplier": supplier, "category": category, "quantity": 1, "price": price}}),
+        Case("PUT", f"/api/update-inventory/{item_id}", lambda i: {
+            "headers": uid_header, "json": {"price": price + i / 100}}, label="/api/update-inventory/<item_id>"),
+        Case("DELETE", lambda i: f"/api/delete-inventory/{ctx.disposable_ids[i]}", {"headers": uid_header},
+             label="/api/delete-inventory/<item_id>"),
+        Case("POST", f"/api/inventory/{item_id}/movements", {
+            "headers": uid_header, "json": {"type": "sale", "quantity": 1}}, label="/api/inventory/<item_id>/movements"),
+        Case("GET", f"/api/inventory/{item_id}/movements?companyName={c}", label="/api/inventory/<item_id>/movements"),
+        Case("PUT", f"/api/inventory/{item_id}/counter-shards", lambda i: {
+            "headers": uid_header, "json": {"shards": 4 if i % 2 == 0 else 0}},
+             label="/api/inventory/<item_id>/counter-shards"),
+        Case("POST", "/api/inventory/bulk", {"headers": uid_header, "json": bulk}),
+        Case("GET", "/api/token-cache/stats"),
+        Case("GET", "/api/inventory-cache/stats"),
+        Case("GET", "/metrics"),
+        Case("GET", "/api/users", {"headers": bearer}),
+        Case("PUT", lambda i: f"/api/users/member-{i}/promote", {"headers": bearer},
+             before=set_member_role("staff"), label="/api/users/<uid>/promote"),
+        Case("PUT", lambda i: f"/api/users/member-{i}/demote", {"headers": bearer},
+             before=set_member_role("manager"), label="/api/users/<uid>/demote"),
+        Case("DELETE", lambda i: f"/api/users/member-{i}/remove", {"headers": bearer},
+             before=set_member_role("staff"), label="/api/users/<uid>/remove"),
+        Case("GET", f"/api/reports?companyName={c}&{date_range}"),
+        Case("GET", f"/api/export/inventory?companyName={c}&format=csv"),
+        Case("GET", f"/api/export/reports?companyName={c}&{date_range}&format=csv"),
+        Case("GET", f"/api/analytics?companyName={c}&{date_range}"),
+        Case("GET", f"/api/stock-trends?companyName={c}&{date_range}"),
+        Case("GET", f"/api/analytics-summary?companyName={c}", {"headers": uid_header}),
+        Case("GET", "/api/tasks", {"headers": {"companyName": c}}),
+        Case("POST", "/api/tasks", lambda i: {"headers": {"companyName": c}, "json": {"title": f"Bench task {i}"}}),
+        Case("GET", "/api/low-stock", {"headers": {**uid_header, "companyName": c}}),
+    ]
+
+
+def uncovered_routes(app, case_list):
+    """Endpoints registered on `app` that no case reaches."""
+    adapter = app.url_map.bind("localhost")
+    covered = set()
+    for case in case_list:
+        path = case.path_for(0).split("?", 1)[0]
+        try:
+            endpoint, _ = adapter.match(path, method=case.method)
+        except Exception:
+            continue
+        covered.add((endpoint, case.method))
+    expected = {
+        (rule.endpoint, method)
+        for rule in app.url_map.iter_rules() if rule.endpoint != "static"
+        for method in rule.methods - {"HEAD", "OPTIONS"}
+    }
+    return sorted(f"{method} {endpoint}" for endpoint, method in expected - covered)
+
+
+# --------------------------------------------------------------------------------
+# Measuring
+# --------------------------------------------------------------------------------
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    # nearest rank
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def _timed_request(client, case, i):
+    start = time.perf_counter()
+    response = client.open(case.path_for(i), method=case.method, **case.kwargs(i))
+    response.get_data()        # streamed bodies do their work while being read
+    elapsed = (time.perf_counter() - start) * 1000
+    response.close()
+    return response.status_code, elapsed
+
+
+def measure(client, db, case, requests):
+    latencies, statuses = [], Counter()
+    reads = writes = 0
+    for i in range(requests):
+        if case.before:
+            case.before(i)
+        db.reset_stats()
+        status, elapsed = _timed_request(client, case, i)
+        reads += db.stats["reads"]
+        writes += db.stats["writes"]
+        latencies.append(elapsed)
+        statuses[str(status)] += 1
+
+    # one more request, traced, for peak memory
+    if case.before:
+        case.before(requests)
+    tracemalloc.start()
+    try:
+        _timed_request(client, case, requests)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    ordered = sorted(latencies)
+    return {
+        "endpoint": case.name,
+        "requests": requests,
+        "status": dict(statuses),
+        "first_ms": round(latencies[0], 3),
+        "p50_ms": round(_percentile(ordered, 0.50), 3),
+        "p90_ms": round(_percentile(ordered, 0.90), 3),
+        "p99_ms": round(_percentile(ordered, 0.99), 3),
+        "max_ms": round(ordered[-1], 3),
+        "reads_per_request": round(reads / requests, 2),
+        "writes_per_request": round(writes / requests, 2),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def run_scenario(companies, items, requests, only, out):
+    """Benchmarks every selected endpoint. Returns the names of those that answered with a 5xx."""
+    db = install_fakes()
+    import app as backend
+    import import_jobs
+
+    ctx = Context(companies, items, requests)
+    started = time.perf_counter()
+    seed(db, ctx)
+    seed_seconds = round(time.perf_counter() - started, 2)
+
+    client = backend.app.test_client()
+    response = client.post("/api/upload-csv?async=1", headers={"uid": ctx.admin_uid},
+                           content_type="multipart/form-data",
+                           data={"file": (io.BytesIO(_csv(ctx, 10)), "items.csv")})
+    ctx.job_id = response.get_json()["jobId"]
+    import_jobs.wait_for(ctx.company, ctx.job_id, timeout=60)
+
+    case_list = cases(db, ctx)
+    missing = uncovered_routes(backend.app, case_list)
+    if missing:
+        print(f"❌ Routes without a benchmark case: {', '.join(missing)}", file=sys.stderr)
+    server_errors = []
+    for case in case_list:
+        if only and not any(part in case.name for part in only):
+            continue
+        result = {"companies": companies, "items": items, "seed_seconds": seed_seconds,
+                  **measure(client, db, case, requests)}
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+        errors = {status: count for status, count in result["status"].items() if status.startswith("5")}
+        if errors:
+            server_errors.append(f"{case.name} {errors}")
+    if server_errors:
+        print(f"❌ {len(server_errors)} endpoints answered with server errors "
+              f"({companies} companies x {items} items):", file=sys.stderr)
+        for line in server_errors:
+            print(f"   {line}", file=sys.stderr)
+    return server_errors
+
+
+def _sizes(value):
+    return [int(size) for size in value.split(",") if size.strip()]
+
+
+def main(argv=None):
+    """Returns the exit status: 1 if any endpoint answered with a 5xx, else 0."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0].strip())
+    parser.add_argument("--companies", default=DEFAULT_COMPANIES, help="comma-separated company counts")
+    parser.add_argument("--items", default=DEFAULT_ITEMS, help="comma-separated item counts for the measured company")
+    parser.add_argument("--requests", type=int, default=20, help="timed requests per endpoint")
+    parser.add_argument("--only", action="append", default=[],
+                        help="only endpoints whose name contains this text (repeatable)")
+    parser.add_argument("--output", help="write JSON lines here instead of stdout")
+    args = parser.parse_args(argv)
+    if args.requests < 1:
+        parser.error("--requests must be at least 1")
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    scenarios = [(companies, items) for companies in _sizes(args.companies) for items in _sizes(args.items)]
+    try:
+        if len(scenarios) == 1:
+            # the backend logs with print; keep stdout for results
+            results, sys.stdout = sys.stdout, sys.stderr
+            try:
+                server_errors = run_scenario(*scenarios[0], args.requests, args.only,
+                                             out if args.output else results)
+            finally:
+                sys.stdout = results
+            return 1 if server_errors else 0
+
+        failed = False
+        for companies, items in scenarios:
+            print(f"✅ Benchmarking {companies} companies x {items} items", file=sys.stderr)
+            command = [sys.executable, os.path.abspath(__file__), "--companies", str(companies),
+                       "--items", str(items), "--requests", str(args.requests)]
+            for part in args.only:
+                command += ["--only", part]
+            child = subprocess.run(command, stdout=subprocess.PIPE, text=True, cwd=BACKEND_DIR)
+            out.write(child.stdout)
+            out.flush()
+            if child.returncode:
+                failed = True
+                print(f"❌ Scenario {companies} x {items} exited with {child.returncode}", file=sys.stderr)
+        return 1 if failed else 0
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Per-company data version stamps, served as ETags.
+
+`companies/{c}.dataVersions` holds one counter per scope ("inventory",
+"tasks") that every write path increments, and `dataVersionTimes` the commit
+time of each counter's last bump. GET endpoints derive their ETag
+from the counters they depend on and answer 304 when the client already has
+that version. Counters are cached in-process for VERSION_CACHE_TTL seconds, so
+a matching conditional GET usually costs no Firestore read at all. Writers
+call `invalidate` once their bump has committed, so this worker sees its own
+bumps straight away; bumps from other workers are seen within the TTL. A read
+that raced an invalidation is not cached, so it cannot pin the old version.
+"""
+import hashlib
+import os
+import threading
+from datetime import datetime
+from functools import wraps
+
+from cachetools import TTLCache
+from firebase_admin import firestore
+from flask import request, make_response
+
+from db_init import db
+
+VERSION_FIELD = "dataVersions"
+VERSION_TIME_FIELD = "dataVersionTimes"
+INVENTORY = "inventory"
+TASKS = "tasks"
+
+_cache = TTLCache(
+    maxsize=int(os.getenv("VERSION_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("VERSION_CACHE_TTL", 5)),
+)
+_lock = threading.Lock()
+_generations = {}  # company -> invalidations so far
+
+
+def _company_ref(company_name):
+    return db.collection('companies').document(company_name)
+
+
+def _bump_payload(scopes):
+    return {
+        VERSION_FIELD: {scope: firestore.Increment(1) for scope in scopes},
+        VERSION_TIME_FIELD: {scope: firestore.SERVER_TIMESTAMP for scope in scopes},
+    }
+
+
+def invalidate(company_name):
+    """Drops the cached counters; call it after a bump commits, never before."""
+    with _lock:
+        _cache.pop(company_name, None)
+        _generations[company_name] = _generations.get(company_name, 0) + 1
+
+
+def stage_bump(batch, company_ref, *scopes):
+    """
+    Adds the version bump for `scopes` to a WriteBatch or Transaction. The
+    caller invalidates the company once it commits (inventory_changes.after_commit
+    does for inventory writes).
+    """
+    batch.set(company_ref, _bump_payload(scopes), merge=True)
+
+
+def bump(company_name, *scopes):
+    _company_ref(company_name).set(_bump_payload(scopes), merge=True)
+    invalidate(company_name)
+
+
+def current(company_name):
+    """Returns {scope: counter} for the company, read at most once per TTL."""
+    with _lock:
+        versions = _cache.get(company_name)
+        generation = _generations.get(company_name, 0)
+    if versions is None:
+        snap = _company_ref(company_name).get()
+        versions = (snap.to_dict() or {}).get(VERSION_FIELD, {}) if snap.exists else {}
+        with _lock:
+            # a commit invalidated while we read; what we read may predate it
+            if _generations.get(company_name, 0) == generation:
+                _cache[company_name] = versions
+    return versions
+
+
+def etag_for(company_name, scopes, daily=False):
+    versions = current(company_name)
+    stamp = company_name + "|" + "|".join(f"{scope}={versions.get(scope, 0)}" for scope in scopes)
+    if daily:
+        stamp += "|" + datetime.utcnow().date().isoformat()
+    return hashlib.sha1(stamp.encode("utf-8")).hexdigest()[:20]
+
+
+def conditional_get(scopes, company_from, daily=False):
+    """
+    Decorator for GET views: sets an ETag built from the company's `scopes`
+    versions and returns 304 when If-None-Match already matches it.
+    `company_from` is called inside the request to find the company name.
+    Set `daily` for views whose body also depends on today's date (UTC).
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            company_name = company_from()
+            if not company_name:
+                return fn(*args, **kwargs)
+            # read the version before the data, so the ETag is never newer than the body
+            etag = etag_for(company_name, scopes, daily)
+            if request.if_none_match.contains(etag):
+                response = make_response("", 304)
+                response.set_etag(etag)
+                return response
+            response = make_response(fn(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
+
+
+def company_from_args():
+    return request.args.get('companyName')
+
+
+def company_from_headers():
+    return request.headers.get('companyName')
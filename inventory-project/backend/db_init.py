@@ -2,7 +2,10 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 import os
 
+import firestore_metrics
+
 cred = credentials.Certificate("firebase_config.json")
 firebase_admin.initialize_app(cred)
 
-db = firestore.client()
\ No newline at end of file
+# every call through `db` is counted and timed per request; see metrics
+db = firestore_metrics.instrument(firestore.client())
\ No newline at end of file
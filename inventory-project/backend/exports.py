@@ -0,0 +1,218 @@
+"""
+Streaming inventory and report exports.
+
+Rows are read from a Firestore stream and written out CHUNK_ROWS at a time
+through a generator, so the server holds one chunk in memory however large
+the export is. Formats:
+
+    csv      encoded and sent chunk by chunk
+    parquet  one row group per chunk, sent as soon as it is encoded (pyarrow)
+    xlsx     openpyxl write-only workbook spooled to a temp file and then
+             streamed; a zip archive cannot be sent before it is finished
+"""
+import csv
+import io
+import os
+import tempfile
+from datetime import datetime, timezone
+
+from flask import Response, stream_with_context
+
+import inventory_aggregates
+import inventory_events
+from db_init import db
+
+CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 1000))
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# (column, kind) where kind is str | int | float | ts
+INVENTORY_COLUMNS = [
+    ("id", "str"), ("name", "str"), ("description", "str"), ("category", "str"),
+    ("supplier", "str"), ("quantity", "int"), ("price", "float"), ("sold", "int"),
+    ("price_diff", "float"), ("price_change", "str"),
+    ("added_at", "ts"), ("added_by", "str"), ("updated_at", "ts"), ("updated_by", "str"),
+]
+REPORT_COLUMNS = [
+    ("at", "ts"), ("_action", "str"), ("source", "str"), ("actor", "str"),
+] + INVENTORY_COLUMNS + [("eventId", "str")]
+
+
+class ExportError(ValueError):
+    """Unsupported format or a missing optional dependency; callers return a 400."""
+
+
+# --------------------------------------------------------------------------------
+# Row sources
+# --------------------------------------------------------------------------------
+def inventory_rows(company_name):
+    inventory_ref = db.collection('companies').document(company_name).collection('inventory')
+    for snap in inventory_ref.stream():
+        item = snap.to_dict()
+        if inventory_aggregates.is_item(item):
+            item["id"] = snap.id
+            yield item
+
+
+def report_rows(company_name, start_dt, end_dt):
+    query = inventory_events.range_query(company_name, start_dt, end_dt).order_by(inventory_events.TIME_FIELD)
+    for snap in query.stream():
+        yield inventory_events.report_row(snap.id, snap.to_dict())
+
+
+# --------------------------------------------------------------------------------
+# Value coercion
+# --------------------------------------------------------------------------------
+def _to_datetime(value):
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _coerce(value, kind):
+    if value is None:
+        return None
+    try:
+        if kind == "int":
+            return int(value)
+        if kind == "float":
+            return float(value)
+    except (TypeError, ValueError):
+        return None
+    if kind == "ts":
+        return _to_datetime(value)
+    return str(value)
+
+
+def _chunks(rows, columns):
+    """Lists of at most CHUNK_ROWS coerced value tuples."""
+    chunk = []
+    for row in rows:
+        chunk.append(tuple(_coerce(row.get(name), kind) for name, kind in columns))
+        if len(chunk) >= CHUNK_ROWS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# --------------------------------------------------------------------------------
+# Writers
+# --------------------------------------------------------------------------------
+def _csv_stream(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    for chunk in _chunks(rows, columns):
+        writer.writerows(
+            [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            for row in chunk
+        )
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that keeps written bytes until the generator takes them."""
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _parquet_stream(rows, columns):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"str": pa.string(), "int": pa.int64(), "float": pa.float64(), "ts": pa.timestamp("us", tz="UTC")}
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    try:
+        for chunk in _chunks(rows, columns):
+            writer.write_table(pa.Table.from_pylist(
+                [dict(zip(schema.names, row)) for row in chunk], schema=schema
+            ))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def _xlsx_stream(rows, columns):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Export")
+    sheet.append([name for name, _ in columns])
+    for chunk in _chunks(rows, columns):
+        for row in chunk:
+            # Excel has no time zones; cells are written in UTC
+            sheet.append([value.replace(tzinfo=None) if isinstance(value, datetime) else value
+                          for value in row])
+    with tempfile.TemporaryFile() as spool:
+        workbook.save(spool)
+        spool.seek(0)
+        while True:
+            data = spool.read(64 * 1024)
+            if not data:
+                break
+            yield data
+
+
+_WRITERS = {"csv": _csv_stream, "parquet": _parquet_stream, "xlsx": _xlsx_stream}
+_DEPENDENCIES = {"parquet": "pyarrow", "xlsx": "openpyxl"}
+
+
+def check_format(fmt):
+    """Raises ExportError unless `fmt` can be produced in this environment."""
+    if fmt not in FORMATS:
+        raise ExportError(f"format must be one of {', '.join(FORMATS)}")
+    module = _DEPENDENCIES.get(fmt)
+    if module:
+        try:
+            __import__(module)
+        except ImportError:
+            raise ExportError(f"{fmt} export requires the {module} package")
+
+
+def export_response(rows, columns, fmt, basename):
+    """A streamed download of `rows` in `fmt`; call check_format first."""
+    filename = f"{basename}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{fmt}"
+    # the request context stays up while streaming, so the reads are metered under their route
+    return Response(
+        stream_with_context(_WRITERS[fmt](rows, columns)),
+        mimetype=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
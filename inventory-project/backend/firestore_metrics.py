@@ -0,0 +1,205 @@
+"""
+Instrumented Firestore client.
+
+`instrument(client)` returns a proxy for the client that behaves like it but
+counts and times, per request (see metrics), every:
+
+    get          document reads: DocumentReference.get, get_all, Transaction.get of a reference
+    stream       query streams, timed until the caller finishes iterating
+    query        Query.get and Transaction.get of a query
+    aggregation  count/sum/avg queries
+    write        single-document set, create, update, delete and add
+    batch        WriteBatch.commit
+    transaction  the commit of a firestore.transactional function
+
+References, queries, batches, transactions and snapshots reached from the
+proxy are proxied too, so `snap.reference.update(...)` is still counted, and
+proxies are unwrapped before they are handed back to the SDK. Snapshot
+listeners are passed through untimed; they are not part of any request.
+"""
+import time
+from datetime import datetime
+from types import GeneratorType
+
+import metrics
+
+SNAPSHOT, TRANSACTION, BATCH, CLIENT, QUERY, DOCUMENT = (
+    "snapshot", "transaction", "batch", "client", "query", "document",
+)
+_PLAIN = (str, bytes, int, float, dict, datetime)
+_WRITES = ("set", "create", "update", "delete", "add")
+
+
+def _kind(value):
+    if value is None or isinstance(value, _PLAIN):
+        return None
+    if hasattr(value, "to_dict"):
+        return SNAPSHOT
+    if hasattr(value, "commit"):
+        return TRANSACTION if hasattr(value, "_begin") else BATCH
+    if hasattr(value, "get_all"):
+        return CLIENT
+    if hasattr(value, "stream"):
+        return QUERY
+    if hasattr(value, "collection"):
+        return DOCUMENT
+    return None
+
+
+def _wrap(value):
+    if type(value) is _Proxy:
+        return value
+    if isinstance(value, list):
+        return [_wrap(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_wrap(item) for item in value)
+    kind = _kind(value)
+    return value if kind is None else _Proxy(value, kind)
+
+
+def _unwrap(value):
+    if type(value) is _Proxy:
+        return value._wrapped
+    if isinstance(value, list):
+        return [_unwrap(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_unwrap(item) for item in value)
+    if isinstance(value, GeneratorType):
+        return (_unwrap(item) for item in value)
+    return value
+
+
+def _unwrap_kwargs(kwargs):
+    return {key: _unwrap(value) for key, value in kwargs.items()}
+
+
+def _operation(kind, name, wrapped, args, kwargs):
+    """Which operation calling `name` on a `kind` object is, or None if it is not a Firestore call."""
+    if kind == CLIENT:
+        return "get" if name == "get_all" else None
+    if kind == DOCUMENT:
+        if name == "get":
+            return "get"
+        return "write" if name in _WRITES else None
+    if kind == QUERY:
+        if name in ("get", "stream"):
+            if "Aggregation" in type(wrapped).__name__:
+                return "aggregation"
+            return "query" if name == "get" else "stream"
+        return "write" if name == "add" else None
+    if kind == BATCH:
+        return "batch" if name == "commit" else None
+    if kind == TRANSACTION:
+        if name == "get_all":
+            return "get"
+        if name == "get":
+            target = args[0] if args else kwargs.get("ref_or_query")
+            return "query" if _kind(_unwrap(target)) == QUERY else "get"
+    return None
+
+
+def _pending_writes(batch):
+    # the SDK's len() of a batch counts documents, not the writes staged on them
+    write_pbs = getattr(batch, "_write_pbs", None)
+    return len(write_pbs) if write_pbs is not None else len(batch)
+
+
+def _timed_iter(operation, iterator, elapsed):
+    """Yields `iterator`'s items, recording the operation once the caller stops iterating."""
+    documents, error = 0, False
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            except Exception:
+                error = True
+                raise
+            finally:
+                elapsed += time.perf_counter() - start
+            documents += 1
+            yield _wrap(item)
+    finally:
+        metrics.record_firestore(operation, elapsed, 1 if operation == "aggregation" else documents, error)
+
+
+class _Proxy:
+    __slots__ = ("_wrapped", "_kind")
+
+    def __init__(self, wrapped, kind):
+        object.__setattr__(self, "_wrapped", wrapped)
+        object.__setattr__(self, "_kind", kind)
+
+    # isinstance checks, in the SDK or in callers, see the wrapped type
+    @property
+    def __class__(self):
+        return type(self._wrapped)
+
+    def __getattr__(self, name):
+        wrapped, kind = self._wrapped, self._kind
+        value = getattr(wrapped, name)
+        if kind == TRANSACTION and name == "_commit":
+            # firestore.transactional commits through the private method
+            return lambda *args, **kwargs: self._call("transaction", value, args, kwargs)
+        if name.startswith("_"):
+            return value
+        if not callable(value):
+            return _wrap(value)
+        if kind == SNAPSHOT or name == "on_snapshot":
+            return value
+
+        def call(*args, **kwargs):
+            operation = _operation(kind, name, wrapped, args, kwargs)
+            if operation is None:
+                return _wrap(value(*_unwrap(args), **_unwrap_kwargs(kwargs)))
+            return self._call(operation, value, args, kwargs)
+        return call
+
+    def _call(self, operation, method, args, kwargs):
+        # a commit's writes are gone once it returns
+        writes = _pending_writes(self._wrapped) if operation in ("batch", "transaction") else None
+        start = time.perf_counter()
+        try:
+            result = method(*_unwrap(args), **_unwrap_kwargs(kwargs))
+        except Exception:
+            metrics.record_firestore(operation, time.perf_counter() - start, 0, error=True)
+            raise
+        elapsed = time.perf_counter() - start
+        if hasattr(result, "__next__"):
+            return _timed_iter(operation, result, elapsed)
+        if writes is not None:
+            documents = writes
+        elif operation == "aggregation" or not isinstance(result, list):
+            documents = 1
+        else:
+            documents = len(result)
+        metrics.record_firestore(operation, elapsed, documents)
+        return _wrap(result)
+
+    def __setattr__(self, name, value):
+        setattr(self._wrapped, name, value)
+
+    def __eq__(self, other):
+        return self._wrapped == _unwrap(other)
+
+    def __ne__(self, other):
+        return self._wrapped != _unwrap(other)
+
+    def __hash__(self):
+        return hash(self._wrapped)
+
+    def __bool__(self):
+        return bool(self._wrapped)
+
+    def __len__(self):
+        return len(self._wrapped)
+
+    def __repr__(self):
+        return repr(self._wrapped)
+
+
+def instrument(client):
+    """`client` with every Firestore call it makes counted and timed."""
+    return _Proxy(client, CLIENT)
@@ -0,0 +1,186 @@
+"""
+Background CSV/Excel import jobs.
+
+`submit` stores the upload in a temp file, records the job in
+`companies/{c}/importJobs/{id}` and returns its id straight away. A daemon
+thread drains an in-process queue: for each job it parses the file in a
+process pool (pandas parsing holds the GIL) and then writes the prepared
+chunks to Firestore, updating the job document as it goes. The upload and
+the queue stay on the worker that took the POST, but any worker can answer
+GET /api/import-jobs/<id>.
+
+Parse workers are spawned and import only import_parsing, never db_init.
+Spawning also re-imports the main script, so start the backend with
+`flask run` or a WSGI server rather than `python app.py` when parse workers
+are on. There is no external broker; set IMPORT_PARSE_WORKERS=0 to parse on
+the queue thread instead.
+
+Job documents carry an `expireAt` IMPORT_JOB_RETENTION_SECONDS after their
+last update; give the importJobs collection group a TTL policy on that field
+so Firestore deletes them. Until it does, expired jobs are reported missing.
+"""
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from db_init import db
+import import_parsing
+import inventory_import
+
+PARSE_WORKERS = int(os.getenv("IMPORT_PARSE_WORKERS", 2))
+# Finished jobs stay queryable for this long
+JOB_RETENTION_SECONDS = int(os.getenv("IMPORT_JOB_RETENTION_SECONDS", 24 * 3600))
+JOBS_COLLECTION = "importJobs"
+EXPIRY_FIELD = "expireAt"
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+_parse_pool = None
+
+
+def _get_parse_pool():
+    global _parse_pool
+    if _parse_pool is None and PARSE_WORKERS > 0:
+        # spawn, not fork: the parent holds gRPC threads that must not be forked
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=PARSE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _parse_pool
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_drain_queue, name="import-jobs", daemon=True)
+            _worker.start()
+
+
+def _job_ref(company_name, job_id):
+    return db.collection('companies').document(company_name).collection(JOBS_COLLECTION).document(job_id)
+
+
+def _expiry():
+    return datetime.now(timezone.utc) + timedelta(seconds=JOB_RETENTION_SECONDS)
+
+
+def submit(file, company_name, uploader, requested_by):
+    """Saves the uploaded `file` and queues an import. Returns the job id."""
+    suffix = os.path.splitext(file.filename)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        file.save(tmp)
+        upload_path = tmp.name
+
+    job_id = uuid.uuid4().hex
+    job = {
+        "id": job_id,
+        "company": company_name,
+        "requestedBy": requested_by,
+        "filename": file.filename,
+        "state": "queued",
+        "chunks": 0,
+        "rowsProcessed": 0,
+        "created": 0,
+        "updated": 0,
+        "failed": 0,
+        "errors": [],
+        "error": None,
+        "queuedAt": time.time(),
+        "startedAt": None,
+        "finishedAt": None,
+        EXPIRY_FIELD: _expiry(),
+    }
+    try:
+        _job_ref(company_name, job_id).set(job)
+    except Exception:
+        os.remove(upload_path)
+        raise
+    _queue.put((company_name, job_id, file.filename, upload_path, uploader))
+    _ensure_worker()
+    return job_id
+
+
+def get_job(company_name, job_id):
+    """Returns a snapshot of the company's job with its current throughput, or None."""
+    snap = _job_ref(company_name, job_id).get()
+    job = snap.to_dict() if snap.exists else None
+    if job is None:
+        return None
+    expires = job.pop(EXPIRY_FIELD, None)
+    if isinstance(expires, datetime) and expires < datetime.now(timezone.utc):
+        return None
+    if job["startedAt"]:
+        elapsed = (job["finishedAt"] or time.time()) - job["startedAt"]
+        job["throughput"] = round(job["rowsProcessed"] / elapsed, 2) if elapsed > 0 else 0.0
+    else:
+        job["throughput"] = 0.0
+    return job
+
+
+def wait_for(company_name, job_id, timeout=None):
+    """Blocks until the job is done or failed. Returns its final snapshot."""
+    deadline = None if timeout is None else time.time() + timeout
+    while True:
+        job = get_job(company_name, job_id)
+        if job is None or job["state"] in ("done", "failed"):
+            return job
+        if deadline is not None and time.time() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def _update(company_name, job_id, **fields):
+    """Writes job fields; a failed write is logged and the job carries on."""
+    try:
+        _job_ref(company_name, job_id).update({**fields, EXPIRY_FIELD: _expiry()})
+    except Exception as e:
+        print(f"❌ Error updating import job {job_id}: {e}")
+
+
+def _drain_queue():
+    while True:
+        job = _queue.get()
+        try:
+            _run_job(*job)
+        finally:
+            _queue.task_done()
+
+
+def _run_job(company_name, job_id, filename, upload_path, uploader):
+    _update(company_name, job_id, state="parsing", startedAt=time.time())
+    chunk_dir = tempfile.mkdtemp(prefix="import-")
+    try:
+        pool = _get_parse_pool()
+        if pool is not None:
+            chunk_paths = pool.submit(import_parsing.prepare_file, upload_path, filename, chunk_dir).result()
+        else:
+            chunk_paths = import_parsing.prepare_file(upload_path, filename, chunk_dir)
+
+        _update(company_name, job_id, state="writing")
+        inventory_ref = db.collection('companies').document(company_name).collection('inventory')
+        progress = inventory_import.import_chunks(
+            db, inventory_ref, import_parsing.load_prepared(chunk_paths), uploader, prepared=True
+        )
+        errors = []
+        for step in progress:
+            room = inventory_import.MAX_REPORTED_ERRORS - len(errors)
+            if room > 0:
+                errors.extend(step["errors"][:room])
+            _update(company_name, job_id, chunks=step["chunk"], rowsProcessed=step["rowsProcessed"],
+                    created=step["created"], updated=step["updated"], failed=step["failed"], errors=errors)
+        _update(company_name, job_id, state="done", finishedAt=time.time())
+    except Exception as e:
+        print(f"❌ Import job {job_id} failed: {e}")
+        _update(company_name, job_id, state="failed", error=str(e), finishedAt=time.time())
+    finally:
+        os.remove(upload_path)
+        shutil.rmtree(chunk_dir, ignore_errors=True)
@@ -0,0 +1,132 @@
+"""
+Parsing half of an inventory import: reading the sheet, validating rows and
+merging duplicates. Nothing here touches Firestore, and this module must not
+import anything that does: import_jobs runs prepare_file in spawned worker
+processes, which import only this module and pandas.
+"""
+import os
+
+import pandas as pd
+
+REQUIRED_COLUMNS = ["Item Name", "Description", "Category", "Quantity", "Price", "Supplier"]
+KEY_COLUMNS = ["Item Name", "Supplier", "Category"]
+TEXT_COLUMNS = ["Item Name", "Description", "Category", "Supplier"]
+INVALID_FORMAT_ERROR = f"Invalid file format. Missing required columns: {REQUIRED_COLUMNS}"
+
+CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", 5000))
+
+
+def read_chunks(file, filename, chunksize=CHUNK_ROWS):
+    """
+    Yields DataFrames of at most `chunksize` rows. Excel workbooks cannot be
+    read incrementally by pandas, so they are yielded as a single frame.
+    """
+    dtype = {column: str for column in TEXT_COLUMNS}
+    if filename.endswith('.csv'):
+        yield from pd.read_csv(file, dtype=dtype, chunksize=chunksize)
+    else:
+        yield pd.read_excel(file, dtype=dtype)
+
+
+def missing_columns(df):
+    return [column for column in REQUIRED_COLUMNS if column not in df.columns]
+
+
+def _clean_text(series):
+    cleaned = series.astype("string").str.strip()
+    return cleaned.mask(cleaned == "")
+
+
+def clean_rows(df):
+    """
+    Coerces column types and drops invalid rows.
+    Returns (valid_df, errors) where errors is a list of {"row", "error"} dicts and
+    "row" is the 1-based line number in the uploaded file (the header is line 1).
+    """
+    df = df[REQUIRED_COLUMNS].copy()
+    for column in TEXT_COLUMNS:
+        df[column] = _clean_text(df[column])
+    df["Quantity"] = pd.to_numeric(df["Quantity"], errors="coerce")
+    df["Price"] = pd.to_numeric(df["Price"], errors="coerce")
+
+    # first matching reason wins, same order a reader would check a row in
+    checks = [
+        (df["Item Name"].isna(), "Missing Item Name"),
+        (df["Supplier"].isna(), "Missing Supplier"),
+        (df["Quantity"].isna(), "Quantity must be a number"),
+        (df["Price"].isna(), "Price must be a number"),
+    ]
+    reason = pd.Series(pd.NA, index=df.index, dtype="object")
+    for mask, message in reversed(checks):
+        reason = reason.mask(mask, message)
+    invalid = reason.notna()
+
+    errors = [
+        {"row": int(index) + 2, "error": message}
+        for index, message in reason[invalid].items()
+    ]
+    valid = df[~invalid].copy()
+    valid["Quantity"] = valid["Quantity"].astype("int64")
+    valid["Price"] = valid["Price"].astype("float64")
+    valid["Description"] = valid["Description"].fillna("")
+    return valid, errors
+
+
+def _key(series):
+    # item_ids.normalize, vectorised: whitespace collapsed, case folded, missing as empty
+    return series.fillna("").astype(str).str.split().str.join(" ").str.casefold()
+
+
+def merge_duplicates(df):
+    """
+    Collapses rows for the same item, i.e. the same deterministic id, so
+    spellings that differ only in case or spacing merge too: quantities are
+    summed, the last price in the file wins and the first spelling and
+    description are kept.
+    """
+    if df.empty:
+        return df
+    return (
+        df.groupby([_key(df[column]) for column in KEY_COLUMNS], sort=False)
+          .agg({
+              **{column: "first" for column in KEY_COLUMNS},
+              "Quantity": "sum", "Price": "last", "Description": "first",
+          })
+          .reset_index(drop=True)
+    )
+
+
+def prepare_frame(df):
+    """
+    CPU-bound half of an import: validation and duplicate merging, no Firestore.
+    Returns (merged_df, errors, row_count).
+    """
+    valid, errors = clean_rows(df)
+    return merge_duplicates(valid), errors, len(df)
+
+
+
+def prepare_file(path, filename, out_dir, chunksize=CHUNK_ROWS):
+    """
+    Process-pool entry point: parses the upload at `path` and pickles each
+    prepare_frame result into `out_dir`. Returns the chunk file paths in order.
+    Raises ValueError if the file is missing required columns.
+    """
+    paths = []
+    for number, chunk in enumerate(read_chunks(path, filename, chunksize)):
+        if number == 0 and missing_columns(chunk):
+            raise ValueError(INVALID_FORMAT_ERROR)
+        chunk_path = os.path.join(out_dir, f"chunk-{number:06d}.pkl")
+        pd.to_pickle(prepare_frame(chunk), chunk_path)
+        paths.append(chunk_path)
+    if not paths:
+        raise ValueError(INVALID_FORMAT_ERROR)
+    return paths
+
+
+def load_prepared(paths):
+    """Yields the chunks written by prepare_file one at a time, deleting each once read."""
+    for chunk_path in paths:
+        prepared = pd.read_pickle(chunk_path)
+        os.remove(chunk_path)
+        yield prepared
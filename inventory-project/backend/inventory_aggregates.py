@@ -0,0 +1,142 @@
+"""
+Incrementally maintained inventory totals for /api/analytics-summary.
+
+`companies/{c}/stats/inventory` holds the running totals. Every inventory
+write stages the difference it makes (see inventory_changes) as Firestore
+Increments in the same batch or transaction as the item write, so the summary
+is a single document read. `rebuild` recomputes the document from scratch to
+repair drift.
+"""
+from collections import Counter
+from datetime import datetime
+
+from firebase_admin import firestore
+
+from db_init import db
+
+STATS_COLLECTION = "stats"
+AGGREGATE_DOC = "inventory"
+UNCATEGORIZED = "Uncategorized"
+NUMERIC_FIELDS = ("itemCount", "totalItems", "totalValue", "outOfStockCount", "priceSum", "priceCount")
+
+
+def aggregate_ref(company_ref):
+    return company_ref.collection(STATS_COLLECTION).document(AGGREGATE_DOC)
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return 0
+    return value
+
+
+def is_item(data):
+    """Inventory docs without a name (e.g. the signup placeholder) are not items."""
+    return bool(data) and data.get("name") is not None
+
+
+def contribution(item):
+    """What a single item adds to the totals; empty for None or non-items."""
+    if not is_item(item):
+        return {}
+    quantity = _number(item.get("quantity", 0))
+    price = _number(item.get("price", 0))
+    return {
+        "itemCount": 1,
+        "totalItems": quantity,
+        "totalValue": quantity * price,
+        "outOfStockCount": 1 if quantity <= 0 else 0,
+        "priceSum": price if "price" in item else 0,
+        "priceCount": 1 if "price" in item else 0,
+        "categories": {item.get("category") or UNCATEGORIZED: 1},
+    }
+
+
+def delta(before, after):
+    """Totals difference for one item going from `before` to `after` (either may be None)."""
+    old, new = contribution(before), contribution(after)
+    result = {field: new.get(field, 0) - old.get(field, 0) for field in NUMERIC_FIELDS}
+    categories = Counter(new.get("categories", {}))
+    categories.subtract(old.get("categories", {}))
+    result["categories"] = {name: count for name, count in categories.items() if count}
+    return result
+
+
+def combine(deltas):
+    """Sums several deltas so a batch stages a single aggregate write."""
+    result = {field: 0 for field in NUMERIC_FIELDS}
+    categories = Counter()
+    for d in deltas:
+        for field in NUMERIC_FIELDS:
+            result[field] += d[field]
+        categories.update(d["categories"])
+    result["categories"] = {name: count for name, count in categories.items() if count}
+    return result
+
+
+def stage_delta(writer, company_ref, change_delta):
+    """Adds `change_delta` to the aggregate doc inside a WriteBatch or Transaction."""
+    payload = {field: firestore.Increment(value) for field, value in change_delta.items()
+               if field in NUMERIC_FIELDS and value}
+    if change_delta.get("categories"):
+        payload["categories"] = {name: firestore.Increment(count)
+                                 for name, count in change_delta["categories"].items()}
+    if payload:
+        writer.set(aggregate_ref(company_ref), payload, merge=True)
+
+
+def compute(docs):
+    """Totals for an iterable of inventory snapshots, as stored in the aggregate doc."""
+    totals = {field: 0 for field in NUMERIC_FIELDS}
+    categories = Counter()
+    for doc in docs:
+        part = contribution(doc.to_dict())
+        for field in NUMERIC_FIELDS:
+            totals[field] += part.get(field, 0)
+        categories.update(part.get("categories", {}))
+    totals["categories"] = dict(categories)
+    return totals
+
+
+def rebuild(company_name):
+    """
+    Recomputes the aggregate doc from the full inventory. Increments that land
+    while the scan runs can be lost, so run it when the company is quiet.
+    """
+    company_ref = db.collection('companies').document(company_name)
+    fields = ["name", "category", "quantity", "price"]
+    totals = compute(company_ref.collection('inventory').select(fields).stream())
+    totals["complete"] = True
+    totals["rebuiltAt"] = datetime.utcnow()
+    aggregate_ref(company_ref).set(totals)
+    return totals
+
+
+def read_totals(company_name):
+    """
+    The raw aggregate doc. Companies that predate the aggregates (no
+    `complete` marker yet) are rebuilt once on first read.
+    """
+    company_ref = db.collection('companies').document(company_name)
+    snap = aggregate_ref(company_ref).get()
+    totals = snap.to_dict() if snap.exists else None
+    if not totals or not totals.get("complete"):
+        totals = rebuild(company_name)
+    return totals
+
+
+def read_summary(company_name):
+    """The analytics-summary totals from the aggregate doc."""
+    totals = read_totals(company_name)
+
+    category_list = [{"name": name, "count": count}
+                     for name, count in (totals.get("categories") or {}).items() if count > 0]
+    price_count = totals.get("priceCount", 0)
+    return {
+        "totalItems": totals.get("totalItems", 0),
+        "totalValue": totals.get("totalValue", 0.0),
+        "categoryCount": len(category_list),
+        "categories": category_list,
+        "outOfStockCount": totals.get("outOfStockCount", 0),
+        "avgPrice": totals.get("priceSum", 0) / price_count if price_count else 0.0,
+    }
@@ -0,0 +1,86 @@
+"""
+Date-range analytics for /api/analytics computed inside Firestore.
+
+Totals come from a single aggregation query (count + sum) and top sellers from
+an `order_by("sold").limit(k)` query, so only k documents leave Firestore.
+Backends without aggregation support (older emulators, in-memory fakes) fall
+back to computing the same results locally from a projected stream; set
+ANALYTICS_SERVER_AGGREGATION=0 to always use the local path.
+
+Top sellers in a date range need a composite index on (sold DESC, added_at).
+"""
+import heapq
+import os
+
+from firebase_admin import firestore
+from google.api_core import exceptions as api_exceptions
+
+SERVER_AGGREGATION = os.getenv("ANALYTICS_SERVER_AGGREGATION", "1") != "0"
+DEFAULT_TOP_K = 5
+MAX_TOP_K = 100
+
+
+def parse_top_k(value):
+    """Turns the `top` query parameter into k; raises ValueError when invalid."""
+    if value is None:
+        return DEFAULT_TOP_K
+    k = int(value)
+    if k < 1:
+        raise ValueError("top must be at least 1")
+    return min(k, MAX_TOP_K)
+
+
+def _number(value):
+    # Firestore's sum() skips non-numeric values; the local path does the same
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return 0
+    return value
+
+
+def local_totals(query):
+    count = total_stock = total_sold = 0
+    for doc in query.select(["quantity", "sold"]).stream():
+        data = doc.to_dict()
+        count += 1
+        total_stock += _number(data.get("quantity"))
+        total_sold += _number(data.get("sold"))
+    return {"item_count": count, "total_stock": total_stock, "total_sold": total_sold}
+
+
+def server_totals(query):
+    aggregation = query.count(alias="item_count") \
+                       .sum("quantity", alias="total_stock") \
+                       .sum("sold", alias="total_sold")
+    results = aggregation.get()
+    return {result.alias: result.value for result in results[0]}
+
+
+def local_top_selling(query, k):
+    docs = (doc.to_dict() for doc in query.stream())
+    return heapq.nlargest(k, docs, key=lambda data: _number(data.get("sold", 0)))
+
+
+def server_top_selling(query, k):
+    top_query = query.order_by("sold", direction=firestore.Query.DESCENDING).limit(k)
+    return [doc.to_dict() for doc in top_query.stream()]
+
+
+def _with_fallback(server, local, *args):
+    if SERVER_AGGREGATION:
+        try:
+            return server(*args)
+        except (NotImplementedError, AttributeError,
+                api_exceptions.Unimplemented, api_exceptions.FailedPrecondition) as e:
+            # FailedPrecondition usually means the composite index is still missing
+            print(f"❌ Aggregation query failed, computing locally: {e}")
+    return local(*args)
+
+
+def range_totals(query):
+    """{"item_count", "total_stock", "total_sold"} for the documents matched by `query`."""
+    return _with_fallback(server_totals, local_totals, query)
+
+
+def top_selling(query, k=DEFAULT_TOP_K):
+    """The k documents of `query` with the highest `sold`, highest first."""
+    return _with_fallback(server_top_selling, local_top_selling, query, k)
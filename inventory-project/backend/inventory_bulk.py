@@ -0,0 +1,303 @@
+"""
+Bulk inventory mutations behind POST /api/inventory/bulk.
+
+A request carries a list of operations:
+
+    {"op": "upsert", "id"?, "name", "supplier", "category", "description",
+     "quantity", "price", "reorder_level"}
+    {"op": "delete", "id"}  or  {"op": "delete", "name", "supplier", "category"}
+
+An operation names its item by `id` or, without one, by (name, supplier,
+category), which gives its deterministic id (see item_ids). An upsert of an existing item overwrites
+the fields it gives (quantity is the new level, not an amount to add); one
+that changes its name, supplier or category moves it to the id those derive,
+and fails if another item already has it. An upsert of an unknown item
+creates it, needs name, supplier and price, and fails if it gives an `id`
+other than the one those derive.
+
+Operations are applied in order, in transactions of
+inventory_changes.items_per_batch() operations. Each transaction reads its
+items with one get_all, so aggregates and events see the exact previous
+values. A failed operation or transaction does not stop the rest; every
+operation gets its own entry in the results.
+"""
+import os
+
+from firebase_admin import firestore
+
+import inventory_aggregates
+import inventory_cache
+import inventory_changes
+import item_counters
+import item_ids
+import reorder_levels
+from db_init import db
+
+MAX_OPERATIONS = int(os.getenv("BULK_MAX_OPERATIONS", 5000))
+OPERATIONS = ("upsert", "delete")
+TEXT_FIELDS = ("name", "supplier", "category", "description")
+
+
+class BulkError(ValueError):
+    """A request the endpoint rejects as a whole; callers return a 400."""
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _failed(index, op, error, item_id=None):
+    return {"index": index, "op": op, "id": item_id, "status": "failed", "error": error}
+
+
+def validate(operation):
+    """Returns (op, fields) for one operation; raises ValueError with a per-operation message."""
+    if not isinstance(operation, dict):
+        raise ValueError("operation must be an object")
+    op = operation.get("op")
+    if op not in OPERATIONS:
+        raise ValueError(f"op must be one of {', '.join(OPERATIONS)}")
+    fields = {}
+    for field in TEXT_FIELDS:
+        if field in operation:
+            value = operation[field]
+            if field in ("name", "supplier") and not (isinstance(value, str) and value):
+                raise ValueError(f"{field} must be a non-empty string")
+            if value is not None and not isinstance(value, str):
+                raise ValueError(f"{field} must be a string")
+            fields[field] = value
+    if op == "delete":
+        return op, fields
+    if "quantity" in operation:
+        if not isinstance(operation["quantity"], int) or isinstance(operation["quantity"], bool):
+            raise ValueError("quantity must be an integer")
+        fields["quantity"] = operation["quantity"]
+    if "price" in operation:
+        if not _number(operation["price"]):
+            raise ValueError("price must be a number")
+        fields["price"] = operation["price"]
+    if "reorder_level" in operation:
+        fields["reorder_level"] = reorder_levels.parse_level(operation["reorder_level"])
+    return op, fields
+
+
+def _legacy_ids(company_name, inventory_ref, operations):
+    """
+    {deterministic id: document id} for the named items that may predate
+    item_ids. Like find_legacy, only documents with one of the requested names
+    are considered, so only those are hashed.
+    """
+    keys = {}
+    for operation in operations:
+        if isinstance(operation, dict) and operation.get("id") is None \
+                and isinstance(operation.get("name"), str) and isinstance(operation.get("supplier"), str):
+            parts = (operation["name"], operation["supplier"], operation.get("category"))
+            keys[item_ids.item_id(*parts)] = parts
+    # run() is only reached by an authenticated member of the company
+    cached = inventory_cache.cached_rows(company_name, attach=True) if keys else None
+    if cached is None:
+        return {item_id: snap.id for item_id, snap in item_ids.find_legacy(inventory_ref, keys).items()}
+    names = {name for name, _, _ in keys.values()}
+    found = {}
+    for doc_id, data in cached:
+        if data.get("name") in names:
+            key = item_ids.id_of(data)
+            if key in keys and doc_id != key:
+                found.setdefault(key, doc_id)
+    return found
+
+
+def resolve(company_name, inventory_ref, operations):
+    """
+    Validates `operations` and works out which document each one targets.
+    Returns (planned, results): planned is a list of (index, op, ref, fields)
+    and results holds a "failed" entry for every operation that was rejected.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise BulkError("operations must be a non-empty list")
+    if len(operations) > MAX_OPERATIONS:
+        raise BulkError(f"At most {MAX_OPERATIONS} operations per request")
+
+    legacy_ids = None
+    planned, results, targeted = [], [], set()
+    for index, operation in enumerate(operations):
+        op = operation.get("op") if isinstance(operation, dict) else None
+        try:
+            op, fields = validate(operation)
+        except ValueError as e:
+            results.append(_failed(index, op, str(e)))
+            continue
+
+        item_id = operation.get("id")
+        if item_id is not None and (not isinstance(item_id, str) or not item_id or "/" in item_id):
+            results.append(_failed(index, op, "id must be a non-empty string without '/'"))
+            continue
+        if item_id is None:
+            if fields.get("name") is None or fields.get("supplier") is None:
+                results.append(_failed(index, op, "id or name and supplier are required"))
+                continue
+            item_id = item_ids.item_id(fields["name"], fields["supplier"], fields.get("category"))
+            if item_ids.LEGACY_LOOKUP:
+                if legacy_ids is None:
+                    legacy_ids = _legacy_ids(company_name, inventory_ref, operations)
+                item_id = legacy_ids.get(item_id, item_id)
+
+        if item_id in targeted:
+            results.append(_failed(index, op, "Item already changed earlier in this request", item_id))
+            continue
+        targeted.add(item_id)
+        planned.append((index, op, inventory_ref.document(item_id), fields))
+    return planned, results
+
+
+def _price_change(price_diff):
+    if price_diff > 0:
+        return "increase"
+    if price_diff < 0:
+        return "decrease"
+    return "no_change"
+
+
+def _updates(before, fields, actor):
+    """The fields an upsert writes over the existing item `before`."""
+    updates = {field: value for field, value in fields.items() if field != "reorder_level"}
+    if "reorder_level" in fields:
+        updates["reorder_level"] = fields["reorder_level"] if fields["reorder_level"] is not None \
+            else firestore.DELETE_FIELD
+    if "price" in fields:
+        price_diff = fields["price"] - before.get("price", 0)
+        updates["price_diff"] = price_diff
+        updates["price_change"] = _price_change(price_diff)
+    updates["updated_at"] = firestore.SERVER_TIMESTAMP
+    updates["updated_by"] = actor
+    return updates
+
+
+def _write(transaction, company_name, index, op, ref, fields, before, actor, sums=None, rekey=None):
+    """
+    Stages one operation. `sums` are the item's counter shard sums when it is
+    sharded and the operation sets its quantity; `rekey` is the item's move
+    when the operation changes its id, or the error reading it raised.
+    Returns (result, changes).
+    """
+    exists = inventory_aggregates.is_item(before)
+    if op == "delete":
+        if not exists:
+            return _failed(index, op, "Item not found", ref.id), []
+        transaction.delete(ref)
+        return {"index": index, "op": op, "id": ref.id, "status": "deleted"}, \
+            [inventory_changes.Change(ref.id, before, None)]
+
+    if not exists:
+        if fields.get("name") is None or fields.get("supplier") is None or "price" not in fields:
+            return _failed(index, op, "name, supplier and price are required to create an item", ref.id), []
+        if ref.id != item_ids.item_id(fields["name"], fields["supplier"], fields.get("category")):
+            return _failed(index, op, "id does not match the item's name, supplier and category", ref.id), []
+        item = {
+            "name": fields["name"],
+            "supplier": fields["supplier"],
+            "category": fields.get("category"),
+            "description": fields.get("description") or "",
+            "quantity": fields.get("quantity", 0),
+            "price": fields["price"],
+            "added_at": firestore.SERVER_TIMESTAMP,
+            "updated_at": firestore.SERVER_TIMESTAMP,
+            "price_diff": 0,
+            "price_change": "no_change",
+            "sold": 0,
+            "added_by": actor,
+            "updated_by": actor,
+        }
+        if fields.get("reorder_level") is not None:
+            item["reorder_level"] = fields["reorder_level"]
+        item = reorder_levels.with_flag(company_name, None, item)
+        transaction.set(ref, item)
+        return {"index": index, "op": op, "id": ref.id, "status": "created"}, \
+            [inventory_changes.Change(ref.id, None, item)]
+
+    if isinstance(rekey, Exception):
+        return _failed(index, op, str(rekey), ref.id), []
+    if rekey is not None:
+        return {"index": index, "op": op, "id": rekey.new_ref.id, "status": "updated"}, \
+            item_ids.stage_rekey(transaction, rekey)
+    updates = _updates(before, fields, actor)
+    if sums is not None:
+        updates = item_counters.rebase(before, updates, sums)
+    updates = reorder_levels.with_flag(company_name, before, updates)
+    transaction.update(ref, updates)
+    return {"index": index, "op": op, "id": ref.id, "status": "updated"}, \
+        [inventory_changes.Change(ref.id, before, {**before, **updates})]
+
+
+def _read_rekeys(transaction, company_name, chunk, before, actor):
+    """
+    {item id: Rekey, or the error reading it raised} for the chunk's upserts
+    that change their item's id. A move onto an id the chunk also writes is
+    a conflict, since the transaction could not apply both.
+    """
+    rekeys = {}
+    taken = {ref.id for _, _, ref, _ in chunk}
+    for _, op, ref, fields in chunk:
+        item = before.get(ref.id)
+        if op != "upsert" or not inventory_aggregates.is_item(item) or not item_ids.changes_key(item, fields):
+            continue
+        try:
+            rekey = item_ids.read_rekey(transaction, company_name, ref, item, _updates(item, fields, actor))
+            if rekey.new_ref.id in taken:
+                raise item_ids.KeyConflict(item_ids.KEY_CONFLICT_ERROR)
+            taken.add(rekey.new_ref.id)
+            rekeys[ref.id] = rekey
+        except ValueError as e:
+            rekeys[ref.id] = e
+    return rekeys
+
+
+def apply(company_name, planned, actor):
+    """Commits planned operations. Returns their results in request order."""
+    company_ref = inventory_changes.company_ref(company_name)
+    per_batch = inventory_changes.items_per_batch()
+    results = []
+    for start in range(0, len(planned), per_batch):
+        chunk = planned[start:start + per_batch]
+
+        @firestore.transactional
+        def apply_chunk(transaction):
+            refs = [ref for _, _, ref, _ in chunk]
+            before = {snap.id: snap.to_dict() if snap.exists else None
+                      for snap in db.get_all(refs, transaction=transaction)}
+            # setting a sharded item's quantity needs what its shards already hold
+            sums = {
+                ref.id: item_counters.shard_sums(ref, before.get(ref.id), transaction)
+                for _, op, ref, fields in chunk
+                if op == "upsert" and "quantity" in fields and item_counters.is_sharded(before.get(ref.id))
+            }
+            rekeys = _read_rekeys(transaction, company_name, chunk, before, actor)
+            chunk_results, changes = [], []
+            for index, op, ref, fields in chunk:
+                result, staged = _write(transaction, company_name, index, op, ref, fields, before.get(ref.id), actor,
+                                        sums.get(ref.id), rekeys.get(ref.id))
+                chunk_results.append(result)
+                changes.extend(staged)
+            if changes:
+                inventory_changes.stage(transaction, company_ref, changes, actor=actor, source="bulk")
+            return chunk_results, changes
+
+        try:
+            chunk_results, changes = apply_chunk(db.transaction())
+        except Exception as e:
+            results.extend(_failed(index, op, str(e), ref.id) for index, op, ref, _ in chunk)
+            continue
+        results.extend(chunk_results)
+        inventory_changes.after_commit(company_name, changes)
+    return results
+
+
+def run(company_name, operations, actor):
+    """Validates and applies a bulk request. Returns {"results", "created", "updated", "deleted", "failed"}."""
+    inventory_ref = inventory_changes.company_ref(company_name).collection('inventory')
+    planned, rejected = resolve(company_name, inventory_ref, operations)
+    results = sorted(rejected + apply(company_name, planned, actor), key=lambda result: result["index"])
+    summary = {status: 0 for status in ("created", "updated", "deleted", "failed")}
+    for result in results:
+        summary[result["status"]] += 1
+    return {"results": results, **summary}
@@ -0,0 +1,234 @@
+"""
+Listener-maintained cache of each company's inventory documents.
+
+The first authenticated read for a company attaches two Firestore listeners
+(callers pass `attach=True` only for a member of an existing company; anyone
+else is served from listeners that are already open, or from a plain query):
+one on `companies/{c}/inventory`, which patches the cached documents whenever any
+worker or Cloud Function changes them, and one on the company document, which
+tracks the "inventory" data version every write path bumps and the commit
+time of its last bump (see company_versions); bumps of other scopes are
+ignored. A request is answered from memory once the inventory listener has
+caught up with the version its ETag was built from. It waits up to
+INVENTORY_CACHE_CATCH_UP_SECONDS for that and then serves the last snapshot
+anyway, keeping the listeners: a bump whose batch changed no inventory
+document (or a slow listener) never brings a newer inventory snapshot, and a
+full re-read on every such request would cost more than the brief lag. Once a
+version has timed out, later reads of it do not wait again.
+
+Companies are evicted least recently used once the estimated size of all
+cached inventories passes INVENTORY_CACHE_MB, or once more than
+INVENTORY_CACHE_COMPANIES are cached; eviction detaches the listeners. Each
+company costs two listeners, and Firestore allows about 100 per client.
+INVENTORY_CACHE_MB=0 turns the cache off.
+"""
+import os
+import sys
+import threading
+
+from cachetools import LRUCache, TTLCache
+
+import company_versions
+from db_init import db
+
+CACHE_BYTES = int(float(os.getenv("INVENTORY_CACHE_MB", 256)) * 1024 * 1024)
+MAX_COMPANIES = int(os.getenv("INVENTORY_CACHE_COMPANIES", 40))
+# how long the first read waits for the initial snapshot
+LOAD_SECONDS = float(os.getenv("INVENTORY_CACHE_LOAD_SECONDS", 10))
+# how long a read waits for the listeners to deliver a newer version
+CATCH_UP_SECONDS = float(os.getenv("INVENTORY_CACHE_CATCH_UP_SECONDS", 1))
+
+
+def _size_of(item_id, data):
+    """Rough resident size of one cached document."""
+    return sys.getsizeof(item_id) + sys.getsizeof(data) + sum(
+        sys.getsizeof(key) + sys.getsizeof(value) for key, value in data.items()
+    )
+
+
+def _unsubscribe(watches):
+    for watch in watches:
+        try:
+            watch.unsubscribe()
+        except Exception as e:
+            print(f"❌ Error detaching inventory listener: {e}")
+
+
+class CompanyInventory:
+    def __init__(self, company_name):
+        self.company_name = company_name
+        self.items = {}               # item_id -> document data
+        self.sizes = {}               # item_id -> estimated bytes
+        self.size = sys.getsizeof(self.items)
+        self.version = None           # latest "inventory" version seen on the company doc
+        self.version_time = None      # commit time of the write that set it
+        self.read_time = None         # read time of the last inventory snapshot
+        self.settled = -1             # highest version served without waiting, after a timeout
+        self.loaded = False
+        self.closed = False
+        self.changed = threading.Condition()
+        self._watches = []
+
+    def open(self):
+        company_ref = db.collection('companies').document(self.company_name)
+        try:
+            self._watches.append(company_ref.on_snapshot(self._on_company))
+            self._watches.append(company_ref.collection('inventory').on_snapshot(self._on_inventory))
+        except Exception as e:
+            print(f"❌ Error attaching inventory listeners for {self.company_name}: {e}")
+            self.close()
+
+    def close(self):
+        with self.changed:
+            self.closed = True
+            watches, self._watches = self._watches, []
+            self.changed.notify_all()
+        # a listener may be closing itself from its own callback; never join it here
+        threading.Thread(target=_unsubscribe, args=(watches,), daemon=True).start()
+
+    def alive(self):
+        return not self.closed and all(getattr(watch, "is_active", True) for watch in self._watches)
+
+    # -- listener callbacks -------------------------------------------------
+    def _on_company(self, docs, changes, read_time):
+        try:
+            snap = docs[0] if docs else None
+            data = (snap.to_dict() or {}) if snap is not None and snap.exists else {}
+            version = (data.get(company_versions.VERSION_FIELD) or {}).get(company_versions.INVENTORY, 0)
+            # the inventory bump's own commit time; update_time also moves on other scopes' bumps
+            bumped_at = (data.get(company_versions.VERSION_TIME_FIELD) or {}).get(company_versions.INVENTORY)
+            with self.changed:
+                if version != self.version:
+                    self.version = version
+                    self.version_time = bumped_at or getattr(snap, "update_time", None) or read_time
+                    self.changed.notify_all()
+        except Exception as e:
+            print(f"❌ Error in company listener for {self.company_name}: {e}")
+            self.close()
+
+    def _on_inventory(self, docs, changes, read_time):
+        try:
+            with self.changed:
+                for change in changes:
+                    item_id = change.document.id
+                    self.size -= self.sizes.pop(item_id, 0)
+                    if change.type.name == "REMOVED":
+                        self.items.pop(item_id, None)
+                        continue
+                    data = change.document.to_dict()
+                    self.items[item_id] = data
+                    self.sizes[item_id] = _size_of(item_id, data)
+                    self.size += self.sizes[item_id]
+                self.read_time = read_time
+                self.loaded = True
+                self.changed.notify_all()
+            _resize(self)
+        except Exception as e:
+            print(f"❌ Error in inventory listener for {self.company_name}: {e}")
+            self.close()
+
+    # -- reads --------------------------------------------------------------
+    def _current(self, version):
+        """True once the cached documents include every write up to `version`."""
+        if not self.loaded:
+            return False
+        if self.settled >= version:
+            return True
+        if self.version is None or self.version < version:
+            return False
+        return self.version_time is None or self.read_time is None or self.read_time >= self.version_time
+
+    def rows(self, version):
+        """
+        Copies of the cached documents, waiting up to CATCH_UP_SECONDS for
+        `version`; None only if the listeners failed or never loaded.
+        """
+        timeout = CATCH_UP_SECONDS if self.loaded else LOAD_SECONDS
+        with self.changed:
+            self.changed.wait_for(lambda: self.closed or self._current(version), timeout)
+            if self.closed or not self.loaded:
+                return None
+            self.settled = max(self.settled, version)
+            return [(item_id, dict(data)) for item_id, data in self.items.items()]
+
+
+class _InventoryLRU(LRUCache):
+    def popitem(self):
+        key, entry = super().popitem()
+        entry.close()
+        return key, entry
+
+
+_cache = _InventoryLRU(maxsize=max(CACHE_BYTES, 1), getsizeof=lambda entry: entry.size)
+_lock = threading.Lock()
+# companies whose inventory alone exceeds the budget, retried after an hour
+_too_large = TTLCache(maxsize=1000, ttl=3600)
+
+
+def _resize(entry):
+    """Re-inserts an entry so the LRU accounts for its new size, evicting others as needed."""
+    with _lock:
+        if entry.closed:
+            return
+        try:
+            _cache[entry.company_name] = entry
+        except ValueError:
+            # larger than the whole budget; read this company from Firestore instead
+            _cache.pop(entry.company_name, None)
+            _too_large[entry.company_name] = True
+            entry.close()
+            print(f"❌ Inventory for {entry.company_name} exceeds INVENTORY_CACHE_MB; not caching it")
+
+
+def _entry(company_name, attach):
+    """The company's live entry; a new one (with listeners) only if `attach`."""
+    with _lock:
+        entry = _cache.get(company_name)
+        if entry is not None and entry.alive():
+            return entry
+        if entry is not None:
+            _cache.pop(company_name, None)
+            entry.close()
+        if not attach:
+            return None
+        while len(_cache) >= MAX_COMPANIES:
+            _cache.popitem()
+        entry = _cache[company_name] = CompanyInventory(company_name)
+    entry.open()
+    return entry
+
+
+def cached_rows(company_name, attach=False):
+    """
+    [(item_id, data)] from the cache, or None if the company is not cached.
+    `attach` opens the listeners on a miss; pass it only once the caller is
+    known to be a member of the company.
+    """
+    if CACHE_BYTES <= 0 or MAX_COMPANIES <= 0 or company_name in _too_large:
+        return None
+    entry = _entry(company_name, attach)
+    if entry is None:
+        return None
+    version = company_versions.current(company_name).get(company_versions.INVENTORY, 0)
+    return entry.rows(version)
+
+
+def rows(company_name, attach=False):
+    """[(item_id, data)] for every document in the company's inventory; see cached_rows for `attach`."""
+    cached = cached_rows(company_name, attach)
+    if cached is not None:
+        return cached
+    inventory_ref = db.collection('companies').document(company_name).collection('inventory')
+    return [(snap.id, snap.to_dict()) for snap in inventory_ref.stream()]
+
+
+def cache_stats():
+    with _lock:
+        entries = list(_cache.values())
+    return {
+        "companies": len(entries),
+        "maxCompanies": MAX_COMPANIES,
+        "items": sum(len(entry.items) for entry in entries),
+        "bytes": sum(entry.size for entry in entries),
+        "maxBytes": CACHE_BYTES,
+    }
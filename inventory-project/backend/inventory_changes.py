@@ -0,0 +1,64 @@
+"""
+Side effects shared by every inventory write path.
+
+Add, update, delete and imports describe what they changed as a list of
+Change(item_id, before, after) tuples (before/after are the item dicts, None
+for a create or delete) and call `stage` on the WriteBatch or Transaction that
+carries the item writes, so derived data commits atomically with them. Once
+the commit succeeds they call `after_commit` for the in-process side effects.
+"""
+from collections import namedtuple
+
+import company_versions
+import inventory_aggregates
+import inventory_events
+import item_counters
+import notifications
+import search_index
+import stock_trends
+from db_init import db
+
+Change = namedtuple("Change", "item_id before after")
+
+# Firestore rejects batches and transactions with more than 500 writes
+BATCH_LIMIT = 500
+# writes `stage` adds per batch regardless of its size (version bump, aggregate delta, daily rollup)
+STAGED_WRITES = 3
+# writes `stage` adds per changed item (event log entry)
+WRITES_PER_CHANGE = 1
+
+
+def company_ref(company_name):
+    return db.collection('companies').document(company_name)
+
+
+def items_per_batch():
+    """How many item writes fit in one batch alongside what `stage` adds."""
+    return (BATCH_LIMIT - STAGED_WRITES) // (1 + WRITES_PER_CHANGE)
+
+
+def stage(writer, company_ref, changes, actor=None, source="api", shards_only=False):
+    """
+    Stages the derived writes for `changes` on a WriteBatch or Transaction.
+    `actor` and `source` ("api", "import", "bulk" or "ledger") are recorded in the event log.
+    Pass shards_only=True when the writes only add to item_counters shards:
+    then only the events are staged, since no item document changes until the
+    refresher writes the totals back, which stages the version bump,
+    aggregate delta and daily rollup itself.
+    """
+    if not shards_only:
+        company_versions.stage_bump(writer, company_ref, company_versions.INVENTORY)
+        inventory_aggregates.stage_delta(
+            writer, company_ref,
+            inventory_aggregates.combine(inventory_aggregates.delta(c.before, c.after) for c in changes),
+        )
+        stock_trends.stage_rollup(writer, company_ref, changes)
+    inventory_events.stage_events(writer, company_ref, changes, actor, source)
+
+
+def after_commit(company_name, changes):
+    """Runs the side effects of committed `changes` that live outside Firestore."""
+    company_versions.invalidate(company_name)
+    search_index.apply_changes(company_name, changes)
+    notifications.notify_inventory(company_name, changes)
+    item_counters.schedule(company_name, changes)
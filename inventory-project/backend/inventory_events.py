@@ -0,0 +1,141 @@
+"""
+Append-only inventory event log behind /api/reports.
+
+Every committed add, update, delete and import writes one immutable document
+per item to `companies/{c}/inventory_events`, in the same batch or
+transaction as the item itself (see inventory_changes). An event stores the
+action, who did it, where it came from ("api", "import", "bulk" or "ledger"),
+its commit time in `at` and a snapshot of the item after the change (before
+it, for deletes).
+Reports read one range of the single-field `at` index, so every change in the
+window shows up, including repeated updates to the same item. The API reads
+it a page at a time (pagination.DEFAULT_PAGE_SIZE rows unless `limit` says
+otherwise); exports stream the whole range.
+"""
+from datetime import datetime
+
+from firebase_admin import firestore
+
+import inventory_aggregates
+import pagination
+from db_init import db
+
+EVENTS_COLLECTION = "inventory_events"
+TIME_FIELD = "at"
+ADDED, UPDATED, DELETED = "added", "updated", "deleted"
+BACKFILL_BATCH = 500
+
+# values a snapshot keeps; write transforms such as SERVER_TIMESTAMP are dropped
+_PLAIN_TYPES = (str, int, float, bool, type(None), datetime, list, dict)
+_TIMESTAMP_FIELDS = ("added_at", "updated_at", TIME_FIELD)
+
+
+def events_collection(company_ref):
+    return company_ref.collection(EVENTS_COLLECTION)
+
+
+def action_of(change):
+    if not inventory_aggregates.is_item(change.before):
+        return ADDED
+    if not inventory_aggregates.is_item(change.after):
+        return DELETED
+    return UPDATED
+
+
+def _snapshot(item):
+    return {key: value for key, value in (item or {}).items() if isinstance(value, _PLAIN_TYPES)}
+
+
+def event_payload(change, actor=None, source="api"):
+    action = action_of(change)
+    return {
+        TIME_FIELD: firestore.SERVER_TIMESTAMP,
+        "action": action,
+        "itemId": change.item_id,
+        "actor": actor,
+        "source": source,
+        "item": _snapshot(change.before if action == DELETED else change.after),
+    }
+
+
+def stage_events(writer, company_ref, changes, actor=None, source="api"):
+    """Adds one event per item change to a WriteBatch or Transaction."""
+    collection = events_collection(company_ref)
+    for change in changes:
+        if inventory_aggregates.is_item(change.before) or inventory_aggregates.is_item(change.after):
+            writer.set(collection.document(), event_payload(change, actor, source))
+
+
+def _iso(ts):
+    if isinstance(ts, datetime):
+        return ts.isoformat()
+    if hasattr(ts, 'to_datetime'):   # google.cloud.Timestamp
+        return ts.to_datetime().isoformat()
+    if hasattr(ts, 'ToDatetime'):     # protobuf Timestamp
+        return ts.ToDatetime().isoformat()
+    return None
+
+
+def report_row(event_id, event):
+    """Flattens an event into the item-shaped row the reports page renders."""
+    row = dict(event.get("item") or {})
+    row["id"] = event.get("itemId")
+    row["eventId"] = event_id
+    row["_action"] = event.get("action")
+    row["source"] = event.get("source")
+    row["actor"] = event.get("actor")
+    row[TIME_FIELD] = event.get(TIME_FIELD)
+    if row["_action"] == ADDED and not row.get("added_at"):
+        row["added_at"] = event.get(TIME_FIELD)
+    if row["_action"] != ADDED:
+        row["updated_at"] = event.get(TIME_FIELD)
+    for field in _TIMESTAMP_FIELDS:
+        row[field] = _iso(row.get(field))
+    return row
+
+
+def range_query(company_name, start_dt, end_dt):
+    """Events with start_dt <= at < end_dt."""
+    collection = events_collection(db.collection('companies').document(company_name))
+    return collection.where(TIME_FIELD, ">=", start_dt).where(TIME_FIELD, "<", end_dt)
+
+
+def read_page(company_name, start_dt, end_dt, limit, start_after=None):
+    """One page of report rows, oldest first. Returns (rows, next_cursor)."""
+    events, next_cursor = pagination.fetch_page(
+        range_query(company_name, start_dt, end_dt), limit, order_by=TIME_FIELD, start_after=start_after
+    )
+    return [report_row(event.pop("id"), event) for event in events], next_cursor
+
+
+def backfill(company_name):
+    """
+    Seeds the log for items that predate it: an "added" event at each item's
+    added_at and an "updated" event at its updated_at when that is later.
+    Returns the number of events written.
+    """
+    company_ref = db.collection('companies').document(company_name)
+    collection = events_collection(company_ref)
+    batch, pending, written = db.batch(), 0, 0
+    for snap in company_ref.collection('inventory').stream():
+        item = snap.to_dict()
+        if not inventory_aggregates.is_item(item) or not item.get("added_at"):
+            continue
+        events = [(ADDED, item["added_at"], item.get("added_by"))]
+        if item.get("updated_at") and item["updated_at"] > item["added_at"]:
+            events.append((UPDATED, item["updated_at"], item.get("updated_by")))
+        for action, at, actor in events:
+            # fixed ids make re-running the backfill overwrite instead of duplicate
+            batch.set(collection.document(f"backfill-{snap.id}-{action}"), {
+                TIME_FIELD: at, "action": action, "itemId": snap.id,
+                "actor": actor, "source": "backfill", "item": _snapshot(item),
+            })
+            pending += 1
+        if pending >= BACKFILL_BATCH - 1:
+            batch.commit()
+            written += pending
+            batch, pending = db.batch(), 0
+    if pending:
+        batch.commit()
+        written += pending
+    return written
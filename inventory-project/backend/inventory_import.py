@@ -0,0 +1,263 @@
+"""
+Bulk inventory import used by /api/upload-csv.
+
+Instead of a query plus a write per row, an import:
+  1. validates the sheet with vectorised pandas ops and collects per-row errors,
+  2. merges rows for the same (name, supplier, category) with a groupby
+     (steps 1 and 2 live in import_parsing, which never touches Firestore),
+  3. looks the chunk's items up by their deterministic ids (item_ids) in one
+     get_all and, while legacy lookups are on, finds the ones that missed
+     with a few `in` queries on their names,
+  4. commits creates and updates through WriteBatches of up to 500 writes,
+     staging the derived writes from inventory_changes in each batch.
+     Quantities are added with Increment, so concurrent writes are not lost;
+     for a sharded item (item_counters) the Increment goes to one of its shards.
+     New items are written with `create`, so an item that a concurrent import
+     or add created first is not overwritten: the batch is retried with that
+     row turned into an Increment update.
+
+CSV files are read in chunks of IMPORT_CHUNK_ROWS rows and each chunk is
+looked up and upserted before the next one is read; nothing is carried from
+one chunk to the next, so memory does not grow with file size.
+"""
+import pandas as pd
+from firebase_admin import firestore
+from google.api_core import exceptions as api_exceptions
+
+import import_parsing
+import inventory_changes
+import item_counters
+import item_ids
+import reorder_levels
+
+# Per-row errors kept in the final summary; progress lines still carry every error
+MAX_REPORTED_ERRORS = 1000
+
+# Times a batch is retried after one of its creates found the item already there
+CREATE_RETRIES = 3
+
+
+EXISTING_FIELDS = [
+    "name", "supplier", "category", "quantity", "price", reorder_levels.LEVEL_FIELD, item_counters.SHARDS_FIELD,
+]
+
+
+def fetch_existing(db, inventory_ref, merged):
+    """
+    {item_id: {"ref", "item"}} for the items in `merged` that already exist,
+    read in one get_all of their deterministic ids plus, while legacy lookups
+    are on, item_ids.find_legacy for the ones that missed.
+    """
+    keys = {}
+    for name, supplier, category in merged[import_parsing.KEY_COLUMNS].itertuples(index=False, name=None):
+        name, supplier, category = str(name), str(supplier), _optional(category)
+        keys[item_ids.item_id(name, supplier, category)] = (name, supplier, category)
+    existing = {}
+    if not keys:
+        return existing
+    refs = [inventory_ref.document(item_id) for item_id in keys]
+    for snap in db.get_all(refs, field_paths=EXISTING_FIELDS):
+        if snap.exists:
+            existing[snap.id] = {"ref": snap.reference, "item": snap.to_dict()}
+    if item_ids.LEGACY_LOOKUP:
+        missing = {item_id: parts for item_id, parts in keys.items() if item_id not in existing}
+        for item_id, snap in item_ids.find_legacy(inventory_ref, missing, EXISTING_FIELDS).items():
+            existing[item_id] = {"ref": snap.reference, "item": snap.to_dict()}
+    return existing
+
+
+def _optional(value):
+    return None if pd.isna(value) else str(value)
+
+
+def _price_change(price_diff):
+    if price_diff > 0:
+        return "increase"
+    if price_diff < 0:
+        return "decrease"
+    return "no_change"
+
+
+def _existing_write(company_name, current, quantity, price, uploader):
+    """The "increment" or "update" write that adds a row to `current` ({"ref", "item"})."""
+    before = current["item"]
+    if item_counters.is_sharded(before) and price == before.get("price"):
+        after = {**before, "quantity": before.get("quantity", 0) + quantity}
+        shard_ref = item_counters.random_shard(current["ref"], before)
+        return ("increment", shard_ref, item_counters.increment_payload(quantity=quantity),
+                inventory_changes.Change(current["ref"].id, before, after))
+    updated_quantity = before.get("quantity", 0) + quantity
+    price_diff = price - before.get("price", 0)
+    payload = {
+        "quantity": updated_quantity,
+        "price": price,
+        "price_diff": price_diff,
+        "price_change": _price_change(price_diff),
+        "updated_by": uploader,
+        "updated_at": firestore.SERVER_TIMESTAMP
+    }
+    payload = reorder_levels.with_flag(company_name, before, payload)
+    # the flag uses the quantity read at the start; the write itself adds
+    payload["quantity"] = firestore.Increment(quantity)
+    if item_counters.is_sharded(before):
+        payload[item_counters.BASE_FIELDS["quantity"]] = firestore.Increment(quantity)
+    after = {**before, "quantity": updated_quantity, "price": price}
+    return ("update", current["ref"], payload, inventory_changes.Change(current["ref"].id, before, after))
+
+
+def plan_writes(inventory_ref, merged, existing, uploader):
+    """
+    Turns merged rows into ("create" | "update" | "increment", ref, payload,
+    change) tuples, where change is the inventory_changes.Change the write
+    makes and `existing` is the chunk's fetch_existing result. An "increment"
+    adds stock to a shard of a sharded item whose other fields are unchanged.
+    Updates keep the item's added_at.
+    """
+    company_name = inventory_ref.parent.id
+    writes = []
+    for name, supplier, category, quantity, price, description in merged[
+        import_parsing.KEY_COLUMNS + ["Quantity", "Price", "Description"]
+    ].itertuples(index=False, name=None):
+        name, supplier, category = str(name), str(supplier), _optional(category)
+        quantity, price = int(quantity), float(price)
+        key = item_ids.item_id(name, supplier, category)
+        current = existing.get(key)
+        if current:
+            writes.append(_existing_write(company_name, current, quantity, price, uploader))
+        else:
+            ref = inventory_ref.document(key)
+            payload = {
+                "name": name,
+                "supplier": supplier,
+                "category": category,
+                "description": str(description),
+                "quantity": quantity,
+                "price": price,
+                "added_at": firestore.SERVER_TIMESTAMP,
+                "updated_at": firestore.SERVER_TIMESTAMP,
+                "price_diff": 0,
+                "price_change": "no_change",
+                "sold": 0,
+                "added_by": uploader,
+                "updated_by": uploader,
+            }
+            payload = reorder_levels.with_flag(company_name, None, payload)
+            writes.append(("create", ref, payload, inventory_changes.Change(ref.id, None, payload)))
+    return writes
+
+
+def _commit_batch(db, chunk, company_ref, uploader):
+    batch = db.batch()
+    for kind, ref, payload, _ in chunk:
+        if kind == "create":
+            batch.create(ref, payload)
+        elif kind == "increment":
+            batch.set(ref, payload, merge=True)
+        else:
+            batch.update(ref, payload)
+    # shard increments change no item document until the refresher writes their totals back
+    direct = [change for kind, *_, change in chunk if kind != "increment"]
+    sharded = [change for kind, *_, change in chunk if kind == "increment"]
+    if direct:
+        inventory_changes.stage(batch, company_ref, direct, actor=uploader, source="import")
+    if sharded:
+        inventory_changes.stage(batch, company_ref, sharded, actor=uploader, source="import", shards_only=True)
+    batch.commit()
+
+
+def _replan_creates(db, chunk, company_ref):
+    """Turns the chunk's creates whose item now exists into writes that add to it."""
+    creates = [ref for kind, ref, *_ in chunk if kind == "create"]
+    found = {snap.id: {"ref": snap.reference, "item": snap.to_dict()}
+             for snap in db.get_all(creates, field_paths=EXISTING_FIELDS) if snap.exists}
+    replanned = []
+    for kind, ref, payload, change in chunk:
+        if kind == "create" and ref.id in found:
+            replanned.append(_existing_write(company_ref.id, found[ref.id], payload["quantity"],
+                                             payload["price"], payload["added_by"]))
+        else:
+            replanned.append((kind, ref, payload, change))
+    return replanned
+
+
+def commit_writes(db, writes, company_ref, uploader=None):
+    """
+    Commits planned writes in batches that fit Firestore's write limit, each
+    also staging inventory_changes for the items it writes. A batch whose create
+    lost the race to a concurrent writer is retried with that row re-planned.
+    Returns {"created", "updated", "failed", "errors"}; a rejected batch counts
+    all of its items as failed without stopping the rest of the import.
+    """
+    result = {"created": 0, "updated": 0, "failed": 0, "errors": []}
+    per_batch = inventory_changes.items_per_batch()
+    for start in range(0, len(writes), per_batch):
+        chunk = writes[start:start + per_batch]
+        for attempt in range(CREATE_RETRIES + 1):
+            try:
+                _commit_batch(db, chunk, company_ref, uploader)
+                error = None
+            except api_exceptions.AlreadyExists as e:
+                error = e
+                if attempt < CREATE_RETRIES:
+                    chunk = _replan_creates(db, chunk, company_ref)
+                    continue
+            except Exception as e:
+                error = e
+            break
+        if error is not None:
+            result["failed"] += len(chunk)
+            result["errors"].extend(
+                {"item": payload.get("name", ref.id), "error": str(error)} for _, ref, payload, _ in chunk
+            )
+            continue
+        for kind, *_ in chunk:
+            result["created" if kind == "create" else "updated"] += 1
+        inventory_changes.after_commit(company_ref.id, [change for *_, change in chunk])
+    return result
+
+
+def write_prepared(db, inventory_ref, prepared, uploader):
+    """Upserts a chunk from import_parsing.prepare_frame. Returns the counts from commit_writes."""
+    merged, errors, _ = prepared
+    writes = plan_writes(inventory_ref, merged, fetch_existing(db, inventory_ref, merged), uploader)
+    result = commit_writes(db, writes, inventory_ref.parent, uploader)
+    result["failed"] += len(errors)
+    result["errors"] = errors + result["errors"]
+    return result
+
+
+def import_frame(db, inventory_ref, df, uploader):
+    """Validates, merges and upserts one DataFrame. Returns the counts from commit_writes."""
+    return write_prepared(db, inventory_ref, import_parsing.prepare_frame(df), uploader)
+
+
+def import_chunks(db, inventory_ref, chunks, uploader, prepared=False):
+    """
+    Upserts `chunks` one at a time and yields a progress dict after each:
+    {"chunk", "rowsProcessed", "created", "updated", "failed", "errors"} where the
+    counts are running totals and "errors" holds only that chunk's errors.
+    `chunks` are raw DataFrames, or import_parsing.prepare_frame results when `prepared` is set.
+    The caller must have checked the first chunk's columns.
+    """
+    totals = {"created": 0, "updated": 0, "failed": 0}
+    rows_processed = 0
+    for number, chunk in enumerate(chunks, start=1):
+        chunk = chunk if prepared else import_parsing.prepare_frame(chunk)
+        result = write_prepared(db, inventory_ref, chunk, uploader)
+        rows_processed += chunk[2]
+        for key in totals:
+            totals[key] += result[key]
+        yield {"chunk": number, "rowsProcessed": rows_processed, **totals, "errors": result["errors"]}
+
+
+def summarize(progress):
+    """Folds the progress dicts from import_chunks into one summary."""
+    summary = {"chunks": 0, "rowsProcessed": 0, "created": 0, "updated": 0, "failed": 0, "errors": []}
+    for step in progress:
+        errors = step.pop("errors")
+        summary.update(step, chunks=step["chunk"])
+        room = MAX_REPORTED_ERRORS - len(summary["errors"])
+        if room > 0:
+            summary["errors"].extend(errors[:room])
+    summary.pop("chunk", None)
+    return summary
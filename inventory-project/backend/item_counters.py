@@ -0,0 +1,386 @@
+"""
+Sharded quantity/sold counters for hot items.
+
+Firestore sustains about one write per second to a single document, so an
+item whose stock moves faster than that can be switched to sharded mode. It
+then has `counter_shards` documents under
+`companies/{c}/inventory/{item}/counterShards`, and stock added by
+add-inventory and imports becomes a blind Increment of one shard picked at random instead of a write of
+the item.
+
+An item's true totals are its `quantity_base` / `sold_base` plus the sum of
+its shards. Its own `quantity` and `sold` cache that sum, and the analytics
+aggregate and daily rollup count the cached values, so a shard increment
+stages only its event: nothing else in the company is written per sale.
+get_inventory, the inventory cache, analytics queries and exports keep
+reading plain fields. Writes that set an absolute quantity read the shards
+in their transaction and move the base.
+
+One worker at a time, holding a lease on `system/counterRefresher`, scans
+the shards incremented since its cursor (a collection-group index on
+`counterShards.updated_at`) every COUNTER_REFRESH_SECONDS and writes each
+company's changed totals (and below_reorder) back in one batch, with the
+aggregate and rollup deltas and one inventory version bump. Every worker
+that increments a shard starts a refresher thread, but the others only try
+to take the lease over once it lapses (COUNTER_REFRESH_LEASE_SECONDS).
+COUNTER_REFRESH_SECONDS=0 instead re-sums right after each write, in the
+worker that made it.
+"""
+import os
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from firebase_admin import firestore
+
+import company_versions
+import inventory_aggregates
+import reorder_levels
+import stock_trends
+from db_init import db
+
+SHARDS_FIELD = "counter_shards"
+SHARDS_COLLECTION = "counterShards"
+COUNTER_FIELDS = ("quantity", "sold")
+BASE_FIELDS = {"quantity": "quantity_base", "sold": "sold_base"}
+# fields clients may not write directly
+INTERNAL_FIELDS = (SHARDS_FIELD, *BASE_FIELDS.values())
+
+DEFAULT_SHARDS = int(os.getenv("COUNTER_SHARDS", 10))
+# absolute writes read every shard in their transaction; keep that bounded
+MAX_SHARDS = 100
+# 0 re-sums right after each write instead of in an elected background refresher
+REFRESH_SECONDS = float(os.getenv("COUNTER_REFRESH_SECONDS", 1))
+# how long the elected refresher keeps the job without renewing it
+LEASE_SECONDS = float(os.getenv("COUNTER_REFRESH_LEASE_SECONDS", 30))
+# changed shards read per scan
+REFRESH_SCAN = 1000
+# items written back per batch, leaving room for the aggregate, rollup and version writes
+REFRESH_BATCH = 400
+SHARD_TIME_FIELD = "updated_at"
+DOCUMENT_ID = "__name__"
+
+_refresher = None
+_refresher_lock = threading.Lock()
+_worker_id = uuid.uuid4().hex
+_lease_until = 0.0                # monotonic time this worker's lease runs out
+_next_claim = 0.0                 # when a worker without the lease tries again
+_cursor = None                    # the refresher's position in the shard scan
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return 0
+    return value
+
+
+def shard_count(item):
+    count = (item or {}).get(SHARDS_FIELD)
+    return count if isinstance(count, int) and not isinstance(count, bool) and count > 0 else 0
+
+
+def is_sharded(item):
+    return shard_count(item) > 0
+
+
+def shard_refs(item_ref, count):
+    shards = item_ref.collection(SHARDS_COLLECTION)
+    return [shards.document(str(index)) for index in range(count)]
+
+
+def random_shard(item_ref, item):
+    return random.choice(shard_refs(item_ref, shard_count(item)))
+
+
+def sum_shards(snaps):
+    """{"quantity", "sold"} summed over shard snapshots."""
+    sums = dict.fromkeys(COUNTER_FIELDS, 0)
+    for snap in snaps:
+        if snap.exists:
+            data = snap.to_dict() or {}
+            for field in COUNTER_FIELDS:
+                sums[field] += _number(data.get(field))
+    return sums
+
+
+def shard_sums(item_ref, item, transaction=None):
+    """{"quantity", "sold"} summed over the item's shards, read in `transaction` if given."""
+    if not is_sharded(item):
+        return dict.fromkeys(COUNTER_FIELDS, 0)
+    return sum_shards(db.get_all(shard_refs(item_ref, shard_count(item)), transaction=transaction))
+
+
+def totals(item, sums):
+    """The item's true {"quantity", "sold"} given its shard sums."""
+    return {field: _number(item.get(BASE_FIELDS[field], 0)) + sums[field] for field in COUNTER_FIELDS}
+
+
+def strip(fields):
+    """`fields` without the counter bookkeeping a client must not set."""
+    return {field: value for field, value in fields.items() if field not in INTERNAL_FIELDS}
+
+
+# --------------------------------------------------------------------------------
+# Writes
+# --------------------------------------------------------------------------------
+def increment_payload(**amounts):
+    """Shard fields adding `amounts`, stamped for the refresher's scan; empty if nothing is added."""
+    payload = {field: firestore.Increment(amount) for field, amount in amounts.items() if amount}
+    if payload:
+        payload[SHARD_TIME_FIELD] = firestore.SERVER_TIMESTAMP
+    return payload
+
+
+def stage_increment(writer, item_ref, item, **amounts):
+    """Adds `amounts` (quantity=..., sold=...) to a random shard of a sharded item."""
+    payload = increment_payload(**amounts)
+    if payload:
+        writer.set(random_shard(item_ref, item), payload, merge=True)
+
+
+def increment_fields(item, **amounts):
+    """
+    Item fields adding `amounts` to an item read in the same transaction, for
+    writes that rewrite the item anyway; a sharded item's base moves too.
+    """
+    fields = {}
+    for field, amount in amounts.items():
+        fields[field] = _number(item.get(field, 0)) + amount
+        if is_sharded(item):
+            fields[BASE_FIELDS[field]] = _number(item.get(BASE_FIELDS[field], 0)) + amount
+    return fields
+
+
+def rebase(item, fields, sums):
+    """
+    `fields` for a write that sets counters outright: on a sharded item the
+    base takes whatever the shards do not already hold.
+    """
+    if not is_sharded(item):
+        return fields
+    fields = dict(fields)
+    for field in COUNTER_FIELDS:
+        if field in fields and _number(fields[field]) == fields[field]:
+            fields[BASE_FIELDS[field]] = fields[field] - sums[field]
+    return fields
+
+
+def set_shards(company_name, item_id, count):
+    """
+    Switches an item to `count` shards, or back to plain fields for 0. The
+    current shards are folded into the base and cleared, as are any left
+    behind by a deleted item with the same id. Returns {"id", "shards",
+    "quantity", "sold"}, or None if the item does not exist.
+    """
+    if not isinstance(count, int) or isinstance(count, bool) or not 0 <= count <= MAX_SHARDS:
+        raise ValueError(f"shards must be an integer from 0 to {MAX_SHARDS}")
+    company_ref = db.collection('companies').document(company_name)
+    item_ref = company_ref.collection('inventory').document(item_id)
+
+    @firestore.transactional
+    def switch(transaction):
+        snap = item_ref.get(transaction=transaction)
+        item = snap.to_dict() if snap.exists else None
+        if not inventory_aggregates.is_item(item):
+            return None
+        if is_sharded(item):
+            values = totals(item, shard_sums(item_ref, item, transaction))
+        else:
+            values = {field: _number(item.get(field, 0)) for field in COUNTER_FIELDS}
+        for shard_ref in shard_refs(item_ref, max(shard_count(item), count)):
+            transaction.delete(shard_ref)
+        fields = dict(values)
+        if count:
+            fields[SHARDS_FIELD] = count
+            fields.update({BASE_FIELDS[field]: value for field, value in values.items()})
+        else:
+            fields.update({field: firestore.DELETE_FIELD for field in INTERNAL_FIELDS})
+        transaction.update(item_ref, reorder_levels.with_flag(company_name, item, fields))
+        # the true totals do not change, so no event; the aggregates count the cached ones
+        after = {**item, **values}
+        inventory_aggregates.stage_delta(transaction, company_ref, inventory_aggregates.delta(item, after))
+        stock_trends.stage_day_delta(transaction, company_ref, stock_trends.level_delta(item, after))
+        company_versions.stage_bump(transaction, company_ref, company_versions.INVENTORY)
+        return {"id": item_id, "shards": count, **values}
+
+    result = switch(db.transaction())
+    if result is not None:
+        company_versions.invalidate(company_name)
+    return result
+
+
+# --------------------------------------------------------------------------------
+# Refreshing the cached totals
+# --------------------------------------------------------------------------------
+def _refresh_batch(company_name, item_refs):
+    """
+    Writes the summed totals of sharded items in one company back to them, in
+    one batch with the aggregate and daily rollup deltas their shard
+    increments deferred and a single version bump. Returns how many changed.
+    """
+    company_ref = db.collection('companies').document(company_name)
+    batch, changed = db.batch(), 0
+    aggregate, rollup = [], []
+    for snap in db.get_all(item_refs):
+        item = snap.to_dict() if snap.exists else None
+        if not is_sharded(item):
+            continue
+        fields = reorder_levels.with_flag(company_name, item, totals(item, shard_sums(snap.reference, item)))
+        if all(item.get(field) == value for field, value in fields.items()):
+            continue
+        after = {**item, **fields}
+        # a concurrent write may have moved the base; fail rather than overwrite it
+        batch.update(snap.reference, fields, option=db.write_option(last_update_time=snap.update_time))
+        aggregate.append(inventory_aggregates.delta(item, after))
+        rollup.append(stock_trends.level_delta(item, after))
+        changed += 1
+    if not changed:
+        return 0
+    inventory_aggregates.stage_delta(batch, company_ref, inventory_aggregates.combine(aggregate))
+    stock_trends.stage_day_delta(batch, company_ref, stock_trends.combine(rollup))
+    company_versions.stage_bump(batch, company_ref, company_versions.INVENTORY)
+    batch.commit()
+    company_versions.invalidate(company_name)
+    return changed
+
+
+def refresh_items(company_name, item_refs):
+    """
+    Re-sums sharded items of one company, REFRESH_BATCH per batch; a batch
+    that fails (usually one item written meanwhile) is retried item by item.
+    Returns how many items changed. Raises if an item still fails.
+    """
+    changed = 0
+    for start in range(0, len(item_refs), REFRESH_BATCH):
+        chunk = item_refs[start:start + REFRESH_BATCH]
+        try:
+            changed += _refresh_batch(company_name, chunk)
+        except Exception:
+            if len(chunk) == 1:
+                raise
+            for item_ref in chunk:
+                changed += _refresh_batch(company_name, [item_ref])
+    return changed
+
+
+def refresh_item(company_name, item_ref):
+    """Writes a sharded item's summed totals back to it. Returns True if they had changed."""
+    return refresh_items(company_name, [item_ref]) > 0
+
+
+def refresh_changed(cursor=None, scan=REFRESH_SCAN):
+    """
+    Re-sums every item whose shards were incremented after `cursor`, a
+    {"at", "path"} position in a collection-group scan of shards by their
+    SHARD_TIME_FIELD. Returns the cursor to resume from, which never passes
+    a shard whose item failed.
+    """
+    while True:
+        query = db.collection_group(SHARDS_COLLECTION).order_by(SHARD_TIME_FIELD).order_by(DOCUMENT_ID)
+        if cursor:
+            query = query.start_after({SHARD_TIME_FIELD: cursor["at"], DOCUMENT_ID: db.document(cursor["path"])})
+        snaps = list(query.limit(scan).stream())
+        companies = defaultdict(dict)
+        for position, snap in enumerate(snaps):
+            # companies/{c}/inventory/{item}/counterShards/{n}
+            item_ref = snap.reference.parent.parent
+            companies[item_ref.parent.parent.id].setdefault(item_ref.path, (item_ref, position))
+        failed = None
+        for company_name, items in companies.items():
+            try:
+                refresh_items(company_name, [item_ref for item_ref, _ in items.values()])
+            except Exception as e:
+                print(f"❌ Error refreshing counters for {company_name}: {e}")
+                first = min(position for _, position in items.values())
+                failed = first if failed is None else min(failed, first)
+        last = len(snaps) - 1 if failed is None else failed - 1
+        if last >= 0:
+            cursor = {"at": snaps[last].to_dict()[SHARD_TIME_FIELD], "path": snaps[last].reference.path}
+        if failed is not None or len(snaps) < scan:
+            return cursor
+
+
+def schedule(company_name, changes):
+    """
+    Makes sure the sharded items among committed inventory_changes get
+    re-summed: right away when COUNTER_REFRESH_SECONDS is 0, otherwise by the
+    elected refresher, which this worker offers to become.
+    """
+    inventory_ref = db.collection('companies').document(company_name).collection('inventory')
+    item_refs = [inventory_ref.document(change.item_id) for change in changes if is_sharded(change.after)]
+    if not item_refs:
+        return
+    if REFRESH_SECONDS <= 0:
+        refresh_items(company_name, item_refs)
+    else:
+        _ensure_refresher()
+
+
+# --------------------------------------------------------------------------------
+# Refresher election
+# --------------------------------------------------------------------------------
+def _lease_ref():
+    return db.collection("system").document("counterRefresher")
+
+
+def _claim(cursor):
+    """
+    Takes or renews the refresher lease, storing `cursor` when it is set.
+    Returns (held, the cursor to resume from).
+    """
+    @firestore.transactional
+    def claim(transaction):
+        snap = _lease_ref().get(transaction=transaction)
+        lease = snap.to_dict() if snap.exists else {}
+        now = datetime.now(timezone.utc)
+        expires = lease.get("expiresAt")
+        if lease.get("holder") not in (None, _worker_id) and isinstance(expires, datetime) and expires > now:
+            return False, None
+        fields = {"holder": _worker_id, "expiresAt": now + timedelta(seconds=LEASE_SECONDS)}
+        if cursor:
+            fields["cursor"] = cursor
+        transaction.set(_lease_ref(), fields, merge=True)
+        return True, cursor or lease.get("cursor")
+
+    return claim(db.transaction())
+
+
+def refresh_cycle():
+    """
+    One refresher tick: a worker that holds the lease (renewing it, and
+    storing its cursor, every half lease) re-sums the items whose shards
+    changed; any other worker only retries the lease every half lease.
+    Returns True if this worker refreshed.
+    """
+    global _lease_until, _next_claim, _cursor
+    now = time.monotonic()
+    if now >= _lease_until - LEASE_SECONDS / 2:
+        if now >= _lease_until and now < _next_claim:
+            return False
+        held, cursor = _claim(_cursor)
+        if not held:
+            _lease_until, _next_claim = 0.0, now + LEASE_SECONDS / 2
+            return False
+        _lease_until, _cursor = now + LEASE_SECONDS, cursor
+    _cursor = refresh_changed(_cursor)
+    return True
+
+
+def _refresh_loop():
+    while True:
+        time.sleep(REFRESH_SECONDS)
+        try:
+            refresh_cycle()
+        except Exception as e:
+            print(f"❌ Error refreshing sharded counters: {e}")
+
+
+def _ensure_refresher():
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None or not _refresher.is_alive():
+            _refresher = threading.Thread(target=_refresh_loop, name="counter-refresher", daemon=True)
+            _refresher.start()
@@ -0,0 +1,260 @@
+"""
+Deterministic inventory document ids.
+
+An item's document id is a hash of its normalized (name, supplier, category):
+whitespace collapsed, case folded and a missing category treated as empty.
+Finding an item is then a point read of a known document instead of a
+three-field query, and concurrent adds of the same item meet on one document
+inside a transaction instead of racing to create two.
+
+Case folding means names that differ only in case or spacing, such as
+"USB-c" and "USB-C", are one item: stock added under either spelling goes to
+the same document, which keeps the spelling it was created with. Because the
+id is derived from them, an edit that changes an item's name, supplier or
+category to values with a different id re-keys it (`read_rekey` and
+`stage_rekey`): one transaction creates the item under its new id and deletes
+the old document, and fails with KeyConflict if another item already has the
+new values. Events and stock movements recorded under the old id keep it.
+
+Items created before this keep their random ids until `flask migrate-item-ids`
+re-keys them. Until then the old (name, supplier, category) query is still
+used when the point read misses; set ITEM_ID_LEGACY_LOOKUP=0 once every
+company has been migrated.
+"""
+import hashlib
+import os
+from collections import defaultdict, namedtuple
+from datetime import datetime, timezone
+
+from firebase_admin import firestore
+
+import company_versions
+import inventory_aggregates
+import inventory_changes
+import item_counters
+import reorder_levels
+import stock_movements
+from db_init import db
+
+LEGACY_LOOKUP = os.getenv("ITEM_ID_LEGACY_LOOKUP", "1") != "0"
+# Firestore's limit on the values of one `in` filter
+IN_QUERY_VALUES = 30
+# writes per migration batch, leaving room for the version bump
+MIGRATE_BATCH = 499
+# fields added up when duplicates collapse into one item
+SUMMED_FIELDS = ("quantity", "sold")
+KEY_FIELDS = ("name", "supplier", "category")
+KEY_CONFLICT_ERROR = "Another item already has this name, supplier and category"
+
+_EPOCH = datetime.min.replace(tzinfo=timezone.utc)
+
+# an item about to move from `ref` to `new_ref`, read by read_rekey
+Rekey = namedtuple("Rekey", "ref new_ref before moved")
+
+
+class KeyConflict(ValueError):
+    """An edit would move an item onto the id of another existing item."""
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return 0
+    return value
+
+
+def normalize(value):
+    if value is None:
+        return ""
+    return " ".join(str(value).split()).casefold()
+
+
+def item_id(name, supplier, category):
+    key = "\x1f".join(normalize(part) for part in (name, supplier, category))
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def id_of(item):
+    return item_id(item.get("name"), item.get("supplier"), item.get("category"))
+
+
+def changes_key(before, fields):
+    """Whether writing `fields` over the item `before` changes its id."""
+    return bool(before) and any(field in fields for field in KEY_FIELDS) \
+        and id_of({**before, **fields}) != id_of(before)
+
+
+def read_rekey(transaction, company_name, ref, before, fields):
+    """
+    Reads, in `transaction`, what moving the item `before` at `ref` to the id
+    of `fields` written over it needs. The moved item is plain: a sharded
+    item's shard sums and any pending stock movements are folded into its
+    counters. Raises KeyConflict if the new id is already taken.
+    """
+    new_ref = ref.parent.document(id_of({**before, **fields}))
+    if new_ref.get(transaction=transaction).exists:
+        raise KeyConflict(KEY_CONFLICT_ERROR)
+    counters = {field: _number(before.get(field, 0)) for field in item_counters.COUNTER_FIELDS}
+    if item_counters.is_sharded(before):
+        counters = item_counters.totals(before, item_counters.shard_sums(ref, before, transaction))
+    pending = stock_movements.pending_deltas(ref, before, counters["quantity"], transaction)
+
+    moved = {**item_counters.strip(before), **counters}
+    # the new document's movements start afresh
+    moved.pop(stock_movements.CURSOR_FIELD, None)
+    for field, value in fields.items():
+        if value is firestore.DELETE_FIELD:
+            moved.pop(field, None)
+        else:
+            moved[field] = value
+    for field in item_counters.COUNTER_FIELDS:
+        moved[field] = _number(moved.get(field, 0)) + pending[field]
+    return Rekey(ref, new_ref, before, reorder_levels.with_flag(company_name, None, moved))
+
+
+def stage_rekey(transaction, rekey):
+    """Stages a move read by read_rekey. Returns its inventory changes."""
+    transaction.create(rekey.new_ref, rekey.moved)
+    transaction.delete(rekey.ref)
+    if item_counters.is_sharded(rekey.before):
+        for shard_ref in item_counters.shard_refs(rekey.ref, item_counters.shard_count(rekey.before)):
+            transaction.delete(shard_ref)
+    return [
+        inventory_changes.Change(rekey.ref.id, rekey.before, None),
+        inventory_changes.Change(rekey.new_ref.id, None, rekey.moved),
+    ]
+
+
+def legacy_query(inventory_ref, name, supplier, category):
+    """The pre-migration lookup; only meaningful while LEGACY_LOOKUP is on."""
+    return inventory_ref.where("name", "==", name)\
+                        .where("supplier", "==", supplier)\
+                        .where("category", "==", category).limit(1)
+
+
+def find_legacy(inventory_ref, keys, field_paths=None):
+    """
+    Legacy-keyed documents for `keys` ({item id: (name, supplier, category)}),
+    found with `in` queries on the name, so a chunk of items costs a few
+    queries rather than one each. Returns {item id: snapshot}.
+    """
+    names = sorted({name for name, _, _ in keys.values()})
+    found = {}
+    for start in range(0, len(names), IN_QUERY_VALUES):
+        query = inventory_ref.where("name", "in", names[start:start + IN_QUERY_VALUES])
+        if field_paths:
+            query = query.select(field_paths)
+        for snap in query.stream():
+            key = id_of(snap.to_dict())
+            if key in keys and snap.id != key:
+                found.setdefault(key, snap)
+    return found
+
+
+# --------------------------------------------------------------------------------
+# Migration
+# --------------------------------------------------------------------------------
+def _updated(snap):
+    value = snap.to_dict().get("updated_at") or snap.to_dict().get("added_at")
+    return value if isinstance(value, datetime) else _EPOCH
+
+
+def _counters(snap, sums):
+    item = snap.to_dict()
+    if snap.id in sums:
+        return item_counters.totals(item, sums[snap.id])
+    return {field: _number(item.get(field, 0)) for field in SUMMED_FIELDS}
+
+
+def merge_items(snaps, sums=None):
+    """
+    One item from documents that share an id: the most recently updated one's
+    fields, quantities and sales added up, and the earliest added_at. `sums`
+    maps sharded documents' ids to their shard sums; those items count at
+    their true totals and come out plain.
+    """
+    sums = sums or {}
+    snaps = sorted(snaps, key=_updated)
+    merged = item_counters.strip(snaps[-1].to_dict())
+    for field in SUMMED_FIELDS:
+        merged[field] = sum(_counters(snap, sums)[field] for snap in snaps)
+    added = [snap.to_dict().get("added_at") for snap in snaps if isinstance(snap.to_dict().get("added_at"), datetime)]
+    if added:
+        merged["added_at"] = min(added)
+    return merged
+
+
+def migrate(company_name):
+    """
+    Moves every item whose document id is not its deterministic id, merging
+    items that turn out to be the same. Each write is conditional on the
+    documents being unchanged since they were read, so a batch that races a
+    live write fails instead of losing it; re-running picks it up.
+    Returns counts of source documents: "moved" to their new id, "merged"
+    into another item, and "failed" in a rejected batch.
+    Sharded items are folded into plain fields and their counter shards
+    deleted, each delete conditional like the rest so a racing increment fails
+    the batch. Events already in the log, and stock movements recorded under
+    the old document, keep the item's old id; compact pending movements first.
+    """
+    company_ref = db.collection('companies').document(company_name)
+    inventory_ref = company_ref.collection('inventory')
+    levels = reorder_levels.category_levels(company_name)
+
+    groups = defaultdict(list)
+    for snap in inventory_ref.stream():
+        if inventory_aggregates.is_item(snap.to_dict()):
+            groups[id_of(snap.to_dict())].append(snap)
+
+    result = {"moved": 0, "merged": 0, "failed": 0}
+    batch, pending, counts = db.batch(), 0, []
+
+    def commit():
+        company_versions.stage_bump(batch, company_ref, company_versions.INVENTORY)
+        try:
+            batch.commit()
+        except Exception as e:
+            print(f"❌ Error re-keying inventory for {company_name}: {e}")
+            result["failed"] += sum(count for _, count in counts)
+            return
+        company_versions.invalidate(company_name)
+        for kind, count in counts:
+            result[kind] += count
+
+    for target_id, snaps in groups.items():
+        if len(snaps) == 1 and snaps[0].id == target_id:
+            continue
+        shards = {
+            snap.id: [shard for shard in db.get_all(item_counters.shard_refs(
+                snap.reference, item_counters.shard_count(snap.to_dict()))) if shard.exists]
+            for snap in snaps if item_counters.is_sharded(snap.to_dict())
+        }
+        writes = len(snaps) + 1 + sum(len(found) for found in shards.values())
+        if pending + writes > MIGRATE_BATCH:
+            commit()
+            batch, pending, counts = db.batch(), 0, []
+        merged = merge_items(snaps, {doc_id: item_counters.sum_shards(found) for doc_id, found in shards.items()})
+        merged[reorder_levels.FLAG_FIELD] = reorder_levels.is_below(merged, levels)
+        target_ref = inventory_ref.document(target_id)
+        current = next((snap for snap in snaps if snap.id == target_id), None)
+        if current is None:
+            batch.create(target_ref, merged)
+        else:
+            merged.update({field: firestore.DELETE_FIELD for field in item_counters.INTERNAL_FIELDS})
+            batch.update(target_ref, merged, option=db.write_option(last_update_time=current.update_time))
+        for snap in snaps:
+            if snap.id != target_id:
+                batch.delete(snap.reference, option=db.write_option(last_update_time=snap.update_time))
+        for found in shards.values():
+            for shard in found:
+                batch.delete(shard.reference, option=db.write_option(last_update_time=shard.update_time))
+        pending += writes
+        if len(snaps) == 1:
+            counts.append(("moved", 1))
+        else:
+            counts.append(("merged", sum(1 for snap in snaps if snap.id != target_id)))
+    if pending:
+        commit()
+
+    # merging changes item counts and values; recount rather than track deltas
+    inventory_aggregates.rebuild(company_name)
+    return result
@@ -0,0 +1,183 @@
+"""
+Shared SMTP transport.
+
+Keeps a small pool of logged-in SMTP connections open between messages, so a
+signup or password reset no longer pays a TCP + TLS handshake and a login per
+email. A connection the server has dropped is replaced and the message retried
+once. `send` takes several recipients and delivers them in a single SMTP
+transaction; `send_many` delivers a list of messages over one connection.
+
+Settings (read on first send):
+    SMTP_SERVER, SMTP_PORT         default smtp.gmail.com:465
+    SMTP_EMAIL, SMTP_PASSWORD      login and From address
+    SMTP_SECURITY                  ssl (default on port 465), starttls, or none
+    SMTP_POOL_SIZE                 open connections kept, default 2
+    SMTP_IDLE_SECONDS              idle connections older than this are reopened, default 60
+
+For local testing run a debugging server, e.g.
+`python -m aiosmtpd -n -l localhost:1025`, and set SMTP_SERVER=localhost,
+SMTP_PORT=1025, SMTP_SECURITY=none; credentials are optional then.
+"""
+import os
+import smtplib
+import ssl
+import threading
+import time
+from email.mime.text import MIMEText
+
+import metrics
+
+# errors after which the connection is unusable and worth one reconnect
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, ssl.SSLError, TimeoutError)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class SMTPPool:
+    def __init__(self, host, port, username=None, password=None, security="ssl",
+                 size=2, idle_seconds=60, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.security = security
+        self.size = size
+        self.idle_seconds = idle_seconds
+        self.timeout = timeout
+        self._idle = []  # [(smtp, last_used)], most recently used last
+        self._open = 0
+        self._cond = threading.Condition()
+
+    def _connect(self):
+        if self.security == "ssl":
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout,
+                                    context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.security == "starttls":
+                smtp.starttls(context=ssl.create_default_context())
+        if self.username:
+            smtp.login(self.username, self.password)
+        return smtp
+
+    @staticmethod
+    def _close(smtp):
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+    def _acquire(self):
+        with self._cond:
+            while not self._idle and self._open >= self.size:
+                self._cond.wait()
+            if self._idle:
+                smtp, last_used = self._idle.pop()
+            else:
+                self._open += 1
+                smtp, last_used = None, None
+
+        if smtp is not None and time.monotonic() - last_used > self.idle_seconds:
+            # servers drop idle sessions; reopen rather than fail the first send
+            self._close(smtp)
+            smtp = None
+        if smtp is None:
+            try:
+                smtp = self._connect()
+            except Exception:
+                self._release(None)
+                raise
+        return smtp
+
+    def _release(self, smtp):
+        with self._cond:
+            if smtp is None:
+                self._open -= 1
+            else:
+                self._idle.append((smtp, time.monotonic()))
+            self._cond.notify()
+
+    def send_many(self, messages):
+        """Sends MIME messages over one pooled connection, reconnecting once if it drops."""
+        with metrics.timed("smtp", "send"):
+            smtp = self._acquire()
+            try:
+                for msg in messages:
+                    try:
+                        smtp.send_message(msg)
+                    except _CONNECTION_ERRORS:
+                        smtp.close()
+                        smtp = None
+                        smtp = self._connect()
+                        smtp.send_message(msg)
+            except Exception:
+                if smtp is not None:
+                    self._close(smtp)
+                self._release(None)
+                raise
+            self._release(smtp)
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for smtp, _ in idle:
+            self._close(smtp)
+
+
+def _pool_from_env():
+    port = int(os.getenv("SMTP_PORT", 465))
+    return SMTPPool(
+        host=os.getenv("SMTP_SERVER", "smtp.gmail.com"),
+        port=port,
+        username=os.getenv("SMTP_EMAIL"),
+        password=os.getenv("SMTP_PASSWORD"),
+        security=os.getenv("SMTP_SECURITY", "ssl" if port == 465 else "starttls").lower(),
+        size=int(os.getenv("SMTP_POOL_SIZE", 2)),
+        idle_seconds=float(os.getenv("SMTP_IDLE_SECONDS", 60)),
+    )
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _pool_from_env()
+    return _pool
+
+
+def configured():
+    """Credentials are required unless talking to an unsecured (local debugging) server."""
+    if os.getenv("SMTP_EMAIL") and os.getenv("SMTP_PASSWORD"):
+        return True
+    return os.getenv("SMTP_SECURITY", "").lower() == "none"
+
+
+def build_message(subject, body, to_addrs, subtype="plain"):
+    msg = MIMEText(body, subtype)
+    msg["From"] = os.getenv("SMTP_EMAIL") or "noreply@localhost"
+    msg["To"] = ", ".join(to_addrs)
+    msg["Subject"] = subject
+    return msg
+
+
+def send(subject, body, to_addrs, subtype="plain"):
+    """
+    Emails `body` to one address or a list of them in a single SMTP transaction.
+    Returns True when the server accepted it; failures are logged, not raised.
+    """
+    if isinstance(to_addrs, str):
+        to_addrs = [to_addrs]
+    if not to_addrs:
+        return False
+    if not configured():
+        print("❌ Error: Missing SMTP credentials. Check your .env file.")
+        return False
+    try:
+        get_pool().send_many([build_message(subject, body, to_addrs, subtype)])
+        return True
+    except Exception as e:
+        print(f"❌ Error sending email to {', '.join(to_addrs)}: {e}")
+        return False
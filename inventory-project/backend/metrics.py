@@ -0,0 +1,275 @@
+"""
+Per-request and cumulative metrics for the backend's outbound calls.
+
+Every Firestore call made through `db_init.db` (see firestore_metrics), every
+SMTP send and every Firebase Auth call is recorded twice:
+
+- into the current request's totals, which are added to its Server-Timing
+  header next to request_fanout's entries, e.g.
+  `firestore-query;dur=12.4;desc="2 calls, 40 docs", smtp;dur=80.1;desc="1 call"`.
+  Calls made concurrently by fanned-out queries are summed, so the totals can
+  exceed the request's wall time.
+- into process-wide counters and histograms per route, served in the
+  Prometheus text format at GET /metrics.
+
+Calls made outside a request (background threads, CLI commands) are counted
+under route="background". The prometheus_client package is not needed; the
+few metric types used here are rendered directly.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+# seconds; Firestore point reads sit at the low end, exports and imports at the top
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+BACKGROUND = "background"
+UNMATCHED = "unmatched"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames, buckets=BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[index] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = sorted((labels, list(row)) for labels, row in self._values.items())
+        for labels, row in values:
+            for bound, count in zip(self.buckets, row):
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', _number(bound))])} {count}"
+            yield f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', '+Inf')])} {row[-1]}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(row[-2])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {row[-1]}"
+
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "Requests handled, by route, method and status.",
+    ("route", "method", "status"),
+)
+HTTP_DURATION = Histogram(
+    "http_request_duration_seconds", "Time from routing a request to its response.",
+    ("route", "method"),
+)
+FIRESTORE_OPERATIONS = Counter(
+    "firestore_operations_total", "Firestore calls, by the route that made them.",
+    ("route", "operation", "outcome"),
+)
+FIRESTORE_DOCUMENTS = Counter(
+    "firestore_documents_total", "Documents returned by Firestore reads or written by its writes.",
+    ("route", "operation"),
+)
+FIRESTORE_DURATION = Histogram(
+    "firestore_operation_duration_seconds", "Time spent in Firestore calls.",
+    ("route", "operation"),
+)
+EXTERNAL_CALLS = Counter(
+    "external_calls_total", "SMTP and Firebase Auth calls, by the route that made them.",
+    ("route", "service", "operation", "outcome"),
+)
+EXTERNAL_DURATION = Histogram(
+    "external_call_duration_seconds", "Time spent in SMTP and Firebase Auth calls.",
+    ("route", "service", "operation"),
+)
+REGISTRY = (
+    HTTP_REQUESTS, HTTP_DURATION,
+    FIRESTORE_OPERATIONS, FIRESTORE_DOCUMENTS, FIRESTORE_DURATION,
+    EXTERNAL_CALLS, EXTERNAL_DURATION,
+)
+
+
+def render():
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        kind = "histogram" if isinstance(metric, Histogram) else "counter"
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+# --------------------------------------------------------------------------------
+# Recording
+# --------------------------------------------------------------------------------
+class RequestTotals:
+    """Calls made while handling one request; fanned-out queries add to it from pool threads."""
+
+    def __init__(self):
+        self._totals = {}  # server-timing name -> [calls, documents, seconds]
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, documents=None):
+        with self._lock:
+            entry = self._totals.setdefault(name, [0, None, 0.0])
+            entry[0] += 1
+            if documents is not None:
+                entry[1] = (entry[1] or 0) + documents
+            entry[2] += seconds
+
+    def server_timing(self):
+        with self._lock:
+            totals = sorted(self._totals.items())
+        entries = []
+        for name, (calls, documents, seconds) in totals:
+            desc = f"{calls} call{'' if calls == 1 else 's'}"
+            if documents is not None:
+                desc += f", {documents} doc{'' if documents == 1 else 's'}"
+            entries.append(f'{name};dur={seconds * 1000:.1f};desc="{desc}"')
+        return ", ".join(entries) or None
+
+
+def _request_totals():
+    if not has_request_context():
+        return None
+    if "metrics" not in g:
+        g.metrics = RequestTotals()
+    return g.metrics
+
+
+def route():
+    """The route label for calls made now."""
+    if not has_request_context():
+        return BACKGROUND
+    return request.url_rule.rule if request.url_rule is not None else UNMATCHED
+
+
+def record_firestore(operation, seconds, documents=0, error=False):
+    """Records one Firestore call that returned or wrote `documents` documents."""
+    label = route()
+    FIRESTORE_OPERATIONS.inc((label, operation, "error" if error else "ok"))
+    FIRESTORE_DOCUMENTS.inc((label, operation), documents)
+    FIRESTORE_DURATION.observe((label, operation), seconds)
+    totals = _request_totals()
+    if totals is not None:
+        totals.add(f"firestore-{operation}", seconds, documents)
+
+
+def record_call(service, operation, seconds, error=False):
+    """Records one SMTP or Firebase Auth call."""
+    label = route()
+    EXTERNAL_CALLS.inc((label, service, operation, "error" if error else "ok"))
+    EXTERNAL_DURATION.observe((label, service, operation), seconds)
+    totals = _request_totals()
+    if totals is not None:
+        totals.add(service.replace("_", "-"), seconds)
+
+
+@contextmanager
+def timed(service, operation):
+    """Times the block as one `service` call; an exception counts it as an error."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        record_call(service, operation, time.perf_counter() - start, error=True)
+        raise
+    record_call(service, operation, time.perf_counter() - start)
+
+
+class Instrumented:
+    """
+    Proxy for a module of API functions, e.g. `firebase_admin.auth`, that times
+    every public function called through it. Everything else, exception
+    classes included, passes through untouched.
+    """
+
+    def __init__(self, target, service):
+        self._target = target
+        self._service = service
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if name.startswith("_") or isinstance(value, type) or not callable(value):
+            return value
+
+        def call(*args, **kwargs):
+            with timed(self._service, name):
+                return value(*args, **kwargs)
+        return call
+
+
+# --------------------------------------------------------------------------------
+# Flask
+# --------------------------------------------------------------------------------
+def init_app(app):
+    """Times every request, extends its Server-Timing header and serves GET /metrics."""
+
+    @app.before_request
+    def start_timer():
+        # created up front so fanned-out queries never race to create it
+        g.metrics = RequestTotals()
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.get("metrics_start")
+        if start is not None:
+            label = route()
+            HTTP_REQUESTS.inc((label, request.method, str(response.status_code)))
+            HTTP_DURATION.observe((label, request.method), time.perf_counter() - start)
+        totals = g.get("metrics")
+        value = totals.server_timing() if totals is not None else None
+        if value:
+            # request_fanout may have set its own entries already, or may add them after this
+            existing = response.headers.get("Server-Timing")
+            response.headers["Server-Timing"] = f"{existing}, {value}" if existing else value
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        return Response(render(), content_type=CONTENT_TYPE)
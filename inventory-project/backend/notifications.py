@@ -0,0 +1,191 @@
+"""
+Asynchronous company notifications.
+
+`notify_inventory` only puts work on an in-process queue, so write endpoints
+return without waiting on Firestore lookups or email delivery. A daemon
+thread drains the queue. For each email it loads the company's member
+profiles from `companies/{c}/users` in one `get_all` batch and emails the
+admins and managers in a single multi-recipient message.
+
+Inventory changes are coalesced per company: the first change opens a window
+of NOTIFY_DIGEST_SECONDS, later changes join it (repeated changes to one item
+are merged), and when the window closes a single digest listing each item's
+quantity and price change is sent. A bulk import therefore sends one email per
+window instead of one per item, and no change waits longer than the window.
+Set NOTIFY_DIGEST_SECONDS=0 to send each change straight away.
+"""
+import os
+import queue
+import threading
+import time
+
+import inventory_aggregates
+import mailer
+from db_init import db
+
+NOTIFIED_ROLES = ("admin", "manager")
+DIGEST_SECONDS = float(os.getenv("NOTIFY_DIGEST_SECONDS", 60))
+# items tracked per digest; further items are only counted
+DIGEST_MAX_ITEMS = int(os.getenv("NOTIFY_DIGEST_MAX_ITEMS", 1000))
+# item lines written into one email
+DIGEST_LISTED_ITEMS = 50
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+# company -> open digest; only touched by the worker thread
+_digests = {}
+
+
+def send_email(to_addrs, subject, body):
+    """Emails a list of addresses in one message; failures are logged by mailer."""
+    if mailer.send(subject, body, to_addrs):
+        print(f"Email sent to {', '.join(to_addrs)}: {subject} - {body}")
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_drain_queue, name="notifications", daemon=True)
+            _worker.start()
+
+
+def notify_inventory(company_name, changes):
+    """Queues inventory_changes.Change tuples for the company's next digest."""
+    changes = [c for c in changes
+               if inventory_aggregates.is_item(c.before) or inventory_aggregates.is_item(c.after)]
+    if changes:
+        _queue.put(("changes", company_name, changes))
+        _ensure_worker()
+
+
+def wait_until_idle():
+    """Sends every open digest and blocks until the queue is empty (tests, shutdown)."""
+    _queue.put(("flush", None, None))
+    _ensure_worker()
+    _queue.join()
+
+
+def recipients(company_name):
+    """Emails of the company's admins and managers."""
+    company_ref = db.collection('companies').document(company_name)
+    company_snap = company_ref.get()
+    if not company_snap.exists:
+        return []
+    member_uids = (company_snap.to_dict() or {}).get("members", [])
+    if not member_uids:
+        return []
+    user_refs = [company_ref.collection('users').document(uid) for uid in member_uids]
+    emails = []
+    for user_snap in db.get_all(user_refs, field_paths=["role", "email"]):
+        user_doc = user_snap.to_dict() if user_snap.exists else None
+        if user_doc and user_doc.get("role") in NOTIFIED_ROLES and user_doc.get("email"):
+            emails.append(user_doc["email"])
+    return emails
+
+
+def _dispatch(subject, body, company_name):
+    to_addrs = recipients(company_name)
+    if to_addrs:
+        send_email(to_addrs, subject, body)
+
+
+# --------------------------------------------------------------------------------
+# Inventory Digests
+# --------------------------------------------------------------------------------
+def _state(item):
+    if not inventory_aggregates.is_item(item):
+        return None
+    return {"quantity": item.get("quantity", 0), "price": item.get("price", 0)}
+
+
+def _add_to_digest(company_name, changes, now):
+    digest = _digests.get(company_name)
+    if digest is None:
+        digest = _digests[company_name] = {"items": {}, "events": 0, "untracked": set(),
+                                           "deadline": now + DIGEST_SECONDS}
+    for change in changes:
+        digest["events"] += 1
+        entry = digest["items"].get(change.item_id)
+        if entry is None:
+            if len(digest["items"]) >= DIGEST_MAX_ITEMS:
+                digest["untracked"].add(change.item_id)
+                continue
+            # the first change in the window fixes the "before" side
+            entry = digest["items"][change.item_id] = {"before": _state(change.before), "events": 0}
+        entry["name"] = (change.after or change.before or {}).get("name", change.item_id)
+        entry["after"] = _state(change.after)
+        entry["events"] += 1
+
+
+def _describe(entry):
+    before, after = entry["before"], entry["after"]
+    name = entry["name"]
+    if before is None and after is None:
+        line = f"{name}: added and deleted"
+    elif before is None:
+        line = f"{name}: added with quantity {after['quantity']} at price ${after['price']}"
+    elif after is None:
+        line = f"{name}: deleted (had quantity {before['quantity']} at price ${before['price']})"
+    else:
+        parts = []
+        if before["quantity"] != after["quantity"]:
+            parts.append(f"quantity {before['quantity']} -> {after['quantity']}")
+        if before["price"] != after["price"]:
+            parts.append(f"price ${before['price']} -> ${after['price']}")
+        line = f"{name}: " + (", ".join(parts) or "details updated")
+    if entry["events"] > 1:
+        line += f" ({entry['events']} changes)"
+    return line
+
+
+def build_digest(company_name, digest):
+    """(subject, body) for a digest; a lone change keeps the old single-event subject."""
+    entries = list(digest["items"].values())
+    item_count = len(entries) + len(digest["untracked"])
+    if item_count == 1 and digest["events"] == 1:
+        entry = entries[0]
+        if entry["before"] is None:
+            subject = "New Inventory Added"
+        elif entry["after"] is None:
+            subject = "Inventory Deleted"
+        else:
+            subject = "Inventory Updated"
+        return subject, _describe(entry)
+
+    lines = [f"{digest['events']} inventory changes to {item_count} items in {company_name}:", ""]
+    lines += [f"- {_describe(entry)}" for entry in entries[:DIGEST_LISTED_ITEMS]]
+    hidden = item_count - min(len(entries), DIGEST_LISTED_ITEMS)
+    if hidden:
+        lines.append(f"...and {hidden} more items")
+    return f"Inventory Digest: {item_count} items changed", "\n".join(lines)
+
+
+def _flush_digests(now, force=False):
+    for company_name, digest in list(_digests.items()):
+        if force or digest["deadline"] <= now:
+            del _digests[company_name]
+            try:
+                _dispatch(*build_digest(company_name, digest), company_name)
+            except Exception as e:
+                print(f"❌ Error sending inventory digest to {company_name}: {e}")
+
+
+def _drain_queue():
+    while True:
+        deadlines = [digest["deadline"] for digest in _digests.values()]
+        timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+        try:
+            kind, company_name, payload = _queue.get(timeout=timeout)
+        except queue.Empty:
+            _flush_digests(time.monotonic())
+            continue
+        try:
+            if kind == "changes":
+                _add_to_digest(company_name, payload, time.monotonic())
+            _flush_digests(time.monotonic(), force=(kind == "flush"))
+        except Exception as e:
+            print(f"❌ Error sending notification to {company_name}: {e}")
+        finally:
+            _queue.task_done()
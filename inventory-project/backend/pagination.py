@@ -0,0 +1,112 @@
+"""
+Cursor pagination helpers for Firestore queries.
+
+A page is ordered by one field plus the document id as a tie-breaker. The
+next-page cursor is an opaque url-safe token holding the last document's
+order value and id, so fetching the next page costs no extra read.
+"""
+import base64
+import json
+import re
+from datetime import datetime
+
+from firebase_admin import firestore
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+DOCUMENT_ID = "__name__"
+
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class PaginationError(ValueError):
+    """Raised for malformed paging parameters; callers turn it into a 400."""
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"$ts": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and "$ts" in value:
+        return datetime.fromisoformat(value["$ts"])
+    return value
+
+
+def encode_cursor(order_value, doc_id):
+    raw = json.dumps([_encode_value(order_value), doc_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        order_value, doc_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise PaginationError("Invalid startAfter cursor")
+    return _decode_value(order_value), doc_id
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE):
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise PaginationError("limit must be an integer")
+    if limit < 1:
+        raise PaginationError("limit must be at least 1")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_fields(value):
+    """Comma separated field list => list of names, or None for all fields."""
+    if not value:
+        return None
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    for field in fields:
+        if not _FIELD_NAME.match(field):
+            raise PaginationError(f"Invalid field name: {field}")
+    return fields
+
+
+def fetch_page(query, limit, order_by=None, descending=False, fields=None, start_after=None):
+    """
+    Runs one page of `query`. Returns (items, next_cursor) where each item is the
+    document data plus its "id", and next_cursor is None on the last page.
+    Documents without the `order_by` field are not returned (Firestore semantics).
+    """
+    if order_by and order_by != DOCUMENT_ID and not _FIELD_NAME.match(order_by):
+        raise PaginationError(f"Invalid orderBy field: {order_by}")
+    order_by = order_by or DOCUMENT_ID
+    direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+
+    query = query.order_by(order_by, direction=direction)
+    if order_by != DOCUMENT_ID:
+        query = query.order_by(DOCUMENT_ID, direction=direction)
+    if fields is not None:
+        selected = list(fields)
+        if order_by != DOCUMENT_ID and order_by not in selected:
+            selected.append(order_by)
+        query = query.select(selected)
+    if start_after:
+        order_value, doc_id = decode_cursor(start_after)
+        if order_by == DOCUMENT_ID:
+            query = query.start_after({DOCUMENT_ID: doc_id})
+        else:
+            query = query.start_after({order_by: order_value, DOCUMENT_ID: doc_id})
+
+    # one extra document tells us whether another page exists
+    snaps = list(query.limit(limit + 1).stream())
+    has_more = len(snaps) > limit
+    snaps = snaps[:limit]
+
+    items = [{**snap.to_dict(), "id": snap.id} for snap in snaps]
+    next_cursor = None
+    if has_more and snaps:
+        last = snaps[-1]
+        order_value = last.id if order_by == DOCUMENT_ID else last.to_dict().get(order_by)
+        next_cursor = encode_cursor(order_value, last.id)
+    return items, next_cursor
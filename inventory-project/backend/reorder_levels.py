@@ -0,0 +1,156 @@
+"""
+Reorder levels and the maintained low-stock flag.
+
+An item is low on stock when its quantity is at or below its reorder level:
+the item's own `reorder_level` if it has one, else its category's level from
+`companies/{c}.reorderLevels`, else DEFAULT_REORDER_LEVEL. Every write path
+stores the result on the item as `below_reorder`, so low-stock lookups are one
+equality query (or a filter over inventory_cache) instead of a range query
+with a hard-coded threshold.
+
+Category levels are cached per worker for REORDER_LEVEL_CACHE_TTL seconds.
+Changing them re-flags the affected items straight away; writes made by
+other workers inside the TTL may still use the old level, and re-running
+`flask refresh-reorder-flags` corrects any such item.
+"""
+import os
+import threading
+
+from cachetools import TTLCache
+from firebase_admin import firestore
+
+import company_versions
+import inventory_aggregates
+import inventory_cache
+from db_init import db
+
+LEVEL_FIELD = "reorder_level"
+FLAG_FIELD = "below_reorder"
+CATEGORY_LEVELS_FIELD = "reorderLevels"
+DEFAULT_REORDER_LEVEL = int(os.getenv("DEFAULT_REORDER_LEVEL", 5))
+# flag updates per batch, leaving room for the version bump
+REFLAG_BATCH = 499
+
+_cache = TTLCache(
+    maxsize=int(os.getenv("REORDER_LEVEL_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("REORDER_LEVEL_CACHE_TTL", 60)),
+)
+_lock = threading.Lock()
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def parse_level(value):
+    """A level from a request body: a non-negative number, or None to clear it."""
+    if value is None:
+        return None
+    if not _number(value) or value < 0:
+        raise ValueError("reorder_level must be a non-negative number")
+    return value
+
+
+def category_levels(company_name):
+    """{category: level} for the company, read at most once per TTL."""
+    with _lock:
+        levels = _cache.get(company_name)
+    if levels is None:
+        snap = db.collection('companies').document(company_name).get()
+        levels = (snap.to_dict() or {}).get(CATEGORY_LEVELS_FIELD, {}) if snap.exists else {}
+        with _lock:
+            _cache[company_name] = levels
+    return levels
+
+
+def invalidate(company_name):
+    with _lock:
+        _cache.pop(company_name, None)
+
+
+def level_for(item, levels):
+    if _number(item.get(LEVEL_FIELD)):
+        return item[LEVEL_FIELD]
+    category_level = levels.get(item.get("category"))
+    return category_level if _number(category_level) else DEFAULT_REORDER_LEVEL
+
+
+def is_below(item, levels):
+    if not inventory_aggregates.is_item(item) or not _number(item.get("quantity")):
+        return False
+    return item["quantity"] <= level_for(item, levels)
+
+
+def with_flag(company_name, before, fields):
+    """`fields` plus the below_reorder value the item has once they are written over `before`."""
+    after = {**(before or {}), **fields}
+    if fields.get(LEVEL_FIELD) is firestore.DELETE_FIELD:
+        after.pop(LEVEL_FIELD)
+    return {**fields, FLAG_FIELD: is_below(after, category_levels(company_name))}
+
+
+def is_low(item):
+    """Reads the stored flag; items written before it existed use the default level."""
+    if FLAG_FIELD in item:
+        return item[FLAG_FIELD] is True
+    return is_below(item, {})
+
+
+def low_stock_items(company_name, attach=False):
+    """
+    [(item_id, data)] of the company's items at or below their reorder level,
+    from the inventory cache when the company is cached (see
+    inventory_cache.cached_rows for `attach`), else by querying the flag.
+    """
+    cached = inventory_cache.cached_rows(company_name, attach)
+    if cached is not None:
+        return [(item_id, data) for item_id, data in cached if is_low(data)]
+    query = db.collection('companies').document(company_name).collection('inventory') \
+              .where(FLAG_FIELD, "==", True)
+    return [(snap.id, snap.to_dict()) for snap in query.stream()]
+
+
+def refresh_flags(company_name, categories=None):
+    """
+    Rewrites below_reorder wherever it is out of date, for every item or only
+    those in `categories`. Returns the number of items changed.
+    """
+    company_ref = db.collection('companies').document(company_name)
+    levels = category_levels(company_name)
+    fields = ["name", "category", "quantity", LEVEL_FIELD, FLAG_FIELD]
+    batch, pending, changed = db.batch(), 0, 0
+    for snap in company_ref.collection('inventory').select(fields).stream():
+        item = snap.to_dict()
+        if categories is not None and item.get("category") not in categories:
+            continue
+        flag = is_below(item, levels)
+        if item.get(FLAG_FIELD) is flag or not inventory_aggregates.is_item(item):
+            continue
+        batch.update(snap.reference, {FLAG_FIELD: flag})
+        pending += 1
+        if pending >= REFLAG_BATCH:
+            company_versions.stage_bump(batch, company_ref, company_versions.INVENTORY)
+            batch.commit()
+            company_versions.invalidate(company_ref.id)
+            changed += pending
+            batch, pending = db.batch(), 0
+    if pending:
+        company_versions.stage_bump(batch, company_ref, company_versions.INVENTORY)
+        batch.commit()
+        company_versions.invalidate(company_ref.id)
+        changed += pending
+    return changed
+
+
+def set_category_levels(company_name, updates):
+    """
+    Sets (or, for None, clears) category levels and re-flags the items in
+    those categories. Returns (levels, items_changed).
+    """
+    company_ref = db.collection('companies').document(company_name)
+    company_ref.set({CATEGORY_LEVELS_FIELD: {
+        category: firestore.DELETE_FIELD if level is None else level
+        for category, level in updates.items()
+    }}, merge=True)
+    invalidate(company_name)
+    return category_levels(company_name), refresh_flags(company_name, set(updates))
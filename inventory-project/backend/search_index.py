@@ -0,0 +1,264 @@
+"""
+In-process inverted index behind /api/inventory/search.
+
+Each company's index maps lower-cased word tokens from an item's name,
+description, supplier and category to the items containing them. A sorted
+vocabulary gives prefix matching with a binary search. The index for a company
+is built on its first search from inventory_cache's listener-backed rows (one
+projected Firestore stream when that cache is off) and then kept current by
+inventory_changes.after_commit, so queries never touch Firestore.
+
+Writes made by other processes are only seen on rebuild. Once an index is
+SEARCH_INDEX_TTL seconds old the next search starts a rebuild on a background
+thread and keeps answering from the old index until the new one is swapped
+in; commits made meanwhile are applied to both. At most
+SEARCH_INDEX_COMPANIES indexes are kept, least recently used first out.
+
+A build queues the commits it overlaps; past SEARCH_INDEX_MAX_PENDING of them
+it gives up, as it does on a failed read, and drops the queue. A failed build
+is retried on a later search, and `scan` answers meanwhile from the rows.
+
+Ranking: every query term must prefix-match some token of the item. A term
+scores the weight of the best field it matched (name 3, category and supplier
+2, description 1), at full weight for a whole-word match and reduced for a
+prefix; item scores are summed over terms and ties go to the shorter name.
+"""
+import bisect
+import heapq
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+
+from cachetools import LRUCache
+
+import inventory_aggregates
+import inventory_cache
+from db_init import db
+
+FIELD_WEIGHTS = {"name": 3.0, "category": 2.0, "supplier": 2.0, "description": 1.0}
+PREFIX_FACTOR = 0.6
+STORED_FIELDS = ("name", "description", "supplier", "category", "quantity", "price")
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+INDEX_TTL = float(os.getenv("SEARCH_INDEX_TTL", 300))
+MAX_PENDING = int(os.getenv("SEARCH_INDEX_MAX_PENDING", 10000))
+
+_TOKEN = re.compile(r"[0-9a-z]+")
+
+_indexes = LRUCache(maxsize=int(os.getenv("SEARCH_INDEX_COMPANIES", 100)))
+_indexes_lock = threading.Lock()
+_rebuilding = {}  # company -> index being built to replace the one in _indexes
+
+
+def tokenize(text):
+    if text is None:
+        return []
+    return _TOKEN.findall(str(text).lower())
+
+
+class CompanyIndex:
+    def __init__(self):
+        self.postings = defaultdict(dict)  # token -> {item_id: weight}
+        self.vocabulary = []               # sorted tokens, for prefix lookups
+        self.items = {}                    # item_id -> (stored fields, tokens)
+        self.lock = threading.RLock()
+        self.built_at = None
+        self._build_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = []                 # changes committed while building
+        self._overflowed = False           # more than MAX_PENDING of them; the build is abandoned
+
+    # -- maintenance --------------------------------------------------------
+    def _add(self, item_id, fields, keep_sorted=True):
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(fields.get(field)):
+                if weights.get(token, 0) < weight:
+                    weights[token] = weight
+        for token, weight in weights.items():
+            if keep_sorted and token not in self.postings:
+                bisect.insort(self.vocabulary, token)
+            self.postings[token][item_id] = weight
+        self.items[item_id] = (fields, tuple(weights))
+
+    def _remove(self, item_id):
+        entry = self.items.pop(item_id, None)
+        if entry is None:
+            return
+        for token in entry[1]:
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(item_id, None)
+            if not posting:
+                del self.postings[token]
+                position = bisect.bisect_left(self.vocabulary, token)
+                if position < len(self.vocabulary) and self.vocabulary[position] == token:
+                    del self.vocabulary[position]
+
+    def _apply(self, change):
+        if inventory_aggregates.is_item(change.after):
+            previous = self.items.get(change.item_id, ({}, ()))[0]
+            # partial "after" dicts (imports) keep the fields they did not touch
+            fields = {**previous, **{f: change.after[f] for f in STORED_FIELDS if f in change.after}}
+            self._remove(change.item_id)
+            self._add(change.item_id, fields)
+        else:
+            self._remove(change.item_id)
+
+    def apply(self, changes):
+        with self._pending_lock:
+            if self.built_at is None:
+                # replayed once the build has loaded the stream
+                if not self._overflowed:
+                    self._pending.extend(changes)
+                    if len(self._pending) > MAX_PENDING:
+                        self._pending, self._overflowed = [], True
+                return
+        with self.lock:
+            for change in changes:
+                self._apply(change)
+
+    def build(self, company_name, attach=False):
+        """Loads the company's inventory; writers are never blocked on the read."""
+        with self._build_lock:
+            if self.built_at is not None:
+                return
+            try:
+                self._load(_inventory_rows(company_name, attach))
+            except Exception:
+                with self.lock, self._pending_lock:
+                    self.postings, self.vocabulary, self.items = defaultdict(dict), [], {}
+                    self._pending, self._overflowed = [], False
+                raise
+
+    def _load(self, rows):
+        with self.lock:
+            for item_id, data in rows:
+                if inventory_aggregates.is_item(data):
+                    self._add(item_id, {f: data[f] for f in STORED_FIELDS if f in data}, keep_sorted=False)
+            # one sort instead of an insort per new token
+            self.vocabulary = sorted(self.postings)
+            while True:
+                with self._pending_lock:
+                    if self._overflowed:
+                        raise RuntimeError(f"more than {MAX_PENDING} changes arrived while building")
+                    pending, self._pending = self._pending, []
+                    if not pending:
+                        self.built_at = time.monotonic()
+                        return
+                for change in pending:
+                    self._apply(change)
+
+    # -- queries ------------------------------------------------------------
+    def _term_scores(self, term):
+        scores = {}
+        vocabulary = self.vocabulary
+        position = bisect.bisect_left(vocabulary, term)
+        while position < len(vocabulary) and vocabulary[position].startswith(term):
+            token = vocabulary[position]
+            position += 1
+            factor = 1.0 if token == term else PREFIX_FACTOR
+            for item_id, weight in self.postings[token].items():
+                score = weight * factor
+                if scores.get(item_id, 0) < score:
+                    scores[item_id] = score
+        return scores
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Returns (total_matches, [result dicts]) for the best `limit` matches."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return 0, []
+        with self.lock:
+            # rarest-looking (longest) term first keeps the running intersection small
+            totals = None
+            for term in sorted(terms, key=len, reverse=True):
+                scores = self._term_scores(term)
+                if totals is None:
+                    totals = scores
+                else:
+                    totals = {item_id: total + scores[item_id]
+                              for item_id, total in totals.items() if item_id in scores}
+                if not totals:
+                    return 0, []
+            best = heapq.nsmallest(
+                limit, totals.items(),
+                key=lambda pair: (-pair[1], len(str(self.items[pair[0]][0].get("name", ""))), pair[0]),
+            )
+            results = [{**self.items[item_id][0], "id": item_id, "score": round(score, 3)}
+                       for item_id, score in best]
+        return len(totals), results
+
+
+def _inventory_rows(company_name, attach=False):
+    cached = inventory_cache.cached_rows(company_name, attach)
+    if cached is not None:
+        return cached
+    inventory_ref = db.collection('companies').document(company_name).collection('inventory')
+    return [(snap.id, snap.to_dict()) for snap in inventory_ref.select(list(STORED_FIELDS)).stream()]
+
+
+def _rebuild(company_name, stale):
+    """Builds a replacement for `stale` and swaps it in, unless `stale` was evicted meanwhile."""
+    fresh = _rebuilding[company_name]
+    try:
+        fresh.build(company_name)
+    except Exception as e:
+        print(f"❌ Error rebuilding search index for {company_name}: {e}")
+        fresh = None
+    with _indexes_lock:
+        _rebuilding.pop(company_name, None)
+        if fresh is None:
+            # retried on a later search
+            stale.built_at = time.monotonic() - INDEX_TTL
+        elif _indexes.get(company_name) is stale:
+            _indexes[company_name] = fresh
+
+
+def get_index(company_name, attach=False):
+    """
+    The company's index, built on demand; a stale one is rebuilt in the
+    background. `attach` is passed on to inventory_cache.cached_rows.
+    """
+    with _indexes_lock:
+        index = _indexes.get(company_name)
+        if index is None:
+            index = _indexes[company_name] = CompanyIndex()
+        elif index.built_at is not None and company_name not in _rebuilding \
+                and time.monotonic() - index.built_at > INDEX_TTL:
+            _rebuilding[company_name] = CompanyIndex()
+            threading.Thread(target=_rebuild, args=(company_name, index),
+                             name="search-index-rebuild", daemon=True).start()
+    if index.built_at is None:
+        try:
+            index.build(company_name, attach)
+        except Exception:
+            # an unbuilt index left in place would keep queueing every commit
+            with _indexes_lock:
+                if _indexes.get(company_name) is index:
+                    del _indexes[company_name]
+            raise
+    return index
+
+
+def apply_changes(company_name, changes):
+    """Keeps loaded (and rebuilding) indexes in step with committed inventory changes."""
+    with _indexes_lock:
+        indexes = [_indexes.get(company_name), _rebuilding.get(company_name)]
+    for index in indexes:
+        if index is not None:
+            index.apply(changes)
+
+
+def search(company_name, query, limit=DEFAULT_LIMIT, attach=False):
+    return get_index(company_name, attach).search(query, limit)
+
+
+def scan(company_name, query, limit=DEFAULT_LIMIT):
+    """Answers one query from the inventory rows, without keeping an index; for when `search` fails."""
+    index = CompanyIndex()
+    index._load(inventory_cache.rows(company_name))
+    return index.search(query, limit)
@@ -0,0 +1,309 @@
+"""
+Per-item stock movement ledger.
+
+Receipts, sales and adjustments are appended to
+`companies/{c}/inventory/{item}/movements` as immutable documents. Recording
+one is a single write to a new document, so a busy item never becomes a write
+hotspot the way incrementing its `quantity` on every sale would.
+
+A background compactor folds pending movements into the item's `quantity` and
+`sold` snapshot every STOCK_COMPACT_SECONDS. Each item is compacted in
+transactions of up to MAX_PER_COMPACTION movements, repeated until none are
+left, that also stage the usual inventory_changes (aggregates, daily rollups,
+an event with source "ledger") and move the item's `movements_through`
+cursor past the movements folded, so several workers can compact
+concurrently and a movement is written only once. A movement is pending
+while it sits after its item's cursor (or, before the first fold, after the
+item's added_at, so a re-created item never inherits its predecessor's
+movements). The current level of an item is its snapshot plus its few
+pending movements; reads never replay the whole ledger.
+
+Recording does not read the item, so it cannot refuse an oversell, and
+movements for an item that does not exist are never applied. Stock is kept
+non-negative where movements are serialised: the compactor folds them in
+order and flags a sale or negative adjustment that would take the level
+below zero as `rejected` instead of applying it.
+
+The compactor finds items to fold with a collection-group scan of movements
+by `at`, from a watermark in `system/stockCompaction` that only advances past
+movements whose items were folded. The scan needs a collection-group
+single-field index on `movements.at` (Firestore answers the first scan with a
+link to create it). Movements written before the cursor existed carry a
+`compacted` flag; those already compacted are skipped.
+"""
+from datetime import datetime
+
+import os
+import threading
+import time
+
+from firebase_admin import firestore
+
+import inventory_aggregates
+import inventory_changes
+import item_counters
+import pagination
+import reorder_levels
+from db_init import db
+
+MOVEMENTS_COLLECTION = "movements"
+RECEIPT, SALE, ADJUSTMENT = "receipt", "sale", "adjustment"
+MOVEMENT_TYPES = (RECEIPT, SALE, ADJUSTMENT)
+
+COMPACT_SECONDS = float(os.getenv("STOCK_COMPACT_SECONDS", 30))
+# pending movements looked at per scan
+COMPACT_SCAN = int(os.getenv("STOCK_COMPACT_SCAN", 1000))
+# movements read per item transaction
+MAX_PER_COMPACTION = 400
+CURSOR_FIELD = "movements_through"
+REJECTED_FIELD = "rejected"
+
+_compactor = None
+_compactor_lock = threading.Lock()
+
+
+def movements_collection(item_ref):
+    return item_ref.collection(MOVEMENTS_COLLECTION)
+
+
+def _item_ref(company_name, item_id):
+    return inventory_changes.company_ref(company_name).collection('inventory').document(item_id)
+
+
+def deltas(movement_type, quantity):
+    """(stock change, sold change) a movement makes; raises ValueError for invalid input."""
+    if movement_type not in MOVEMENT_TYPES:
+        raise ValueError(f"type must be one of {', '.join(MOVEMENT_TYPES)}")
+    if not isinstance(quantity, int) or isinstance(quantity, bool):
+        raise ValueError("quantity must be an integer")
+    if movement_type == ADJUSTMENT:
+        if quantity == 0:
+            raise ValueError("An adjustment must change the quantity")
+        return quantity, 0
+    if quantity <= 0:
+        raise ValueError(f"A {movement_type} quantity must be positive")
+    return (quantity, 0) if movement_type == RECEIPT else (-quantity, quantity)
+
+
+def record(company_name, item_id, movement_type, quantity, actor=None, note=None):
+    """
+    Appends a movement for the item with a single write. Returns the stored
+    movement with its "id"; raises ValueError for an invalid movement.
+    Whether it fits the stock is decided when it is compacted.
+    """
+    stock_delta, sold_delta = deltas(movement_type, quantity)
+    item_ref = _item_ref(company_name, item_id)
+    movement = {
+        "type": movement_type,
+        "quantity": quantity,
+        "stockDelta": stock_delta,
+        "soldDelta": sold_delta,
+        "note": note,
+        "actor": actor,
+        "at": firestore.SERVER_TIMESTAMP,
+    }
+    movement_ref = movements_collection(item_ref).document()
+    movement_ref.set(movement)
+    _ensure_compactor()
+    movement.pop("at")
+    return {"id": movement_ref.id, "itemId": item_id, **movement}
+
+
+def _pending_query(item_ref, item):
+    """The item's movements after its cursor, oldest first."""
+    query = movements_collection(item_ref)
+    cursor = item.get(CURSOR_FIELD)
+    if not cursor and isinstance(item.get("added_at"), datetime):
+        # movements of an earlier item with the same id predate this one
+        query = query.where("at", ">", item["added_at"])
+    query = query.order_by("at").order_by(pagination.DOCUMENT_ID)
+    if cursor:
+        query = query.start_after({"at": cursor["at"], pagination.DOCUMENT_ID: cursor["id"]})
+    return query
+
+
+def _unfolded(snaps):
+    # movements recorded before the cursor existed say whether they were folded
+    return [snap for snap in snaps if not snap.to_dict().get("compacted")]
+
+
+def _fold(quantity, snaps):
+    """
+    Applies movement snapshots in order to a stock level of `quantity`.
+    Returns (stock change, sold change, snapshots rejected for taking the
+    level below zero).
+    """
+    stock_delta, sold_delta, rejected = 0, 0, []
+    for snap in snaps:
+        movement = snap.to_dict()
+        change = movement.get("stockDelta") or 0
+        if change < 0 and quantity + stock_delta + change < 0:
+            rejected.append(snap)
+            continue
+        stock_delta += change
+        sold_delta += movement.get("soldDelta") or 0
+    return stock_delta, sold_delta, rejected
+
+
+def current_levels(company_name, item_id):
+    """
+    {"quantity", "sold", "pending"} for the item: its compacted snapshot plus
+    the movements not yet folded into it. None if the item does not exist.
+    """
+    item_ref = _item_ref(company_name, item_id)
+    item = item_ref.get().to_dict()
+    if not inventory_aggregates.is_item(item):
+        return None
+    if item_counters.is_sharded(item):
+        item = {**item, **item_counters.totals(item, item_counters.shard_sums(item_ref, item))}
+    movements = _unfolded(_pending_query(item_ref, item).stream())
+    # pending movements count as the compactor will fold them
+    stock_delta, sold_delta, rejected = _fold(item.get("quantity", 0), movements)
+    return {
+        "quantity": item.get("quantity", 0) + stock_delta,
+        "sold": item.get("sold", 0) + sold_delta,
+        "pending": len(movements) - len(rejected),
+    }
+
+
+def pending_deltas(item_ref, item, quantity, transaction):
+    """
+    {"quantity", "sold"} the item's pending movements add to a stock level of
+    `quantity`, read in `transaction`, for writes that move the item to
+    another document before the compactor reaches it. Raises ValueError if
+    more than one compaction's worth is pending.
+    """
+    snaps = list(transaction.get(_pending_query(item_ref, item).limit(MAX_PER_COMPACTION)))
+    if len(snaps) == MAX_PER_COMPACTION:
+        raise ValueError("The item has too many pending stock movements; try again shortly")
+    stock_delta, sold_delta, _ = _fold(quantity, _unfolded(snaps))
+    return {"quantity": stock_delta, "sold": sold_delta}
+
+
+def read_page(company_name, item_id, limit, start_after=None):
+    """One page of the item's movements, newest first. Returns (movements, next_cursor)."""
+    return pagination.fetch_page(
+        movements_collection(_item_ref(company_name, item_id)), limit,
+        order_by="at", descending=True, start_after=start_after,
+    )
+
+
+# --------------------------------------------------------------------------------
+# Compaction
+# --------------------------------------------------------------------------------
+def _compact_page(company_name, item_ref):
+    """
+    Folds up to MAX_PER_COMPACTION of the item's pending movements in one
+    transaction, flagging those the stock cannot cover as rejected. Returns
+    (movements folded, movements read).
+    """
+    company_ref = inventory_changes.company_ref(company_name)
+
+    @firestore.transactional
+    def apply_movements(transaction):
+        item_snap = item_ref.get(transaction=transaction)
+        item = item_snap.to_dict() if item_snap.exists else None
+        if not inventory_aggregates.is_item(item):
+            # movements of a deleted item can never be applied; they stay as history
+            return 0, 0, [], 0
+        snaps = list(transaction.get(_pending_query(item_ref, item).limit(MAX_PER_COMPACTION)))
+        if not snaps:
+            return 0, 0, [], 0
+        movements = _unfolded(snaps)
+        fields = {CURSOR_FIELD: {"at": snaps[-1].to_dict()["at"], "id": snaps[-1].id}}
+        if not movements:
+            transaction.update(item_ref, fields)
+            return 0, len(snaps), [], 0
+
+        quantity = item.get("quantity", 0)
+        if item_counters.is_sharded(item):
+            quantity = item_counters.totals(item, item_counters.shard_sums(item_ref, item, transaction))["quantity"]
+        stock_delta, sold_delta, rejected = _fold(quantity, movements)
+        for snap in rejected:
+            transaction.update(snap.reference, {REJECTED_FIELD: True})
+        # the cursor write rewrites the item anyway, so a sharded item's base moves instead of a shard
+        fields.update(item_counters.increment_fields(item, quantity=stock_delta, sold=sold_delta))
+        fields["updated_at"] = firestore.SERVER_TIMESTAMP
+        fields = reorder_levels.with_flag(company_name, item, fields)
+        transaction.update(item_ref, fields)
+        changes = [inventory_changes.Change(item_ref.id, item, {**item, **fields})]
+        inventory_changes.stage(transaction, company_ref, changes, source="ledger")
+        return len(movements) - len(rejected), len(snaps), changes, len(rejected)
+
+    folded, read, changes, rejected = apply_movements(db.transaction())
+    if rejected:
+        print(f"❌ Rejected {rejected} stock movement(s) for {item_ref.path}: not enough stock")
+    if changes:
+        inventory_changes.after_commit(company_name, changes)
+    return folded, read
+
+
+def compact_item(company_name, item_ref):
+    """Folds every pending movement of the item into its snapshot. Returns how many were folded."""
+    total = 0
+    while True:
+        folded, read = _compact_page(company_name, item_ref)
+        total += folded
+        if read < MAX_PER_COMPACTION:
+            return total
+
+
+def _watermark_ref():
+    return db.collection("system").document("stockCompaction")
+
+
+def compact_pending(scan=COMPACT_SCAN):
+    """
+    One compaction pass: scans movements recorded since the watermark, `scan`
+    at a time, and drains every item they belong to. Returns how many were folded.
+    """
+    folded = 0
+    while True:
+        since = (_watermark_ref().get().to_dict() or {}).get("at")
+        query = db.collection_group(MOVEMENTS_COLLECTION)
+        if since is not None:
+            # >= so movements sharing the watermark's timestamp are not skipped
+            query = query.where("at", ">=", since)
+        snaps = list(query.order_by("at").limit(scan).stream())
+        items = {}
+        for snap in snaps:
+            item_ref = snap.reference.parent.parent
+            # companies/{c}/inventory/{item}/movements/{id}
+            items.setdefault(item_ref.path, (item_ref.parent.parent.id, item_ref, snap.to_dict()["at"]))
+        failed_at = None
+        for company_name, item_ref, first_at in items.values():
+            try:
+                folded += compact_item(company_name, item_ref)
+            except Exception as e:
+                print(f"❌ Error compacting stock movements for {item_ref.path}: {e}")
+                failed_at = first_at if failed_at is None else min(failed_at, first_at)
+        # never advance past a movement whose item failed to fold
+        mark = failed_at if failed_at is not None else (snaps[-1].to_dict()["at"] if snaps else since)
+        if mark is not None and mark != since:
+            _watermark_ref().set({"at": mark}, merge=True)
+        if failed_at is not None or len(snaps) < scan or mark == since:
+            return folded
+
+
+def _compact_loop():
+    while True:
+        time.sleep(COMPACT_SECONDS)
+        try:
+            compact_pending()
+        except Exception as e:
+            print(f"❌ Error scanning stock movements: {e}")
+
+
+def _ensure_compactor():
+    global _compactor
+    if COMPACT_SECONDS <= 0:
+        return
+    with _compactor_lock:
+        if _compactor is None or not _compactor.is_alive():
+            _compactor = threading.Thread(target=_compact_loop, name="stock-compactor", daemon=True)
+            _compactor.start()
+
+
+def start_compactor():
+    """Starts the background compactor; STOCK_COMPACT_SECONDS=0 leaves it to the CLI."""
+    _ensure_compactor()
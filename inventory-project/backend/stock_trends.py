@@ -0,0 +1,147 @@
+"""
+Daily stock-trend rollups.
+
+`companies/{c}/stock_daily/{YYYY-MM-DD}` holds how much the company's total
+stock, sold count and stock value changed on that (UTC) day. Every inventory
+write stages its change as Increments on today's document (see
+inventory_changes), so a trend series costs one read per day in the range
+instead of one per SKU.
+
+Levels are reconstructed backwards from the current totals in the aggregate
+doc: the stock at the end of day D is today's stock minus every change made
+after D. Days before rollups existed therefore show the current level.
+"""
+from datetime import datetime, timedelta
+
+from firebase_admin import firestore
+
+import inventory_aggregates
+from db_init import db
+
+ROLLUP_COLLECTION = "stock_daily"
+GRANULARITIES = ("day", "week", "month")
+# longest range a single request may ask for
+MAX_RANGE_DAYS = 3 * 366
+
+
+def rollup_collection(company_ref):
+    return company_ref.collection(ROLLUP_COLLECTION)
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return 0
+    return value
+
+
+def _levels(item):
+    if not inventory_aggregates.is_item(item):
+        return 0, 0, 0
+    quantity = _number(item.get("quantity", 0))
+    return quantity, _number(item.get("sold", 0)), quantity * _number(item.get("price", 0))
+
+
+def level_delta(before, after):
+    """
+    {"stock", "sold", "value"} change of one item going from `before` to
+    `after` (either may be None). "sold" counts only increases on an item that
+    exists on both sides: deleting or re-keying an item does not unsell it.
+    """
+    old, new = _levels(before), _levels(after)
+    sold = 0
+    if inventory_aggregates.is_item(before) and inventory_aggregates.is_item(after):
+        sold = max(new[1] - old[1], 0)
+    return {"stock": new[0] - old[0], "sold": sold, "value": new[2] - old[2]}
+
+
+def combine(deltas):
+    result = {"stock": 0, "sold": 0, "value": 0}
+    for delta in deltas:
+        for field in result:
+            result[field] += delta[field]
+    return result
+
+
+def daily_delta(changes):
+    """{"stock", "sold", "value"} change made by a list of inventory_changes.Change."""
+    return combine(level_delta(change.before, change.after) for change in changes)
+
+
+def stage_rollup(writer, company_ref, changes, day=None):
+    """Adds the changes to the day's rollup inside a WriteBatch or Transaction."""
+    stage_day_delta(writer, company_ref, daily_delta(changes), day)
+
+
+def stage_day_delta(writer, company_ref, delta, day=None):
+    """Adds a level_delta (or combined deltas) to the day's rollup."""
+    delta = {field: amount for field, amount in delta.items() if amount}
+    if not delta:
+        return
+    day = day or datetime.utcnow().date()
+    payload = {field: firestore.Increment(amount) for field, amount in delta.items()}
+    payload["date"] = day.isoformat()
+    writer.set(rollup_collection(company_ref).document(day.isoformat()), payload, merge=True)
+
+
+def parse_range(start, end, granularity):
+    """Validates the query parameters; raises ValueError with a client-facing message."""
+    try:
+        start_day = datetime.strptime(start, "%Y-%m-%d").date()
+        end_day = datetime.strptime(end, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise ValueError("start and end must be dates in YYYY-MM-DD format")
+    if end_day < start_day:
+        raise ValueError("end must not be before start")
+    if (end_day - start_day).days > MAX_RANGE_DAYS:
+        raise ValueError(f"Date range is limited to {MAX_RANGE_DAYS} days")
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    return start_day, end_day, granularity
+
+
+def _bucket(day, granularity):
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def series(company_name, start_day, end_day, granularity="day"):
+    """
+    [{"date", "stock", "value", "sold"}] per bucket from start_day to end_day.
+    "stock" and "value" are levels at the end of the bucket, "sold" is the
+    amount sold during it. Buckets are labelled by their first day.
+    """
+    company_ref = db.collection('companies').document(company_name)
+    totals = inventory_aggregates.read_totals(company_name)
+
+    deltas = {}
+    query = rollup_collection(company_ref).where("date", ">=", start_day.isoformat())
+    for snap in query.stream():
+        data = snap.to_dict()
+        deltas[data["date"]] = data
+
+    # roll today's levels back to the end of end_day
+    stock = totals.get("totalItems", 0)
+    value = totals.get("totalValue", 0)
+    for day_id, data in deltas.items():
+        if day_id > end_day.isoformat():
+            stock -= data.get("stock", 0)
+            value -= data.get("value", 0)
+
+    buckets = {}
+    day = end_day
+    while day >= start_day:
+        data = deltas.get(day.isoformat(), {})
+        key = _bucket(day, granularity)
+        bucket = buckets.get(key)
+        if bucket is None:
+            # walking backwards, the first day seen is the bucket's last day
+            bucket = buckets[key] = {"date": key.isoformat(), "stock": stock, "value": value, "sold": 0}
+        bucket["sold"] += data.get("sold", 0)
+        stock -= data.get("stock", 0)
+        value -= data.get("value", 0)
+        day -= timedelta(days=1)
+
+    return [buckets[key] for key in sorted(buckets)]
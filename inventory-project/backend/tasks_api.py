@@ -1,10 +1,14 @@
 from flask import Blueprint, request, jsonify
 from firebase_admin import firestore
 from db_init import db  
+import company_versions
+import reorder_levels
+import user_directory
 
 tasks_bp = Blueprint('tasks', __name__)
 
 @tasks_bp.route('/tasks', methods=['GET'])
+@company_versions.conditional_get([company_versions.TASKS], company_versions.company_from_headers)
 def get_tasks():
     company_name = request.headers.get('companyName')
     if not company_name:
@@ -42,23 +46,22 @@ def create_task():
         "urgency": urgency,
         "createdAt": firestore.SERVER_TIMESTAMP
     })
+    company_versions.bump(company_name, company_versions.TASKS)
 
     return jsonify({"message": "Task created successfully"}), 201
 
 @tasks_bp.route('/low-stock', methods=['GET'])
+@company_versions.conditional_get([company_versions.INVENTORY], company_versions.company_from_headers)
 def get_low_stock():
     company_name = request.headers.get('companyName')
     if not company_name:
         return jsonify({"error": "Company name is required"}), 400
 
-    threshold = 5
-    items_ref = db.collection("companies").document(company_name).collection("inventory") \
-                 .where("quantity", "<", threshold)
-    snap = items_ref.stream()
     items_list = []
-    for doc in snap:
-        d = doc.to_dict()
-        d["id"] = doc.id
+    # only a member's request may open inventory cache listeners for the company
+    attach = user_directory.is_member(request.headers.get('uid'), company_name)
+    for item_id, d in reorder_levels.low_stock_items(company_name, attach):
+        d["id"] = item_id
         items_list.append(d)
 
     return jsonify(items_list), 200
\ No newline at end of file
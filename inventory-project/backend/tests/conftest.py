@@ -0,0 +1,59 @@
+"""
+Shared fixtures: the backend runs against benchmarks/fake_firestore.py, wired
+in by the benchmark's install_fakes before any backend module is imported,
+so the tests need neither credentials nor network. Every test gets its own
+company, which keeps the process-wide caches from leaking between tests.
+"""
+import os
+import sys
+import types
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_DIR, "benchmarks"))
+
+import run as benchmarks  # noqa: E402
+
+FAKE_DB = benchmarks.install_fakes()
+
+
+@pytest.fixture
+def fake_db():
+    """The bare in-memory client, for seeding and for checking what was written."""
+    return FAKE_DB
+
+
+@pytest.fixture
+def client():
+    import app
+    return app.app.test_client()
+
+
+@pytest.fixture
+def company(fake_db):
+    """A new company with one admin and an empty, complete analytics aggregate."""
+    import inventory_aggregates
+    import user_directory
+
+    name = f"test-{uuid.uuid4().hex[:12]}"
+    admin_uid = f"admin-{name}"
+    company_ref = fake_db.collection('companies').document(name)
+    company_ref.set({"name": name, "members": [admin_uid], "adminUid": admin_uid})
+    user = {"uid": admin_uid, "email": f"admin@{name}.invalid", "firstName": "Test", "lastName": "Admin",
+            "role": "admin", "status": "active", "company": name}
+    company_ref.collection('users').document(admin_uid).set(user)
+    fake_db.collection(user_directory.DIRECTORY_COLLECTION).document(admin_uid).set(
+        {"company": name, "role": "admin", "fullName": user_directory.full_name_of(user)}
+    )
+    inventory_aggregates.aggregate_ref(company_ref).set(
+        {**{field: 0 for field in inventory_aggregates.NUMERIC_FIELDS}, "categories": {}, "complete": True}
+    )
+    return types.SimpleNamespace(name=name, ref=company_ref, admin_uid=admin_uid, headers={"uid": admin_uid})
+
+
+def add_item(client, company, **fields):
+    """POST /api/add-inventory with a valid item, overridden by `fields`."""
+    body = {"name": "Widget", "supplier": "Acme", "category": "Tools", "price": 2.5, "quantity": 4, **fields}
+    return client.post("/api/add-inventory", json=body, headers=company.headers)
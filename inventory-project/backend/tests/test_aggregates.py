@@ -0,0 +1,80 @@
+import pytest
+
+import inventory_aggregates
+import item_counters
+from conftest import add_item
+
+
+def _stored(company):
+    totals = inventory_aggregates.aggregate_ref(company.ref).get().to_dict()
+    return {field: totals.get(field, 0) for field in (*inventory_aggregates.NUMERIC_FIELDS, "categories")}
+
+
+def _recounted(company):
+    totals = inventory_aggregates.compute(company.ref.collection('inventory').stream())
+    totals["categories"] = {name: count for name, count in totals["categories"].items() if count}
+    return totals
+
+
+def _assert_in_step(company):
+    stored, recounted = _stored(company), _recounted(company)
+    stored["categories"] = {name: count for name, count in stored["categories"].items() if count}
+    assert stored["totalValue"] == pytest.approx(recounted.pop("totalValue"))
+    stored.pop("totalValue")
+    assert stored == recounted
+
+
+def test_delta_of_a_create_update_and_delete():
+    item = {"name": "Widget", "category": "Tools", "quantity": 4, "price": 2.5}
+    created = inventory_aggregates.delta(None, item)
+    assert created["itemCount"] == 1 and created["totalItems"] == 4 and created["totalValue"] == 10
+    assert created["categories"] == {"Tools": 1}
+
+    emptied = inventory_aggregates.delta(item, {**item, "quantity": 0})
+    assert emptied["totalItems"] == -4 and emptied["outOfStockCount"] == 1 and emptied["categories"] == {}
+
+    moved = inventory_aggregates.delta(item, {**item, "category": None})
+    assert moved["categories"] == {"Tools": -1, inventory_aggregates.UNCATEGORIZED: 1}
+
+    total = inventory_aggregates.combine([created, inventory_aggregates.delta(item, None)])
+    assert all(total[field] == 0 for field in inventory_aggregates.NUMERIC_FIELDS)
+    assert total["categories"] == {}
+
+
+def test_writes_keep_the_aggregate_in_step(client, company):
+    widget = add_item(client, company).get_json()["id"]
+    add_item(client, company, name="Gadget", category="Toys", quantity=0, price=10)
+    add_item(client, company, quantity=6)
+    _assert_in_step(company)
+
+    client.put(f"/api/update-inventory/{widget}", json={"quantity": 1, "price": 3}, headers=company.headers)
+    _assert_in_step(company)
+
+    client.post("/api/inventory/bulk", headers=company.headers, json={"operations": [
+        {"op": "upsert", "name": "Bolt", "supplier": "Acme", "price": 0.1, "quantity": 100},
+        {"op": "delete", "id": widget},
+    ]})
+    _assert_in_step(company)
+    assert _stored(company)["itemCount"] == 2
+
+
+def test_sharded_increments_reach_the_aggregate_once_refreshed(client, company):
+    widget = add_item(client, company).get_json()["id"]
+    item_counters.set_shards(company.name, widget, 4)
+
+    # the tests run with COUNTER_REFRESH_SECONDS=0, so each add is re-summed straight away
+    for _ in range(3):
+        assert add_item(client, company, quantity=2).status_code == 200
+    assert company.ref.collection('inventory').document(widget).get().to_dict()["quantity"] == 10
+    _assert_in_step(company)
+
+
+def test_summary_reads_top_sellers_and_low_stock_by_query(client, company):
+    for number, sold in enumerate([3, 9, 0, 7, 1, 5]):
+        item_id = add_item(client, company, name=f"Item {number}", quantity=number).get_json()["id"]
+        company.ref.collection('inventory').document(item_id).update({"sold": sold})
+
+    summary = client.get(f"/api/analytics-summary?companyName={company.name}").get_json()
+    assert [item["sold"] for item in summary["top_selling"]] == [9, 7, 5, 3, 1]
+    assert summary["totalItems"] == 15
+    assert {item["name"] for item in summary["lowStock"]} >= {"Item 0"}
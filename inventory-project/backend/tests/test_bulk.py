@@ -0,0 +1,80 @@
+import item_ids
+from conftest import add_item
+
+
+def _bulk(client, company, operations):
+    return client.post("/api/inventory/bulk", json={"operations": operations}, headers=company.headers)
+
+
+def test_failed_operations_do_not_stop_the_rest(client, company):
+    existing = add_item(client, company).get_json()["id"]
+    response = _bulk(client, company, [
+        {"op": "upsert", "name": "Bolt", "supplier": "Acme", "price": 0.1, "quantity": 50},
+        {"op": "rename", "id": existing},
+        {"op": "upsert", "name": "Nut", "supplier": "Acme"},
+        {"op": "upsert", "name": "BOLT", "supplier": "acme", "price": 0.2},
+        {"op": "delete", "id": "missing"},
+        {"op": "upsert", "id": "custom-id", "name": "Screw", "supplier": "Acme", "price": 0.3},
+        {"op": "upsert", "id": existing, "quantity": 9},
+    ])
+    assert response.status_code == 200
+    body = response.get_json()
+
+    results = body["results"]
+    assert [result["index"] for result in results] == list(range(7))
+    assert [result["status"] for result in results] == [
+        "created", "failed", "failed", "failed", "failed", "failed", "updated",
+    ]
+    assert "op must be one of" in results[1]["error"]
+    assert "required to create an item" in results[2]["error"]
+    assert "already changed earlier" in results[3]["error"]
+    assert results[4]["error"] == "Item not found"
+    assert "does not match" in results[5]["error"]
+    assert (body["created"], body["updated"], body["deleted"], body["failed"]) == (1, 1, 0, 5)
+
+    inventory = company.ref.collection('inventory')
+    assert inventory.document(item_ids.item_id("Bolt", "Acme", None)).get().to_dict()["quantity"] == 50
+    assert inventory.document(existing).get().to_dict()["quantity"] == 9
+    assert not inventory.document("custom-id").get().exists
+
+
+def test_a_malformed_request_is_rejected_as_a_whole(client, company):
+    assert _bulk(client, company, []).status_code == 400
+    assert _bulk(client, company, {"op": "delete"}).status_code == 400
+
+
+def test_name_keyed_operations_hash_only_the_named_items(client, company, monkeypatch):
+    for number in range(20):
+        add_item(client, company, name=f"Item {number}")
+    inventory = company.ref.collection('inventory')
+    inventory.document("legacy-id").set({"name": "Old", "supplier": "Acme", "category": None,
+                                         "quantity": 1, "price": 1.0})
+    # a member's read opens the cache the bulk request will use
+    client.get(f"/api/inventory?companyName={company.name}", headers=company.headers)
+
+    hashed = []
+    id_of = item_ids.id_of
+    monkeypatch.setattr(item_ids, "id_of", lambda item: hashed.append(item["name"]) or id_of(item))
+    body = _bulk(client, company, [{"op": "upsert", "name": "Old", "supplier": "Acme", "quantity": 6}]).get_json()
+
+    assert body["results"][0]["status"] == "updated"
+    assert inventory.document("legacy-id").get().to_dict()["quantity"] == 6
+    assert set(hashed) == {"Old"}
+
+
+def test_an_upsert_with_a_new_key_moves_the_item(client, company):
+    widget = add_item(client, company).get_json()["id"]
+    gadget = add_item(client, company, name="Gadget").get_json()["id"]
+    body = _bulk(client, company, [
+        {"op": "upsert", "id": widget, "name": "Sprocket", "quantity": 7},
+        {"op": "upsert", "id": gadget, "name": "Sprocket"},
+    ]).get_json()
+
+    sprocket = item_ids.item_id("Sprocket", "Acme", "Tools")
+    assert [(result["status"], result["id"]) for result in body["results"]] == [
+        ("updated", sprocket), ("failed", gadget),
+    ]
+    inventory = company.ref.collection('inventory')
+    assert not inventory.document(widget).get().exists
+    assert inventory.document(sprocket).get().to_dict()["quantity"] == 7
+    assert inventory.document(gadget).get().to_dict()["name"] == "Gadget"
@@ -0,0 +1,48 @@
+import company_versions
+from conftest import add_item
+
+
+def _get_inventory(client, company, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    return client.get(f"/api/inventory?companyName={company.name}", headers=headers)
+
+
+def test_matching_etag_answers_304(client, company):
+    add_item(client, company)
+    first = _get_inventory(client, company)
+    assert first.status_code == 200
+    etag = first.headers["ETag"].strip('"')
+
+    again = _get_inventory(client, company, first.headers["ETag"])
+    assert again.status_code == 304
+    assert again.headers["ETag"].strip('"') == etag
+    assert again.data == b""
+
+
+def test_inventory_write_changes_the_etag(client, company):
+    add_item(client, company)
+    old = _get_inventory(client, company).headers["ETag"]
+
+    add_item(client, company, name="Gadget")
+    response = _get_inventory(client, company, old)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != old
+    assert {item["name"] for item in response.get_json()} >= {"Widget", "Gadget"}
+
+
+def test_other_scopes_leave_the_inventory_etag_alone(client, company):
+    add_item(client, company)
+    etag = _get_inventory(client, company).headers["ETag"]
+
+    company_versions.bump(company.name, company_versions.TASKS)
+    assert _get_inventory(client, company, etag).status_code == 304
+
+
+def test_summary_etag_covers_tasks_and_the_date(company):
+    inventory_only = company_versions.etag_for(company.name, [company_versions.INVENTORY])
+    daily = company_versions.etag_for(company.name, [company_versions.INVENTORY], daily=True)
+    assert daily != inventory_only
+
+    before = company_versions.etag_for(company.name, [company_versions.INVENTORY, company_versions.TASKS])
+    company_versions.bump(company.name, company_versions.TASKS)
+    assert company_versions.etag_for(company.name, [company_versions.INVENTORY, company_versions.TASKS]) != before
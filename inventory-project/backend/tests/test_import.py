@@ -0,0 +1,29 @@
+import pandas as pd
+
+import import_parsing
+import inventory_import
+import item_ids
+from conftest import add_item
+
+
+def _frame(**row):
+    row = {"Item Name": "Widget", "Description": "", "Category": "Tools", "Quantity": 5, "Price": 2.5,
+           "Supplier": "Acme", **row}
+    return pd.DataFrame([row])
+
+
+def test_an_item_created_during_the_import_is_added_to(client, company, fake_db):
+    inventory_ref = company.ref.collection('inventory')
+    merged, _, _ = import_parsing.prepare_frame(_frame(Quantity=5))
+    writes = inventory_import.plan_writes(inventory_ref, merged, {}, "importer")
+    assert [kind for kind, *_ in writes] == ["create"]
+
+    # a concurrent add creates the item between the import's read and its commit
+    add_item(client, company, quantity=4)
+    item_ref = inventory_ref.document(item_ids.item_id("Widget", "Acme", "Tools"))
+    item_ref.update({"sold": 3})
+
+    result = inventory_import.commit_writes(fake_db, writes, company.ref, "importer")
+    assert (result["created"], result["updated"], result["failed"]) == (0, 1, 0)
+    item = item_ref.get().to_dict()
+    assert (item["quantity"], item["sold"], item["added_by"]) == (9, 3, "Test Admin")
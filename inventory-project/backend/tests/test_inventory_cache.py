@@ -0,0 +1,26 @@
+import inventory_cache
+from conftest import add_item
+
+
+def _get_inventory(client, company, headers=None):
+    return client.get(f"/api/inventory?companyName={company.name}", headers=headers or {})
+
+
+def test_only_members_open_listeners(client, company):
+    add_item(client, company)
+
+    assert _get_inventory(client, company).status_code == 200
+    assert client.get("/api/inventory?companyName=no-such-company").status_code == 200
+    assert company.name not in inventory_cache._cache
+    assert "no-such-company" not in inventory_cache._cache
+
+    response = _get_inventory(client, company, company.headers)
+    assert [item["name"] for item in response.get_json()] == ["Widget"]
+    assert company.name in inventory_cache._cache
+
+
+def test_the_number_of_cached_companies_is_capped(company, monkeypatch):
+    monkeypatch.setattr(inventory_cache, "MAX_COMPANIES", 2)
+    opened = [inventory_cache._entry(f"{company.name}-{n}", attach=True) for n in range(3)]
+    assert len(inventory_cache._cache) <= 2
+    assert opened[0].closed and not opened[2].closed
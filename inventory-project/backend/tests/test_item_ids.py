@@ -0,0 +1,55 @@
+import item_ids
+from conftest import add_item
+
+
+def test_item_id_ignores_case_and_spacing():
+    assert item_ids.item_id("USB-C  Cable", "Acme", "Cables") == item_ids.item_id(" usb-c cable", "ACME ", "cables")
+
+
+def test_item_id_distinguishes_every_key_part():
+    base = item_ids.item_id("Cable", "Acme", "Cables")
+    assert item_ids.item_id("Cable", "Other", "Cables") != base
+    assert item_ids.item_id("Cable", "Acme", "Other") != base
+    assert item_ids.item_id("Cable", "Acme", None) == item_ids.item_id("Cable", "Acme", "")
+
+
+def test_add_inventory_upserts_the_derived_document(client, company, fake_db):
+    assert add_item(client, company, quantity=4).status_code == 201
+    response = add_item(client, company, name="WIDGET", quantity=3)
+    assert response.status_code == 200
+
+    expected_id = item_ids.item_id("Widget", "Acme", "Tools")
+    assert response.get_json()["id"] == expected_id
+    items = [snap for snap in company.ref.collection('inventory').stream() if snap.to_dict().get("name")]
+    assert [snap.id for snap in items] == [expected_id]
+    assert items[0].to_dict()["quantity"] == 7
+    # the first spelling is kept
+    assert items[0].to_dict()["name"] == "Widget"
+
+
+def test_update_moves_an_item_to_its_new_key(client, company):
+    item_id = add_item(client, company, quantity=4).get_json()["id"]
+    inventory = company.ref.collection('inventory')
+
+    response = client.put(f"/api/update-inventory/{item_id}", json={"name": "WIDGET"}, headers=company.headers)
+    assert response.status_code == 200 and response.get_json()["id"] == item_id
+
+    response = client.put(f"/api/update-inventory/{item_id}", json={"name": "Gadget", "category": "Toys"},
+                          headers=company.headers)
+    assert response.status_code == 200
+    new_id = item_ids.item_id("Gadget", "Acme", "Toys")
+    assert response.get_json()["id"] == new_id
+    assert not inventory.document(item_id).get().exists
+    moved = inventory.document(new_id).get().to_dict()
+    assert (moved["name"], moved["category"], moved["quantity"]) == ("Gadget", "Toys", 4)
+
+
+def test_update_onto_another_items_key_conflicts(client, company):
+    item_id = add_item(client, company).get_json()["id"]
+    other_id = add_item(client, company, name="Gadget", quantity=1).get_json()["id"]
+
+    response = client.put(f"/api/update-inventory/{item_id}", json={"name": "gadget"}, headers=company.headers)
+    assert response.status_code == 409
+    inventory = company.ref.collection('inventory')
+    assert inventory.document(item_id).get().to_dict()["name"] == "Widget"
+    assert inventory.document(other_id).get().to_dict()["quantity"] == 1
@@ -0,0 +1,38 @@
+import pytest
+
+import inventory_changes
+import search_index
+from conftest import add_item
+
+
+def _search(client, company, q="widget"):
+    return client.get(f"/api/inventory/search?companyName={company.name}&q={q}", headers=company.headers)
+
+
+def test_a_failed_build_falls_back_to_a_scan(client, company, monkeypatch):
+    add_item(client, company)
+
+    def unavailable(company_name, attach=False):
+        raise RuntimeError("index read failed")
+    monkeypatch.setattr(search_index, "_inventory_rows", unavailable)
+
+    response = _search(client, company)
+    assert response.status_code == 200
+    assert [item["name"] for item in response.get_json()["results"]] == ["Widget"]
+    # nothing is left behind to queue later commits
+    assert company.name not in search_index._indexes
+
+
+def test_a_build_overrun_by_commits_drops_its_queue(company, monkeypatch):
+    monkeypatch.setattr(search_index, "MAX_PENDING", 2)
+    index = search_index.CompanyIndex()
+    change = inventory_changes.Change("item", None, {"name": "Widget"})
+    index.apply([change, change, change])
+    assert index._pending == []
+
+    with pytest.raises(RuntimeError):
+        index.build(company.name)
+    assert index.built_at is None and index._pending == [] and not index.items
+
+    index.build(company.name)
+    assert index.built_at is not None
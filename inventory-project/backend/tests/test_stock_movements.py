@@ -0,0 +1,31 @@
+import stock_movements
+from conftest import add_item
+
+
+def _move(client, company, item_id, movement_type, quantity):
+    return client.post(f"/api/inventory/{item_id}/movements", json={"type": movement_type, "quantity": quantity},
+                       headers=company.headers)
+
+
+def test_recording_a_sale_is_a_single_write(client, company, fake_db):
+    item_id = add_item(client, company).get_json()["id"]
+    fake_db.reset_stats()
+    assert _move(client, company, item_id, "sale", 1).status_code == 201
+    assert fake_db.stats["reads"] == 0
+    assert fake_db.stats["writes"] == 1
+
+
+def test_compaction_rejects_what_the_stock_cannot_cover(client, company):
+    item_id = add_item(client, company, quantity=4).get_json()["id"]
+    sales = [_move(client, company, item_id, "sale", quantity).get_json()["id"] for quantity in (3, 2, 1)]
+    assert _move(client, company, item_id, "adjustment", -5).status_code == 201
+
+    levels = client.get(f"/api/inventory/{item_id}/movements?companyName={company.name}").get_json()
+    assert (levels["quantity"], levels["sold"], levels["pending"]) == (0, 4, 2)
+
+    item_ref = company.ref.collection('inventory').document(item_id)
+    assert stock_movements.compact_item(company.name, item_ref) == 2
+    item = item_ref.get().to_dict()
+    assert (item["quantity"], item["sold"]) == (0, 4)
+    movements = stock_movements.movements_collection(item_ref)
+    assert [movements.document(sale).get().to_dict().get("rejected") for sale in sales] == [None, True, None]
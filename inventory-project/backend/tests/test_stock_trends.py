@@ -0,0 +1,31 @@
+from datetime import datetime
+
+import stock_movements
+import stock_trends
+from conftest import add_item
+
+
+def _today(company):
+    snap = stock_trends.rollup_collection(company.ref).document(datetime.utcnow().date().isoformat()).get()
+    return snap.to_dict() or {}
+
+
+def test_sold_only_counts_sales():
+    item = {"name": "Widget", "quantity": 4, "sold": 2, "price": 1}
+    assert stock_trends.level_delta(item, {**item, "quantity": 1, "sold": 5})["sold"] == 3
+    assert stock_trends.level_delta(item, {**item, "sold": 0})["sold"] == 0
+    assert stock_trends.level_delta(None, item)["sold"] == 0
+    assert stock_trends.level_delta(item, None) == {"stock": -4, "sold": 0, "value": -4}
+
+
+def test_deleting_a_sold_item_keeps_the_days_sales(client, company):
+    item_id = add_item(client, company, quantity=10).get_json()["id"]
+    response = client.post(f"/api/inventory/{item_id}/movements", json={"type": "sale", "quantity": 3},
+                           headers=company.headers)
+    assert response.status_code == 201
+    stock_movements.compact_item(company.name, company.ref.collection('inventory').document(item_id))
+    assert _today(company)["sold"] == 3
+
+    assert client.delete(f"/api/delete-inventory/{item_id}", headers=company.headers).status_code == 200
+    assert _today(company)["sold"] == 3
+    assert _today(company)["stock"] == 0
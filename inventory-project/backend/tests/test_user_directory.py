@@ -0,0 +1,27 @@
+import user_directory
+
+
+def test_unknown_uids_are_cached_as_misses(fake_db):
+    fake_db.reset_stats()
+    assert user_directory.lookup("nobody-here") is None
+    reads = fake_db.stats["reads"]
+    assert user_directory.lookup("nobody-here") is None
+    assert fake_db.stats["reads"] == reads
+
+
+def test_writes_are_seen_once_committed(company, fake_db):
+    assert user_directory.lookup(company.admin_uid)["role"] == "admin"
+
+    batch = fake_db.batch()
+    user_directory.record_user(company.admin_uid, company.name, "staff", "Test Admin", batch=batch)
+    batch.commit()
+    user_directory.invalidate(company.admin_uid)
+    assert user_directory.lookup(company.admin_uid)["role"] == "staff"
+
+    batch = fake_db.batch()
+    batch.delete(company.ref.collection('users').document(company.admin_uid))
+    user_directory.remove_user(company.admin_uid, batch=batch)
+    batch.commit()
+    user_directory.invalidate(company.admin_uid)
+    assert user_directory.lookup(company.admin_uid) is None
+
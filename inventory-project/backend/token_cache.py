@@ -0,0 +1,93 @@
+"""
+Cache of verified Firebase ID tokens.
+
+Decoded claims are kept in a bounded cache keyed by a SHA-256 of the token and
+expire at the token's own `exp`, so a cached token is never accepted after
+Firebase would have rejected it. Google's signing certificates are refreshed
+by a background thread, so a cache miss never waits on fetching them.
+"""
+import hashlib
+import os
+import threading
+import time
+
+from cachetools import TLRUCache
+from firebase_admin import auth, _token_gen
+
+import metrics
+
+CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+# Google rotates keys every few hours; refresh well inside their max-age
+CERT_REFRESH_SECONDS = int(os.getenv("TOKEN_CERT_REFRESH_SECONDS", 1800))
+
+_cache = TLRUCache(maxsize=CACHE_SIZE, ttu=lambda _key, claims, _now: claims["exp"], timer=time.time)
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+_refresher = None
+
+
+def _token_key(id_token):
+    return hashlib.sha256(id_token.encode("utf-8")).hexdigest()
+
+
+def verify_id_token(id_token):
+    """Drop-in for auth.verify_id_token that serves repeat tokens from memory."""
+    start_cert_refresher()
+    key = _token_key(id_token)
+    with _lock:
+        claims = _cache.get(key)
+        _stats["hits" if claims is not None else "misses"] += 1
+    if claims is not None:
+        return dict(claims)
+
+    with metrics.timed("firebase_auth", "verify_id_token"):
+        claims = auth.verify_id_token(id_token)
+    if claims.get("exp", 0) > time.time():
+        with _lock:
+            _cache[key] = claims
+    return dict(claims)
+
+
+def cache_stats():
+    with _lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+        size = len(_cache)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hitRate": round(hits / total, 4) if total else 0.0,
+        "size": size,
+        "maxSize": CACHE_SIZE,
+    }
+
+
+def refresh_certificates():
+    """
+    Re-downloads the ID token signing certificates into firebase_admin's HTTP
+    cache. `no-cache` bypasses the cached copy but the response is still stored,
+    so verify_id_token keeps reading fresh certs from memory.
+    """
+    verifier = auth._get_client(None)._token_verifier
+    verifier.request(
+        url=_token_gen.ID_TOKEN_CERT_URI, method="GET", headers={"Cache-Control": "no-cache"}
+    )
+
+
+def _refresh_loop():
+    while True:
+        try:
+            refresh_certificates()
+        except Exception as e:
+            print(f"❌ Error refreshing Firebase signing certificates: {e}")
+        time.sleep(CERT_REFRESH_SECONDS)
+
+
+def start_cert_refresher():
+    global _refresher
+    if _refresher is not None or CERT_REFRESH_SECONDS <= 0:
+        return
+    with _lock:
+        if _refresher is None:
+            _refresher = threading.Thread(target=_refresh_loop, name="token-cert-refresh", daemon=True)
+            _refresher.start()
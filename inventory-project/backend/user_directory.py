@@ -0,0 +1,151 @@
+"""
+Top-level uid -> company directory.
+
+Every user gets a `user_directory/{uid}` document holding their company, role
+and full name, so resolving a caller is a single document read instead of a
+scan over every company. Lookups, including misses, are cached in-process
+for USER_DIRECTORY_CACHE_TTL seconds. Writers call `invalidate` once their
+write has committed, so this worker sees a promote/demote/remove straight
+away; other workers see it within the TTL, which is why it is kept short. A
+read that raced an invalidation is not cached, so it cannot pin the old role.
+"""
+import os
+import threading
+
+from cachetools import TTLCache
+from db_init import db
+
+DIRECTORY_COLLECTION = "user_directory"
+
+# Users created before the directory existed can be found by the old company
+# scan and backfilled. It costs a read per company for every unknown uid, so it
+# is opt-in: set USER_DIRECTORY_LEGACY_SCAN=1 only until `flask
+# rebuild-user-directory` has been run.
+LEGACY_SCAN = os.getenv("USER_DIRECTORY_LEGACY_SCAN", "0") == "1"
+
+_MISSING = object()
+
+_cache = TTLCache(
+    maxsize=int(os.getenv("USER_DIRECTORY_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("USER_DIRECTORY_CACHE_TTL", 5)),
+)
+_cache_lock = threading.Lock()
+_generations = {}  # uid -> invalidations so far
+_epoch = 0  # invalidate_all calls so far
+
+
+def full_name_of(user_data):
+    """Same "First Last" format get_admin_info has always returned."""
+    return f"{user_data.get('firstName', '').strip()} {user_data.get('lastName', '').strip()}"
+
+
+def _directory_ref(uid):
+    return db.collection(DIRECTORY_COLLECTION).document(uid)
+
+
+def _make_entry(company, role, full_name):
+    return {"company": company, "role": role, "fullName": full_name}
+
+
+def invalidate(uid):
+    """Drops the cached entry; call it after the write commits, never before."""
+    with _cache_lock:
+        _cache.pop(uid, None)
+        _generations[uid] = _generations.get(uid, 0) + 1
+
+
+def invalidate_all():
+    global _epoch
+    with _cache_lock:
+        _cache.clear()
+        _epoch += 1
+
+
+def _generation(uid):
+    return _epoch, _generations.get(uid, 0)
+
+
+def lookup(uid, legacy_scan=None):
+    """
+    Returns {company, role, fullName} for `uid`, or None if the user is unknown.
+    Served from the in-process cache when possible, otherwise one document read.
+    """
+    if not uid:
+        return None
+    with _cache_lock:
+        entry = _cache.get(uid)
+        generation = _generation(uid)
+    if entry is _MISSING:
+        return None
+    if entry is not None:
+        return dict(entry)
+
+    snap = _directory_ref(uid).get()
+    if snap.exists:
+        entry = snap.to_dict()
+    elif LEGACY_SCAN if legacy_scan is None else legacy_scan:
+        entry = _backfill_from_companies(uid)
+    else:
+        entry = None
+
+    with _cache_lock:
+        # a commit invalidated while we read; what we read may predate it
+        if _generation(uid) == generation:
+            _cache[uid] = _MISSING if entry is None else entry
+    return dict(entry) if entry is not None else None
+
+
+def is_member(uid, company):
+    """True if `uid` is a known user of `company` (which therefore exists)."""
+    entry = lookup(uid)
+    return entry is not None and entry.get("company") == company
+
+
+def record_user(uid, company, role, full_name, batch=None):
+    """
+    Writes the directory entry for `uid`, or stages it on `batch`; the caller
+    then calls `invalidate(uid)` once the batch commits.
+    """
+    entry = _make_entry(company, role, full_name)
+    if batch is not None:
+        batch.set(_directory_ref(uid), entry)
+    else:
+        _directory_ref(uid).set(entry)
+        invalidate(uid)
+    return entry
+
+
+def remove_user(uid, batch=None):
+    """Deletes the directory entry for `uid`, or stages it like `record_user`."""
+    if batch is not None:
+        batch.delete(_directory_ref(uid))
+    else:
+        _directory_ref(uid).delete()
+        invalidate(uid)
+
+
+def _backfill_from_companies(uid):
+    """Old O(companies) scan, used only for users that predate the directory."""
+    for company_doc in db.collection('companies').stream():
+        user_snap = company_doc.reference.collection('users').document(uid).get()
+        if user_snap.exists:
+            user_data = user_snap.to_dict()
+            return record_user(uid, company_doc.id, user_data.get('role'), full_name_of(user_data))
+    return None
+
+
+def rebuild_directory():
+    """Recreates every directory entry from `companies/*/users`. Returns the count written."""
+    written = 0
+    batch = db.batch()
+    for company_doc in db.collection('companies').stream():
+        for user_snap in company_doc.reference.collection('users').stream():
+            user_data = user_snap.to_dict()
+            record_user(user_snap.id, company_doc.id, user_data.get('role'), full_name_of(user_data), batch=batch)
+            written += 1
+            if written % 500 == 0:
+                batch.commit()
+                batch = db.batch()
+    batch.commit()
+    invalidate_all()
+    return written
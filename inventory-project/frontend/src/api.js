@@ -238,11 +238,11 @@ export const demoteUser = async (uid, password, adminUid, companyName) => {
 // Analytics and Reports API's
 // ---------------------------------------------
 
-// Fetch detailed inventory reports
-export const getReports = async (start, end, reportType, companyName) => {
+// Fetch one page of detailed inventory reports: { items, nextCursor }
+export const getReports = async (start, end, reportType, companyName, startAfter) => {
   try {
     const response = await axios.get(`${API_BASE_URL}/reports`, {
-      params: { start, end, type: reportType, companyName },
+      params: { start, end, type: reportType, companyName, ...(startAfter ? { startAfter } : {}) },
       headers: getAuthHeaders(),
     });
     return response.data;
@@ -3,8 +3,6 @@ import axios from "axios";
 import DatePicker from "react-datepicker";
 import "react-datepicker/dist/react-datepicker.css";
 import { saveAs } from "file-saver";
-import Papa from "papaparse";
-import * as XLSX from "xlsx";
 import "../styles/ReportsAnalytics.css";
 
 import { Line, Bar } from "react-chartjs-2";
@@ -48,6 +46,7 @@ const ReportsAnalytics = () => {
 
   const [reportType, setReportType] = useState("inventory_actions");
   const [reports, setReports] = useState([]);
+  const [reportsCursor, setReportsCursor] = useState(null);
   const [analytics, setAnalytics] = useState({});
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState("");
@@ -99,22 +98,55 @@ const ReportsAnalytics = () => {
     setEndDate(newEnd);
   };
 
+  // One page of reports; startAfter is the previous page's nextCursor
+  const fetchReportsPage = (startAfter) =>
+    axios.get(`${process.env.REACT_APP_API_BASE_URL}/reports`, {
+      params: {
+        start: startDate.toISOString().split("T")[0],
+        end: endDate.toISOString().split("T")[0],
+        type: reportType,
+        companyName,
+        ...(startAfter ? { startAfter } : {}),
+      },
+    });
+
+  // The loaded reports plus every page after them, for exports built in the browser
+  const fetchAllReports = async () => {
+    let rows = reports;
+    let cursor = reportsCursor;
+    while (cursor) {
+      const repRes = await fetchReportsPage(cursor);
+      rows = [...rows, ...repRes.data.items];
+      cursor = repRes.data.nextCursor;
+    }
+    return rows;
+  };
+
+  const handleLoadMoreReports = async () => {
+    setLoading(true);
+    setError("");
+    try {
+      const repRes = await fetchReportsPage(reportsCursor);
+      setReports((prev) => [...prev, ...repRes.data.items]);
+      setReportsCursor(repRes.data.nextCursor);
+    } catch (err) {
+      console.error("Error fetching reports:", err);
+      setError("An error occurred while loading data. Please try again.");
+    } finally {
+      setLoading(false);
+    }
+  };
+
   // Generate Report
   const handleGenerateReport = async () => {
     setLoading(true);
     setError("");
 
     try {
-      // Fetch reports
-      const repRes = await axios.get(`${process.env.REACT_APP_API_BASE_URL}/reports`, {
-        params: {
-          start: startDate.toISOString().split("T")[0],
-          end: endDate.toISOString().split("T")[0],
-          type: reportType,
-          companyName,
-        },
-      });
-      setReports(repRes.data);
+      // Fetch the first page of reports
+      const repRes = await fetchReportsPage(null);
+      setReports(repRes.data.items);
+      setReportsCursor(repRes.data.nextCursor);
 
       // Fetch analytics
       const anRes = await axios.get(`${process.env.REACT_APP_API_BASE_URL}/analytics`, {
@@ -143,22 +175,41 @@ const ReportsAnalytics = () => {
   /* -----------------------------
    * Export Handlers
    * ----------------------------- */
-  const exportCSV = () => {
-    const csv = Papa.unparse(reports);
-    const blob = new Blob([csv], { type: "text/csv;charset=utf-8;" });
-    saveAs(blob, `inventory_report_${new Date().toISOString()}.csv`);
+  // CSV and Excel cover the whole date range, streamed by the server
+  const downloadReportExport = async (format) => {
+    setError("");
+    try {
+      const res = await axios.get(`${process.env.REACT_APP_API_BASE_URL}/export/reports`, {
+        params: {
+          start: startDate.toISOString().split("T")[0],
+          end: endDate.toISOString().split("T")[0],
+          companyName,
+          format,
+        },
+        responseType: "blob",
+      });
+      saveAs(res.data, `inventory_report_${new Date().toISOString()}.${format}`);
+    } catch (err) {
+      console.error("Error exporting reports:", err);
+      setError("An error occurred while exporting. Please try again.");
+    }
   };
 
-  const exportExcel = () => {
-    const worksheet = XLSX.utils.json_to_sheet(reports);
-    const workbook = XLSX.utils.book_new();
-    XLSX.utils.book_append_sheet(workbook, worksheet, "Report");
-    const excelBuffer = XLSX.write(workbook, { bookType: "xlsx", type: "array" });
-    const data = new Blob([excelBuffer], { type: "application/octet-stream" });
-    saveAs(data, `inventory_report_${new Date().toISOString()}.xlsx`);
-  };
+  const exportCSV = () => downloadReportExport("csv");
+
+  const exportExcel = () => downloadReportExport("xlsx");
+
+  const exportPDF = async () => {
+    setError("");
+    let allReports;
+    try {
+      allReports = await fetchAllReports();
+    } catch (err) {
+      console.error("Error fetching reports:", err);
+      setError("An error occurred while exporting. Please try again.");
+      return;
+    }
 
-  const exportPDF = () => {
     const doc = new jsPDF({ unit: "pt", format: "letter" });
     const title     = "Inventory Analysis Report";
     const company   = localStorage.getItem("company") || "Your Company";
@@ -179,7 +230,7 @@ const ReportsAnalytics = () => {
     const headers = [
       ["Item", "Qty", "Sold", "Added At", "Added By", "Updated At", "Updated By", "Δ Price"],
     ];
-    const body = reports.map((it) => {
+    const body = allReports.map((it) => {
       const a = it.added_at   ? new Date(it.added_at).toLocaleString()   : "N/A";
       const u = it.updated_at ? new Date(it.updated_at).toLocaleString() : "N/A";
       const pd = Number(it.price_diff || 0).toFixed(2);
@@ -536,6 +587,13 @@ const ReportsAnalytics = () => {
               </tbody>
             </table>
           )}
+          {!loading && reportsCursor && (
+            <div className="export-section">
+              <button className="export-btn" onClick={handleLoadMoreReports}>
+                Load More
+              </button>
+            </div>
+          )}
         </div>
 
         {/* Charts Row */}